@@ -0,0 +1,203 @@
+# backend/ai_tools/chunking.py
+"""
+Conteo de tokens y chunking consciente de la estructura para prompts de LLM.
+
+- count_tokens usa el tokenizer real del modelo (tiktoken) cuando está disponible;
+  si no, cae a una estimación por caracteres más conservadora que 4 chars/token.
+- chunk_text corta preferentemente en separadores '---' y encabezados Markdown,
+  luego en párrafos, líneas, oraciones y por último palabras, y empaqueta las
+  piezas hasta llenar cada chunk cerca del presupuesto (con solapamiento opcional).
+  Un encabezado nunca queda como chunk propio: va pegado al texto que lo sigue.
+"""
+import os
+import re
+import math
+import logging
+import threading
+from typing import Callable, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Tokenizer opcional
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+OPENAI_MODEL_TEXT = _get_setting("OPENAI_MODEL_TEXT", "gpt-4o-mini")
+# Encoding usado si tiktoken no reconoce el modelo (familia gpt-4o)
+DEFAULT_ENCODING = _get_setting("TOKENIZER_ENCODING", "o200k_base")
+# Sin tokenizer: ~3.5 chars/token (más seguro que 4 para español y código)
+FALLBACK_CHARS_PER_TOKEN = float(_get_setting("FALLBACK_CHARS_PER_TOKEN", 3.5))
+# Límite defensivo de tokens de entrada por prompt (contexto de gpt-4o-mini: 128k)
+LLM_MAX_INPUT_TOKENS = int(_get_setting("LLM_MAX_INPUT_TOKENS", 100000))
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+# Separadores de mayor a menor nivel: (patrón, texto que sustituye al separador).
+# Con None el corte es de ancho cero y el texto queda intacto.
+_SPLIT_LEVELS = [
+    (re.compile(r"\n\s*---+\s*\n"), "\n\n"),     # separadores '---' entre archivos anexados
+    (re.compile(r"(?m)^(?=#{1,6}\s)"), None),     # encabezados Markdown
+    (re.compile(r"(?<=\n\n)"), None),             # párrafos
+    (re.compile(r"(?<=\n)"), None),               # líneas (listas, tablas, código)
+    (re.compile(r"(?<=[.!?;:])(?=\s)"), None),    # oraciones
+    (re.compile(r"(?<=\s)(?=\S)"), None),         # palabras
+]
+
+# Unidad que solo contiene un encabezado (el cuerpo quedó en las unidades siguientes)
+_HEADING_ONLY = re.compile(r"^\s*#{1,6}\s[^\n]*\s*$")
+
+
+def _get_encoder(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    name = model or OPENAI_MODEL_TEXT
+    if name in _encoders:
+        return _encoders[name]
+    with _encoders_lock:
+        if name not in _encoders:
+            enc = None
+            try:
+                enc = tiktoken.encoding_for_model(name)
+            except Exception:
+                try:
+                    enc = tiktoken.get_encoding(DEFAULT_ENCODING)
+                except Exception as e:
+                    # p. ej. sin red para descargar el BPE: usamos la estimación
+                    logger.warning("chunking: tokenizer no disponible para %s (%s); se estima por caracteres", name, e)
+            _encoders[name] = enc
+    return _encoders[name]
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Número de tokens de text para el modelo dado."""
+    if not text:
+        return 0
+    enc = _get_encoder(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return max(1, math.ceil(len(text) / FALLBACK_CHARS_PER_TOKEN))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Recorta text para que no supere max_tokens (límite defensivo de entrada)."""
+    if not text or count_tokens(text, model) <= max_tokens:
+        return text
+    enc = _get_encoder(model)
+    if enc is not None:
+        return enc.decode(enc.encode(text, disallowed_special=())[:max_tokens])
+    return text[: int(max_tokens * FALLBACK_CHARS_PER_TOKEN)]
+
+
+def _hard_split(text: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    """Último recurso: corta por tokens (o caracteres) una pieza sin separadores."""
+    enc = _get_encoder(model)
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        return [enc.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+    step = max(1, int(max_tokens * FALLBACK_CHARS_PER_TOKEN))
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+def _split_to_units(text: str, max_tokens: int, counter: Callable[[str], int],
+                    model: Optional[str], level: int = 0) -> List[str]:
+    """Divide recursivamente hasta que cada unidad quepa en max_tokens, usando el separador más alto posible."""
+    if counter(text) <= max_tokens:
+        return [text]
+    if level >= len(_SPLIT_LEVELS):
+        return _hard_split(text, max_tokens, model)
+    pattern, replacement = _SPLIT_LEVELS[level]
+    pieces = pattern.split(text)
+    if replacement is not None:
+        pieces = [p + replacement for p in pieces]
+    pieces = [p for p in pieces if p]
+    if len(pieces) <= 1:
+        return _split_to_units(text, max_tokens, counter, model, level + 1)
+    units: List[str] = []
+    for piece in pieces:
+        units.extend(_split_to_units(piece, max_tokens, counter, model, level + 1))
+    return units
+
+
+def _attach_headings(units: List[str], max_tokens: int, counter: Callable[[str], int],
+                     model: Optional[str]) -> List[str]:
+    """
+    Une cada encabezado suelto a la unidad que le sigue: una sección apenas mayor que el
+    presupuesto se parte en párrafos y, sin esto, su título acabaría como chunk propio
+    (una llamada al LLM para cuatro tokens). Si no caben juntos, la unidad siguiente se
+    vuelve a partir con el presupuesto que deja el encabezado.
+    """
+    out: List[str] = []
+    pending = ""
+    for unit in units:
+        if _HEADING_ONLY.match(unit):
+            pending += unit
+            continue
+        if not pending:
+            out.append(unit)
+            continue
+        if counter(pending + unit) <= max_tokens:
+            out.append(pending + unit)
+        else:
+            pieces = _split_to_units(unit, max(1, max_tokens - counter(pending)), counter, model)
+            out.append(pending + pieces[0])
+            out.extend(pieces[1:])
+        pending = ""
+    if pending:
+        out.append(pending)
+    return out
+
+
+def chunk_text(text: str,
+               max_tokens: int,
+               overlap_tokens: int = 0,
+               model: Optional[str] = None) -> List[str]:
+    """
+    Divide text en chunks de como máximo ~max_tokens tokens del modelo, cortando en los límites
+    estructurales más altos posibles y llenando cada chunk cerca del presupuesto.
+    overlap_tokens repite al inicio de cada chunk las últimas unidades del anterior.
+    """
+    if not text or not text.strip():
+        return []
+    max_tokens = max(1, int(max_tokens))
+    overlap_tokens = max(0, min(int(overlap_tokens), max_tokens // 2))
+
+    def counter(s: str) -> int:
+        return count_tokens(s, model)
+
+    units = _attach_headings(_split_to_units(text, max_tokens, counter, model), max_tokens, counter, model)
+    if _get_encoder(model) is not None:
+        sizes = [counter(u) for u in units]
+    else:
+        # sin tokenizer, tamaños fraccionarios: redondear cada palabra inflaría la suma
+        sizes = [len(u) / FALLBACK_CHARS_PER_TOKEN for u in units]
+
+    chunks: List[str] = []
+    current: List[int] = []  # índices de unidades del chunk actual
+    current_tokens = 0
+    for i, size in enumerate(sizes):
+        if current and current_tokens + size > max_tokens:
+            chunks.append("".join(units[j] for j in current))
+            # solapamiento: arrastrar las últimas unidades del chunk anterior
+            carry: List[int] = []
+            carry_tokens = 0
+            for j in reversed(current):
+                if carry_tokens + sizes[j] > overlap_tokens or carry_tokens + sizes[j] + size > max_tokens:
+                    break
+                carry.insert(0, j)
+                carry_tokens += sizes[j]
+            current, current_tokens = carry, carry_tokens
+        current.append(i)
+        current_tokens += size
+    if current:
+        chunks.append("".join(units[j] for j in current))
+    return [c.strip() for c in chunks if c.strip()]
@@ -0,0 +1,19 @@
+# backend/ai_tools/concurrency.py
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def map_ordered(fn: Callable[[T], R], items: Iterable[T], max_workers: int) -> List[R]:
+    """
+    Aplica fn a cada item con concurrencia acotada y devuelve los resultados en el orden original.
+    Con un solo item (o max_workers <= 1) se ejecuta en el hilo actual.
+    """
+    items = list(items)
+    workers = min(max(1, max_workers), len(items))
+    if workers <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-fanout") as pool:
+        return list(pool.map(fn, items))
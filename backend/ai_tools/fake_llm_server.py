@@ -0,0 +1,258 @@
+# backend/ai_tools/fake_llm_server.py
+"""
+Servidor local compatible con la API de OpenAI (chat.completions) para pruebas y benchmarks.
+
+No llama a ningún proveedor: simula latencia (LATENCY + tokens / TOKENS_PER_SECOND),
+puede inyectar errores 429/500 y responde con texto "enlatado" según el tipo de
+prompt (quiz -> JSON, improve -> formato con marcas, lote de slides -> JSON) o con eco
+del texto de entrada.
+Soporta respuestas en streaming (SSE) igual que la API real.
+
+Uso:
+    python -m ai_tools.fake_llm_server --port 8765 --latency 0.3 --tokens-per-second 80
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python manage.py runserver
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+_QUIZ_RESPONSE = json.dumps([
+    {"type": "open", "question": "¿Cuál es la idea principal del texto?", "answer": "La idea principal."},
+    {"type": "multiple_choice", "question": "¿Qué afirma el texto?",
+     "options": ["A", "B", "C", "D"], "correct_index": 0, "source_excerpt": "..."},
+], ensure_ascii=False)
+
+# Marcador de cada diapositiva en los lotes de pptx_to_md (files/processing_helpers.py)
+_SLIDE_MARKER = re.compile(r"^=== Slide (\d+) ===$", re.MULTILINE)
+
+_IMPROVE_TEMPLATE = (
+    "-----IMPROVED_MARKDOWN_START-----\n{markdown}\n-----IMPROVED_MARKDOWN_END-----\n\n"
+    "-----CHANGELOG_JSON_START-----\n"
+    '{{"summary": "respuesta simulada", "changes": []}}\n'
+    "-----CHANGELOG_JSON_END-----"
+)
+
+
+class FakeLLMConfig:
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, mode: str = "canned", max_output_words: int = 120):
+        self.latency = latency                      # segundos antes del primer token
+        self.tokens_per_second = tokens_per_second  # 0 = respuesta instantánea tras la latencia
+        self.error_rate = error_rate                # probabilidad de HTTP 500
+        self.rate_limit_rate = rate_limit_rate      # probabilidad de HTTP 429
+        self.mode = mode                            # "canned" | "echo"
+        self.max_output_words = max_output_words
+
+
+class FakeLLMStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.simulated_seconds = 0.0
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": self.requests, "errors": self.errors,
+                    "simulated_seconds": round(self.simulated_seconds, 3)}
+
+
+def _message_text(messages) -> str:
+    parts = []
+    for msg in messages or []:
+        content = msg.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(p.get("text", "") for p in content if isinstance(p, dict) and p.get("type") == "text")
+    return "\n".join(parts)
+
+
+def _system_text(messages) -> str:
+    return _message_text([m for m in messages or [] if m.get("role") == "system"])
+
+
+def _slide_batch_reply(user: str) -> str:
+    """JSON de lote de slides con la forma que pide PPTX_BATCH_INSTRUCTIONS."""
+    slides = [{"n": int(n), "markdown": f"- Contenido simulado de la slide {n}"}
+              for n in _SLIDE_MARKER.findall(user)]
+    return json.dumps({"summary": f"Resumen simulado de {len(slides)} diapositivas.", "slides": slides},
+                      ensure_ascii=False)
+
+
+def build_reply(messages, config: FakeLLMConfig) -> str:
+    """Respuesta simulada según el tipo de prompt (primero los marcadores más específicos)."""
+    text = _message_text(messages)
+    system = _system_text(messages)
+    user = next((m.get("content") for m in reversed(messages or []) if m.get("role") == "user"), "")
+    user = user if isinstance(user, str) else _message_text([{"content": user}])
+    words = user.split()[: config.max_output_words]
+    echo = " ".join(words) or "respuesta simulada"
+    if config.mode == "echo":
+        return echo
+    if "IMPROVED_MARKDOWN_START" in text:
+        return _IMPROVE_TEMPLATE.format(markdown="# Nota mejorada\n\n" + echo)
+    if _SLIDE_MARKER.search(user) and '"slides"' in system:
+        return _slide_batch_reply(user)
+    # El prompt de resumen también menciona "quices": se reconoce por el system prompt del quiz
+    if "generador de quices" in system:
+        return _QUIZ_RESPONSE
+    if "image_url" in json.dumps(messages, ensure_ascii=False)[:2000]:
+        return "# Texto OCR simulado\n\nContenido de la imagen."
+    return echo
+
+
+def _make_handler(config: FakeLLMConfig, stats: FakeLLMStats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # silencioso
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+            elif self.path.rstrip("/").endswith("/stats"):
+                self._send_json(200, stats.snapshot())
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "invalid json"}})
+                return
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            with stats.lock:
+                stats.requests += 1
+            roll = random.random()
+            if roll < config.rate_limit_rate:
+                with stats.lock:
+                    stats.errors += 1
+                self._send_json(429, {"error": {"message": "rate limited (simulado)", "type": "rate_limit"}},
+                                headers={"retry-after": "1"})
+                return
+            if roll < config.rate_limit_rate + config.error_rate:
+                with stats.lock:
+                    stats.errors += 1
+                self._send_json(500, {"error": {"message": "error simulado", "type": "server_error"}})
+                return
+
+            reply = build_reply(body.get("messages"), config)
+            tokens = reply.split(" ")
+            per_token = (1.0 / config.tokens_per_second) if config.tokens_per_second > 0 else 0.0
+            with stats.lock:
+                stats.simulated_seconds += config.latency + per_token * len(tokens)
+            time.sleep(config.latency)
+
+            model = body.get("model", "fake")
+            created = int(time.time())
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i, tok in enumerate(tokens):
+                    piece = tok if i == 0 else " " + tok
+                    chunk = {"id": "fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if per_token:
+                        time.sleep(per_token)
+                end = {"id": "fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                self.wfile.write(f"data: {json.dumps(end)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+                self.close_connection = True
+                return
+
+            if per_token:
+                time.sleep(per_token * len(tokens))
+            prompt_tokens = len(_message_text(body.get("messages")).split())
+            self._send_json(200, {
+                "id": "fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                          "total_tokens": prompt_tokens + len(tokens)},
+            })
+
+    return Handler
+
+
+class FakeLLMServer:
+    """Servidor en un hilo de fondo; base_url apunta al prefijo /v1 que espera el SDK."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: Optional[FakeLLMConfig] = None):
+        self.config = config or FakeLLMConfig()
+        self.stats = FakeLLMStats()
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self.config, self.stats))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor OpenAI simulado para pruebas locales.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--mode", choices=["canned", "echo"], default="canned")
+    args = parser.parse_args(argv)
+
+    config = FakeLLMConfig(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                           error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, mode=args.mode)
+    server = FakeLLMServer(args.host, args.port, config)
+    print(f"Fake LLM escuchando en {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# backend/ai_tools/llm_cache.py
+"""
+Caché persistente de respuestas de LLM, direccionada por contenido.
+
+La clave se construye con: operación, modelo, versión del prompt, parámetros
+y un hash SHA-256 del texto de entrada normalizado. Si la nota (o el chunk)
+no cambió, la respuesta se sirve desde la caché sin llamar a OpenAI.
+
+El almacenamiento usa el framework de caché de Django (alias ``LLM_CACHE_ALIAS``,
+por defecto "llm"), configurado en settings como FileBasedCache: no requiere
+Redis, expira entradas por edad (TIMEOUT) y descarta entradas cuando se supera
+MAX_ENTRIES. Puede cambiarse a DatabaseCache sin tocar este módulo.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+from .single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+LLM_CACHE_ALIAS = _get_setting("LLM_CACHE_ALIAS", "llm")
+LLM_CACHE_ENABLED = _get_setting("LLM_CACHE_ENABLED", "True") in (True, "True", "true", "1")
+
+_STATS_KEYS = ("hits", "misses", "stores", "errors")
+_local_stats = {k: 0 for k in _STATS_KEYS}
+_stats_lock = threading.Lock()
+
+# Misses concurrentes de la misma clave comparten una sola llamada al modelo
+_flight = SingleFlight()
+
+
+def _get_cache():
+    try:
+        return caches[LLM_CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        # Sin alias dedicado usamos la caché por defecto
+        return caches["default"]
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalización usada SOLO para el hash (no altera lo que se envía al modelo):
+    finales de línea, espacios al final de línea y saltos de línea repetidos.
+    """
+    if not text:
+        return ""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def make_key(operation: str, model: str, version: str, params: Optional[Dict[str, Any]], text: str) -> str:
+    """Clave determinista: operación/modelo/versión/parámetros + hash del texto normalizado."""
+    payload = json.dumps(
+        {
+            "op": operation,
+            "model": model,
+            "v": version,
+            "params": params or {},
+            "input": text_hash(text),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"llm:{operation}:{digest}"
+
+
+def _bump(name: str):
+    # Contadores en memoria del proceso: add/incr sobre FileBasedCache no es atómico
+    # (lectura-escritura de fichero) y perdía incrementos entre procesos.
+    with _stats_lock:
+        _local_stats[name] += 1
+
+
+def get_stats() -> Dict[str, Any]:
+    """Contadores de la caché en el proceso actual (como las métricas del planificador)."""
+    with _stats_lock:
+        local = dict(_local_stats)
+    lookups = local["hits"] + local["misses"]
+    return {
+        "enabled": LLM_CACHE_ENABLED,
+        "alias": LLM_CACHE_ALIAS,
+        "process": local,
+        "hit_rate": round(local["hits"] / lookups, 4) if lookups else 0.0,
+        "coalesced": _flight.coalesced,
+        "in_flight": _flight.in_flight(),
+    }
+
+
+def lookup(operation: str, model: str, version: str, text: str,
+           params: Optional[Dict[str, Any]] = None) -> Any:
+    """Devuelve la entrada cacheada o None (cuenta hit/miss). Útil para flujos en streaming."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    try:
+        hit = _get_cache().get(make_key(operation, model, version, params, text))
+    except Exception as e:
+        logger.warning("llm_cache: lectura fallida (%s); se llama al modelo sin caché", e)
+        _bump("errors")
+        return None
+    _bump("hits" if hit is not None else "misses")
+    return hit
+
+
+def store(operation: str, model: str, version: str, text: str, result: Any,
+          params: Optional[Dict[str, Any]] = None, timeout: Optional[int] = None):
+    """Guarda un resultado ya calculado bajo la misma clave que usaría cached_call."""
+    if not LLM_CACHE_ENABLED:
+        return
+    key = make_key(operation, model, version, params, text)
+    try:
+        if timeout is None:
+            _get_cache().set(key, result)
+        else:
+            _get_cache().set(key, result, timeout=timeout)
+        _bump("stores")
+    except Exception as e:
+        logger.warning("llm_cache: escritura fallida (%s)", e)
+        _bump("errors")
+
+
+def cached_call(operation: str,
+                model: str,
+                version: str,
+                text: str,
+                compute: Callable[[], Any],
+                params: Optional[Dict[str, Any]] = None,
+                should_cache: Callable[[Any], bool] = bool,
+                timeout: Optional[int] = None) -> Any:
+    """
+    Devuelve el resultado cacheado para (operation, model, version, params, text)
+    o ejecuta ``compute()`` y guarda su resultado si ``should_cache(result)``.
+    Las llamadas concurrentes con la misma clave en este proceso esperan a la primera.
+    Las excepciones de ``compute`` se propagan y nunca se cachean.
+    """
+    if not LLM_CACHE_ENABLED:
+        return compute()
+
+    hit = lookup(operation, model, version, text, params=params)
+    if hit is not None:
+        return hit
+
+    def compute_and_store():
+        result = compute()
+        if should_cache(result):
+            store(operation, model, version, text, result, params=params, timeout=timeout)
+        return result
+
+    return _flight.do(make_key(operation, model, version, params, text), compute_and_store)
+
+
+def clear():
+    """Vacía la caché de LLM y reinicia los contadores del proceso."""
+    _get_cache().clear()
+    with _stats_lock:
+        for k in _STATS_KEYS:
+            _local_stats[k] = 0
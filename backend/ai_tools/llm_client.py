@@ -0,0 +1,245 @@
+# backend/ai_tools/llm_client.py
+"""
+Cliente de OpenAI compartido por ai_tools y files.processing_helpers.
+
+- Nada se crea al importar: el cliente se construye en el primer uso (get_client).
+- Un único pool HTTP (httpx) dimensionado para la concurrencia de los workers,
+  así las llamadas reutilizan conexiones TLS en lugar de abrir una por llamada.
+- Una sola implementación del bucle de reintentos y de la extracción de texto.
+- Cada intento pasa por el planificador (ai_tools.scheduler): presupuesto de
+  RPM/TPM, backoff con jitter y circuit breaker compartidos por el proceso.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Iterator, List, Optional
+
+from django.conf import settings
+
+from .scheduler import get_scheduler, estimate_tokens, is_provider_failure, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# OpenAI SDK import
+try:
+    from openai import OpenAI
+except Exception:
+    OpenAI = None
+
+try:
+    import httpx
+except Exception:
+    httpx = None
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+OPENAI_MODEL_TEXT = _get_setting("OPENAI_MODEL_TEXT", "gpt-4o-mini")
+OPENAI_MAX_RETRIES = int(_get_setting("OPENAI_MAX_RETRIES", 2))
+OPENAI_TIMEOUT = float(_get_setting("OPENAI_TIMEOUT", 60))  # segundos por llamada
+OPENAI_CONNECT_TIMEOUT = float(_get_setting("OPENAI_CONNECT_TIMEOUT", 10))
+# Conexiones simultáneas del pool: debe cubrir AI_JOB_WORKERS + paralelismo de procesamiento de archivos
+LLM_HTTP_MAX_CONNECTIONS = int(_get_setting("LLM_HTTP_MAX_CONNECTIONS", 32))
+LLM_HTTP_MAX_KEEPALIVE = int(_get_setting("LLM_HTTP_MAX_KEEPALIVE", 16))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _build_http_client():
+    if httpx is None:
+        return None
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    )
+
+
+def get_client():
+    """Devuelve el cliente OpenAI del proceso, creándolo (thread-safe) en el primer uso."""
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is not None:
+            return _client
+        if OpenAI is None:
+            raise RuntimeError("OpenAI SDK no está instalado.")
+        api_key = _get_setting("OPENAI_API_KEY", None) or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY no configurada.")
+        kwargs = {
+            "api_key": api_key,
+            "timeout": OPENAI_TIMEOUT,
+            # Los reintentos los gestiona chat_completion(); evitamos duplicarlos en el SDK
+            "max_retries": 0,
+        }
+        # Endpoint alternativo compatible con OpenAI (p. ej. ai_tools.fake_llm_server para pruebas)
+        base_url = _get_setting("OPENAI_BASE_URL", None) or os.getenv("OPENAI_BASE_URL")
+        if base_url:
+            kwargs["base_url"] = base_url
+        http_client = _build_http_client()
+        if http_client is not None:
+            kwargs["http_client"] = http_client
+        _client = OpenAI(**kwargs)
+        return _client
+
+
+def reset_client():
+    """Cierra y descarta el cliente (útil tras un fork o al cambiar configuración)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            try:
+                _client.close()
+            except Exception:
+                pass
+        _client = None
+
+
+def extract_content(resp: Any) -> str:
+    """Extrae el texto de la primera choice, tolerando objetos del SDK o dicts."""
+    choices = resp.get("choices") if isinstance(resp, dict) else getattr(resp, "choices", None)
+    if not choices:
+        return ""
+    choice = choices[0]
+    out = None
+    try:
+        if isinstance(choice, dict):
+            msg = choice.get("message") or {}
+            out = msg.get("content")
+        else:
+            msg = getattr(choice, "message", None)
+            if msg:
+                try:
+                    out = msg["content"]
+                except Exception:
+                    out = getattr(msg, "content", None)
+    except Exception:
+        out = None
+    if out is None:
+        out = getattr(resp, "text", None) or ""
+    return (out or "").strip()
+
+
+def chat_completion(messages: List[dict],
+                    model: Optional[str] = None,
+                    max_tokens: Optional[int] = None,
+                    temperature: Optional[float] = None,
+                    max_retries: int = OPENAI_MAX_RETRIES,
+                    timeout: Optional[float] = None) -> str:
+    """
+    Llama a chat.completions con reintentos y devuelve el texto de la respuesta.
+    Solo se reintentan 429/5xx/timeouts; lanza la última excepción si se agotan los reintentos.
+    """
+    client = get_client()
+    scheduler = get_scheduler()
+    params = {"model": model or OPENAI_MODEL_TEXT, "messages": messages}
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+    if temperature is not None:
+        params["temperature"] = temperature
+    if timeout is not None:
+        params["timeout"] = timeout
+    cost = estimate_tokens(messages, max_tokens)
+
+    attempt = 0
+    while True:
+        scheduler.acquire(cost)
+        try:
+            resp = client.chat.completions.create(**params)
+        except Exception as e:
+            scheduler.record_failure(e)
+            attempt += 1
+            logger.exception("OpenAI call failed (attempt %s): %s", attempt, e)
+            if not is_provider_failure(e) or attempt > max_retries:
+                raise
+            scheduler.record_retry()
+            time.sleep(backoff_delay(attempt, e))
+            continue
+        scheduler.record_success()
+        return extract_content(resp)
+
+
+def _extract_delta(chunk: Any) -> str:
+    """Texto incremental de un chunk de streaming (objeto del SDK o dict)."""
+    choices = chunk.get("choices") if isinstance(chunk, dict) else getattr(chunk, "choices", None)
+    if not choices:
+        return ""
+    choice = choices[0]
+    delta = choice.get("delta") if isinstance(choice, dict) else getattr(choice, "delta", None)
+    if not delta:
+        return ""
+    content = delta.get("content") if isinstance(delta, dict) else getattr(delta, "content", None)
+    return content or ""
+
+
+def stream_chat_completion(messages: List[dict],
+                           model: Optional[str] = None,
+                           max_tokens: Optional[int] = None,
+                           temperature: Optional[float] = None,
+                           max_retries: int = OPENAI_MAX_RETRIES,
+                           timeout: Optional[float] = None) -> Iterator[str]:
+    """
+    Igual que chat_completion pero en streaming: genera los fragmentos de texto según llegan.
+    Solo se reintenta si el fallo ocurre antes del primer fragmento (después ya se envió texto).
+    """
+    client = get_client()
+    scheduler = get_scheduler()
+    params = {"model": model or OPENAI_MODEL_TEXT, "messages": messages, "stream": True}
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+    if temperature is not None:
+        params["temperature"] = temperature
+    if timeout is not None:
+        params["timeout"] = timeout
+    cost = estimate_tokens(messages, max_tokens)
+
+    attempt = 0
+    while True:
+        started = False
+        settled = False
+        stream = None
+        scheduler.acquire(cost)
+        try:
+            stream = client.chat.completions.create(**params)
+            for chunk in stream:
+                text = _extract_delta(chunk)
+                if text:
+                    started = True
+                    yield text
+        except Exception as e:
+            settled = True
+            scheduler.record_failure(e)
+            attempt += 1
+            logger.exception("OpenAI stream failed (attempt %s): %s", attempt, e)
+            if started or not is_provider_failure(e) or attempt > max_retries:
+                raise
+            scheduler.record_retry()
+            time.sleep(backoff_delay(attempt, e))
+            continue
+        else:
+            settled = True
+            scheduler.record_success()
+            return
+        finally:
+            if not settled:
+                # El consumidor cerró el generador (GeneratorExit: el cliente se desconectó).
+                # Si ya llegó texto el proveedor respondió bien; si no, se libera sin veredicto
+                # para que el breaker half-open no quede bloqueado esperando a esta prueba.
+                if started:
+                    scheduler.record_success()
+                else:
+                    scheduler.release_probe()
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    try:
+                        close()
+                    except Exception:
+                        pass
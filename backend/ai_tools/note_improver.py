@@ -1,79 +1,35 @@
 import os
-import time
+import re
+import json
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 
 from django.conf import settings
 
-logger = logging.getLogger(__name__)
+from .llm_cache import cached_call, lookup, store
+from .llm_client import chat_completion, stream_chat_completion
+from .chunking import truncate_to_tokens, LLM_MAX_INPUT_TOKENS
 
-# OpenAI SDK import
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
+logger = logging.getLogger(__name__)
 
 # Config/defaults via settings or env
 def _get_setting(name: str, default=None):
     return getattr(settings, name, os.getenv(name, default))
 
-OPENAI_API_KEY = _get_setting("OPENAI_API_KEY", None)
 OPENAI_MODEL_TEXT = _get_setting("OPENAI_MODEL_TEXT", "gpt-4o-mini")
 OPENAI_MAX_RETRIES = int(_get_setting("OPENAI_MAX_RETRIES", 2))
 OPENAI_TEMP = float(_get_setting("OPENAI_TEMP", 0.2))
 OPENAI_MAX_TOKENS = int(_get_setting("OPENAI_MAX_TOKENS", 1000))
 
-_openai_client = None
-def get_openai_client():
-    global _openai_client
-    if _openai_client is not None:
-        return _openai_client
-    if OpenAI is None:
-        raise RuntimeError("OpenAI SDK no está instalado.")
-    api_key = OPENAI_API_KEY or os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY no configurada.")
-    _openai_client = OpenAI(api_key=api_key)
-    return _openai_client
-
-# Low-level call with retries
-def _call_openai_chat(model: str, messages: list, max_tokens: int, temperature: float, max_retries: int):
-    client = get_openai_client()
-    attempt = 0
-    while True:
-        try:
-            resp = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
-            if resp and getattr(resp, "choices", None):
-                choice = resp.choices[0]
-                # Robust extract of content
-                try:
-                    if isinstance(choice, dict):
-                        msg = choice.get("message", {}) or {}
-                        out = msg.get("content", "") or ""
-                    else:
-                        msg = getattr(choice, "message", None)
-                        if msg:
-                            try:
-                                out = msg["content"]
-                            except Exception:
-                                out = getattr(msg, "content", None) or ""
-                except Exception:
-                    out = getattr(resp, "text", "") or ""
-                return (out or "").strip()
-            return ""
-        except Exception as e:
-            attempt += 1
-            logger.exception("OpenAI call failed (attempt %s): %s", attempt, e)
-            if attempt > max_retries:
-                raise
-            time.sleep(1 + attempt * 2)
-
-# Prompt template
+# Prompt template (cambiar la versión al modificar los prompts: invalida la caché)
+IMPROVE_PROMPT_VERSION = "v1"
+
+# Marcas de la respuesta del modelo
+START_MD = "-----IMPROVED_MARKDOWN_START-----"
+END_MD = "-----IMPROVED_MARKDOWN_END-----"
+START_JSON = "-----CHANGELOG_JSON_START-----"
+END_JSON = "-----CHANGELOG_JSON_END-----"
+
 _SYSTEM_PROMPT = (
     "Eres un editor experto en notas y verificación básica. "
     "Tu tarea es mejorar, completar y corregir la nota que te dé el usuario. "
@@ -115,52 +71,56 @@ def improve_note(note_text: str,
         return {"improved_markdown": "", "changelog": {"summary": "nota vacía", "changes": []}, "warnings": ["Nota vacía"]}
 
     model = model or OPENAI_MODEL_TEXT
-
-    # Construir mensajes
-    system = _SYSTEM_PROMPT
-    user_msg = _USER_INSTRUCTIONS + "\n\nNota original:\n\n" + note_text[:200000]  # slice defensivo
-
-    messages = [
-        {"role": "system", "content": system},
-        {"role": "user", "content": user_msg},
-    ]
+    note_text = truncate_to_tokens(note_text, LLM_MAX_INPUT_TOKENS, model)  # límite defensivo
+    messages = _build_messages(note_text)
 
     try:
-        raw = _call_openai_chat(model=model, messages=messages, max_tokens=max_tokens, temperature=temperature, max_retries=max_retries)
+        raw = cached_call(
+            "improve",
+            model=model,
+            version=IMPROVE_PROMPT_VERSION,
+            params={"max_tokens": max_tokens, "temperature": temperature},
+            text=note_text,
+            compute=lambda: chat_completion(messages, model=model, max_tokens=max_tokens, temperature=temperature, max_retries=max_retries),
+        )
     except Exception as e:
         logger.exception("improve_note: error llamando a OpenAI: %s", e)
         return {"improved_markdown": "", "changelog": {"summary": "error", "changes": []}, "warnings": [str(e)]}
 
-    # Intentar extraer las dos secciones por las marcas exactas
+    return parse_improve_response(raw)
+
+def _build_messages(note_text: str) -> List[dict]:
+    # Construir mensajes
+    user_msg = _USER_INSTRUCTIONS + "\n\nNota original:\n\n" + note_text
+    return [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {"role": "user", "content": user_msg},
+    ]
+
+def parse_improve_response(raw: str) -> Dict[str, Any]:
+    """Extrae improved_markdown y changelog de la respuesta cruda del modelo (marcas exactas o heurística)."""
     improved = ""
     changelog = {"summary": "", "changes": []}
     warnings: List[str] = []
 
     try:
-        # Buscar marcadores
-        start_md = "-----IMPROVED_MARKDOWN_START-----"
-        end_md = "-----IMPROVED_MARKDOWN_END-----"
-        start_json = "-----CHANGELOG_JSON_START-----"
-        end_json = "-----CHANGELOG_JSON_END-----"
-
         md = ""
         json_text = ""
 
-        if start_md in raw and end_md in raw:
-            md = raw.split(start_md, 1)[1].split(end_md, 1)[0].strip()
+        if START_MD in raw and END_MD in raw:
+            md = raw.split(START_MD, 1)[1].split(END_MD, 1)[0].strip()
         else:
             # Si el modelo no respetó exactamente las marcas, intentar heurística:
             # buscar primera porción de Markdown (till JSON start) o tomar todo como markdown
-            if start_json in raw:
-                md = raw.split(start_json, 1)[0].strip()
+            if START_JSON in raw:
+                md = raw.split(START_JSON, 1)[0].strip()
             else:
                 md = raw.strip()
 
-        if start_json in raw and end_json in raw:
-            json_text = raw.split(start_json, 1)[1].split(end_json, 1)[0].strip()
+        if START_JSON in raw and END_JSON in raw:
+            json_text = raw.split(START_JSON, 1)[1].split(END_JSON, 1)[0].strip()
         else:
             # intentar heurística: buscar la primera línea que empiece con '{' y extraer hasta el último '}'.
-            import re, json
             m = re.search(r'(\{.*\})', raw, flags=re.DOTALL)
             if m:
                 json_text = m.group(1)
@@ -170,7 +130,6 @@ def improve_note(note_text: str,
         improved = text_clean_md(md)
 
         if json_text:
-            import json
             try:
                 changelog = json.loads(json_text)
             except Exception as e:
@@ -185,6 +144,90 @@ def improve_note(note_text: str,
 
     return {"improved_markdown": improved, "changelog": changelog, "warnings": warnings}
 
+class ImprovedMarkdownStreamParser:
+    """
+    Parser incremental de la respuesta de improve_note: a medida que llegan fragmentos,
+    devuelve el texto de la sección Markdown (entre START_MD y END_MD) en cuanto es seguro
+    emitirlo, reteniendo solo lo justo para no partir una marca a la mitad.
+    """
+
+    def __init__(self):
+        self.raw_parts: List[str] = []
+        self._state = "before"  # before -> markdown -> after
+        self._buffer = ""
+        self._at_start = True
+
+    @property
+    def raw(self) -> str:
+        return "".join(self.raw_parts)
+
+    def feed(self, chunk: str) -> str:
+        self.raw_parts.append(chunk)
+        if self._state == "after":
+            return ""
+        self._buffer += chunk
+        if self._state == "before":
+            if START_MD not in self._buffer:
+                return ""
+            self._buffer = self._buffer.split(START_MD, 1)[1]
+            self._state = "markdown"
+        if END_MD in self._buffer:
+            out = self._buffer.split(END_MD, 1)[0]
+            self._buffer = ""
+            self._state = "after"
+            return self._emit(out)
+        holdback = len(END_MD) - 1
+        if len(self._buffer) <= holdback:
+            return ""
+        out, self._buffer = self._buffer[:-holdback], self._buffer[-holdback:]
+        return self._emit(out)
+
+    def _emit(self, text: str) -> str:
+        # el salto de línea tras la marca de inicio no forma parte del Markdown
+        if self._at_start:
+            text = text.lstrip("\n")
+            self._at_start = not text
+        return text
+
+def improve_note_stream(note_text: str,
+                        model: Optional[str] = None,
+                        max_retries: int = OPENAI_MAX_RETRIES,
+                        temperature: float = OPENAI_TEMP,
+                        max_tokens: int = OPENAI_MAX_TOKENS) -> Iterator[Tuple[str, Any]]:
+    """
+    Variante en streaming de improve_note. Genera eventos (tipo, dato):
+    - ("markdown", str): fragmentos de la nota mejorada, antes de que llegue el changelog.
+    - ("done", dict): resultado final con el mismo formato que improve_note().
+    La respuesta completa se guarda en la caché al terminar.
+    """
+    if not note_text or not note_text.strip():
+        yield "done", improve_note(note_text)
+        return
+
+    model = model or OPENAI_MODEL_TEXT
+    note_text = truncate_to_tokens(note_text, LLM_MAX_INPUT_TOKENS, model)
+    cache_args = ("improve", model, IMPROVE_PROMPT_VERSION, note_text)
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+
+    cached = lookup(*cache_args, params=params)
+    if cached is not None:
+        result = parse_improve_response(cached)
+        yield "markdown", result["improved_markdown"]
+        yield "done", result
+        return
+
+    parser = ImprovedMarkdownStreamParser()
+    for delta in stream_chat_completion(_build_messages(note_text), model=model, max_tokens=max_tokens,
+                                        temperature=temperature, max_retries=max_retries):
+        md = parser.feed(delta)
+        if md:
+            yield "markdown", md
+
+    raw = parser.raw.strip()
+    if raw:
+        store(*cache_args, raw, params=params)
+    yield "done", parse_improve_response(raw)
+
 # pequeña función utilitaria para normalizar Markdown
 def text_clean_md(md: str) -> str:
     # Normalizaciones mínimas: trim y colapsar saltos excesivos
@@ -192,6 +235,5 @@ def text_clean_md(md: str) -> str:
         return ""
     md = md.replace('\r\n', '\n').replace('\r', '\n')
     # quitar más de 2 saltos seguidos
-    import re
     md = re.sub(r'\n{3,}', '\n\n', md)
     return md.strip()
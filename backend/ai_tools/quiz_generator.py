@@ -1,10 +1,35 @@
-import os
 import json
-from openai import OpenAI
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from .llm_cache import cached_call
+from .llm_client import chat_completion
+from .chunking import truncate_to_tokens, LLM_MAX_INPUT_TOKENS
+
+# Cambiar al modificar el prompt: invalida las entradas cacheadas
+QUIZ_PROMPT_VERSION = "v1"
+QUIZ_MODEL = "gpt-4o-mini"
+QUIZ_TEMPERATURE = 0.7
 
 def generate_quiz(text: str):
+    text = truncate_to_tokens(text or "", LLM_MAX_INPUT_TOKENS, QUIZ_MODEL)
+    try:
+        # Solo se cachean quices parseados correctamente (las excepciones no se cachean)
+        return cached_call(
+            "quiz",
+            model=QUIZ_MODEL,
+            version=QUIZ_PROMPT_VERSION,
+            params={"temperature": QUIZ_TEMPERATURE},
+            text=text,
+            compute=lambda: _generate_quiz_uncached(text),
+        )
+    except Exception as e:
+        print("Error generando quiz:", e)
+        return [{
+            "type": "open",
+            "question": "No se pudo generar el quiz correctamente",
+            "answer": str(e)
+        }]
+
+def _generate_quiz_uncached(text: str):
     prompt = f"""
     Genera un quiz corto (máximo 5 preguntas) EN FORMATO JSON válidamente parseable, basado únicamente en el siguiente texto. NO añadas texto adicional, explicación ni code fences — DEVUELVE SOLO EL JSON.
 
@@ -37,28 +62,17 @@ def generate_quiz(text: str):
     Formato de salida: JSON válido.
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Eres un generador de quices concisos y estructurados."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-        )
-
-        content = response.choices[0].message.content.strip()
+    content = chat_completion(
+        model=QUIZ_MODEL,
+        messages=[
+            {"role": "system", "content": "Eres un generador de quices concisos y estructurados."},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=QUIZ_TEMPERATURE,
+    )
 
-        # Limpieza por si el modelo incluye ```json ... ```
-        content = content.replace("```json", "").replace("```", "").strip()
+    # Limpieza por si el modelo incluye ```json ... ```
+    content = content.replace("```json", "").replace("```", "").strip()
 
-        quiz = json.loads(content)
-        return quiz
-
-    except Exception as e:
-        print("Error generando quiz:", e)
-        return [{
-            "type": "open",
-            "question": "No se pudo generar el quiz correctamente",
-            "answer": str(e)
-        }]
+    quiz = json.loads(content)
+    return quiz
@@ -0,0 +1,270 @@
+# backend/ai_tools/scheduler.py
+"""
+Planificador de llamadas a OpenAI consciente de los límites de la cuenta.
+
+- Dos token buckets (peticiones/minuto y tokens/minuto): cada llamada reserva su
+  coste estimado y, si no hay presupuesto, el llamador espera en cola (FIFO).
+- Backoff exponencial con jitter completo ante 429/5xx/timeouts, respetando
+  Retry-After cuando el proveedor lo envía.
+- Circuit breaker: tras LLM_BREAKER_FAILURES fallos seguidos se abre y las
+  llamadas fallan de inmediato durante LLM_BREAKER_COOLDOWN segundos; luego deja
+  pasar una llamada de prueba (half-open).
+
+Los límites son por proceso: con N procesos, configurar límite_de_la_cuenta / N.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+LLM_RPM_LIMIT = int(_get_setting("LLM_RPM_LIMIT", 500))
+LLM_TPM_LIMIT = int(_get_setting("LLM_TPM_LIMIT", 200000))
+LLM_QUEUE_TIMEOUT = float(_get_setting("LLM_QUEUE_TIMEOUT", 120))  # espera máxima en cola (s)
+LLM_BACKOFF_BASE = float(_get_setting("LLM_BACKOFF_BASE", 1.0))
+LLM_BACKOFF_MAX = float(_get_setting("LLM_BACKOFF_MAX", 30.0))
+LLM_BREAKER_FAILURES = int(_get_setting("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_COOLDOWN = float(_get_setting("LLM_BREAKER_COOLDOWN", 30.0))
+# Coste estimado de una imagen en mensajes de visión
+IMAGE_TOKENS_ESTIMATE = 1000
+
+
+class CircuitOpenError(RuntimeError):
+    """El proveedor está fallando: se rechaza la llamada sin intentarla."""
+
+
+class QueueTimeoutError(RuntimeError):
+    """No hubo presupuesto de rate limit dentro de LLM_QUEUE_TIMEOUT."""
+
+
+class TokenBucket:
+    """Bucket que se rellena de forma continua: capacity unidades por minuto."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(1, per_minute))
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Segundos hasta poder consumir amount (0 si ya se puede)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # una petición enorme no debe bloquear para siempre
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    def __init__(self, rpm: int = LLM_RPM_LIMIT, tpm: int = LLM_TPM_LIMIT):
+        self._cond = threading.Condition()
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._queue: List[object] = []  # tickets en orden de llegada (FIFO)
+
+        # circuit breaker
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        # métricas
+        self.max_queue_depth = 0
+        self.total_acquired = 0
+        self.total_queued = 0
+        self.total_wait_seconds = 0.0
+        self.total_retries = 0
+        self.total_rejected = 0
+
+    # --- rate limit ---
+
+    def acquire(self, estimated_tokens: int, timeout: float = LLM_QUEUE_TIMEOUT):
+        """Bloquea hasta que haya presupuesto para 1 petición y estimated_tokens tokens."""
+        self._check_breaker()
+        ticket = object()
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            self._queue.append(ticket)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            waited = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._queue[0] is ticket:
+                        wait = max(self._requests.wait_time(1, now),
+                                   self._tokens.wait_time(estimated_tokens, now))
+                        if wait <= 0:
+                            self._requests.consume(1)
+                            self._tokens.consume(estimated_tokens)
+                            break
+                    else:
+                        wait = 0.05
+                    if now + wait > deadline:
+                        self.total_rejected += 1
+                        self._probe_in_flight = False
+                        raise QueueTimeoutError("Sin presupuesto de rate limit para la llamada a OpenAI.")
+                    waited = True
+                    self._cond.wait(timeout=min(wait, 1.0))
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+            self.total_acquired += 1
+            if waited:
+                self.total_queued += 1
+                self.total_wait_seconds += time.monotonic() - start
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    # --- circuit breaker ---
+
+    def _check_breaker(self):
+        with self._cond:
+            if self._state == "closed":
+                return
+            now = time.monotonic()
+            if self._state == "open":
+                if now - self._opened_at < LLM_BREAKER_COOLDOWN:
+                    self.total_rejected += 1
+                    raise CircuitOpenError("OpenAI no disponible temporalmente (circuit breaker abierto).")
+                self._state = "half_open"
+                self._probe_in_flight = False
+            # half_open: solo una llamada de prueba a la vez
+            if self._probe_in_flight:
+                self.total_rejected += 1
+                raise CircuitOpenError("OpenAI en recuperación (circuit breaker half-open).")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        with self._cond:
+            self._failures = 0
+            self._state = "closed"
+            self._probe_in_flight = False
+
+    def record_failure(self, exc: Exception):
+        if not is_provider_failure(exc):
+            # errores del cliente (400, auth...) no dicen nada de la salud del proveedor
+            with self._cond:
+                self._probe_in_flight = False
+            return
+        with self._cond:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == "half_open" or self._failures >= LLM_BREAKER_FAILURES:
+                if self._state != "open":
+                    logger.warning("LLM circuit breaker abierto tras %s fallos: %s", self._failures, exc)
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def release_probe(self):
+        """Libera la llamada de prueba sin contarla como éxito ni como fallo (p. ej. cancelada)."""
+        with self._cond:
+            self._probe_in_flight = False
+
+    def record_retry(self):
+        with self._cond:
+            self.total_retries += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_queue_depth,
+                "breaker_state": self._state,
+                "consecutive_failures": self._failures,
+                "acquired": self.total_acquired,
+                "queued": self.total_queued,
+                "wait_seconds_total": round(self.total_wait_seconds, 3),
+                "retries": self.total_retries,
+                "rejected": self.total_rejected,
+                "rpm_available": round(self._requests.tokens, 1),
+                "tpm_available": round(self._tokens.tokens, 1),
+            }
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        response = getattr(exc, "response", None)
+        code = getattr(response, "status_code", None)
+    return code
+
+
+def is_provider_failure(exc: Exception) -> bool:
+    """429, 5xx, timeouts y errores de conexión: vale la pena reintentar (y cuentan para el breaker)."""
+    code = _status_code(exc)
+    if code is not None:
+        return code == 429 or code >= 500
+    name = type(exc).__name__
+    return name in ("APIConnectionError", "APITimeoutError", "TimeoutException", "ConnectError",
+                    "ReadTimeout", "ConnectTimeout", "RemoteProtocolError")
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, exc: Optional[Exception] = None) -> float:
+    """Backoff exponencial con jitter completo (evita que todos los workers reintenten a la vez)."""
+    ceiling = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    retry_after = retry_after_seconds(exc) if exc is not None else None
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, LLM_BACKOFF_MAX))
+    return delay
+
+
+def estimate_tokens(messages: List[dict], max_tokens: Optional[int]) -> int:
+    """Coste estimado de una llamada: tokens del prompt + tokens máximos de respuesta."""
+    from .chunking import count_tokens
+
+    total = 0
+    for msg in messages:
+        content = msg.get("content")
+        if isinstance(content, str):
+            total += count_tokens(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    total += count_tokens(part.get("text", ""))
+                else:
+                    total += IMAGE_TOKENS_ESTIMATE
+    return total + (max_tokens or 1000)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
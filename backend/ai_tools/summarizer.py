@@ -1,27 +1,191 @@
-from openai import OpenAI
+import os
+import re
+import hashlib
+import logging
+from typing import Iterator, List
+
 from django.conf import settings
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+from .chunking import chunk_text, count_tokens
+from .concurrency import map_ordered
+from .llm_cache import cached_call, lookup, store
+from .llm_client import chat_completion, stream_chat_completion
+
+logger = logging.getLogger(__name__)
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+# Cambiar al modificar el prompt: invalida las entradas cacheadas
+SUMMARY_PROMPT_VERSION = "v1"
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_TEMPERATURE = 0.5
+
+# Map-reduce: por encima de este tamaño (tokens) la nota se resume por secciones y luego se combinan
+SUMMARY_MAP_REDUCE_THRESHOLD_TOKENS = int(_get_setting("SUMMARY_MAP_REDUCE_THRESHOLD_TOKENS", 6000))
+# Tamaño objetivo (tokens) de cada sección del paso "map"
+SUMMARY_SECTION_TARGET_TOKENS = int(_get_setting("SUMMARY_SECTION_TARGET_TOKENS", 3000))
+# Un bloque abre sección nueva si el hash de su primera línea (el título) cae en 1 de cada N:
+# los cortes dependen solo del título de cada bloque, no del tamaño de lo que hay antes
+SUMMARY_SECTION_ANCHOR_EVERY = max(1, int(_get_setting("SUMMARY_SECTION_ANCHOR_EVERY", 4)))
+SUMMARY_PARALLELISM = int(_get_setting("SUMMARY_PARALLELISM", 4))
+SUMMARY_MAX_REDUCE_DEPTH = 3
+
+_SYSTEM_PROMPT = "Eres un experto en redacción y síntesis de información."
+
+_SEPARATOR_RE = re.compile(r"\n\s*---+\s*\n")
+_HEADING_RE = re.compile(r"(?m)^(?=#{1,6}\s)")
 
 def summarize_text(text: str) -> str:
     """
     Usa GPT-4o-mini para generar un resumen coherente y estructurado.
+    Las notas largas (> SUMMARY_MAP_REDUCE_THRESHOLD_TOKENS) se resumen en modo map-reduce.
     """
     if not text.strip():
         return "No hay contenido para resumir."
 
+    return cached_call(
+        "summary",
+        model=SUMMARY_MODEL,
+        version=SUMMARY_PROMPT_VERSION,
+        params={"temperature": SUMMARY_TEMPERATURE},
+        text=text,
+        compute=lambda: _summarize_uncached(text),
+    )
+
+def _is_long(text: str) -> bool:
+    return count_tokens(text, SUMMARY_MODEL) > SUMMARY_MAP_REDUCE_THRESHOLD_TOKENS
+
+def _summarize_uncached(text: str) -> str:
+    if _is_long(text):
+        return summarize_map_reduce(text)
+    return _summarize_direct(text)
+
+def _summary_messages(text: str) -> List[dict]:
     prompt = f"""
     Resume el siguiente texto en un formato claro y conciso (máximo 15 oraciones) todo debe parecer un mismo parrafo o maximo 2 parrafos si necesitas separar temas. Ten en cuenta que estos resumenes seran usados por estudiantes de universidad por lo que la claridad y entendibilidad debe ser escencial, tambien que la informacion que se de en el resumen debe ser util para examenes finales, quices y trabajos.
     Si el tema tiene que ver con ciencias y necesitas proporcionar formulas para el entendimiento lo haras
     Texto:
     {text}
     """
+    return [{"role": "system", "content": _SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}]
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "system", "content": "Eres un experto en redacción y síntesis de información."},
-                  {"role": "user", "content": prompt}],
-        temperature=0.5,
+def _summarize_direct(text: str) -> str:
+    return chat_completion(
+        model=SUMMARY_MODEL,
+        messages=_summary_messages(text),
+        temperature=SUMMARY_TEMPERATURE,
     )
 
-    return response.choices[0].message.content.strip()
+def summarize_text_stream(text: str) -> Iterator[str]:
+    """
+    Variante en streaming de summarize_text: genera el resumen por fragmentos.
+    Si el resumen está en caché se emite de una vez; al terminar se guarda en la caché.
+    En notas largas el paso map se hace completo y solo el reduce final se transmite.
+    """
+    if not text.strip():
+        yield "No hay contenido para resumir."
+        return
+
+    cache_args = ("summary", SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, text)
+    params = {"temperature": SUMMARY_TEMPERATURE}
+    cached = lookup(*cache_args, params=params)
+    if cached is not None:
+        yield cached
+        return
+
+    source = _map_reduce_combined(text) if _is_long(text) else text
+    parts = []
+    for delta in stream_chat_completion(_summary_messages(source), model=SUMMARY_MODEL,
+                                        temperature=SUMMARY_TEMPERATURE):
+        parts.append(delta)
+        yield delta
+    summary = "".join(parts).strip()
+    if summary:
+        store(*cache_args, summary, params=params)
+
+# --- Map-reduce ---
+
+def _is_anchor(block: str) -> bool:
+    """¿Empieza este bloque una sección? Decisión estable: solo depende de su primera línea."""
+    title = block.split("\n", 1)[0].strip().lower()
+    digest = hashlib.sha256(title.encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % SUMMARY_SECTION_ANCHOR_EVERY == 0
+
+def split_sections(text: str, target_tokens: int = SUMMARY_SECTION_TARGET_TOKENS) -> List[str]:
+    """
+    Divide la nota por los separadores '---' (archivos anexados) y por encabezados Markdown,
+    y agrupa bloques consecutivos en secciones. Los cortes se anclan a la estructura, no a un
+    empaquetado voraz (que desplazaría todos los límites posteriores al crecer un bloque):
+    - cada parte entre separadores '---' empieza sección;
+    - un bloque "ancla" (_is_anchor, según su título) empieza sección;
+    - se corta además si la sección superaría target_tokens, y un bloque más grande que
+      target_tokens se parte con el chunker por tokens.
+    Editar un bloque solo cambia su sección (y como mucho las siguientes hasta la próxima
+    ancla), así que las demás siguen sirviéndose desde la caché de "summary_section".
+    """
+    sections: List[str] = []
+    for part in _SEPARATOR_RE.split(text):
+        blocks = [b.strip() for b in _HEADING_RE.split(part) if b.strip()]
+        current = ""
+        current_tokens = 0
+        for block in blocks:
+            tokens = count_tokens(block, SUMMARY_MODEL)
+            if current and (tokens > target_tokens or _is_anchor(block)
+                            or current_tokens + tokens > target_tokens):
+                sections.append(current)
+                current, current_tokens = "", 0
+            if tokens > target_tokens:
+                sections.extend(chunk_text(block, target_tokens, model=SUMMARY_MODEL))
+                continue
+            current = f"{current}\n\n{block}" if current else block
+            current_tokens += tokens
+        if current:
+            sections.append(current)
+    return sections
+
+def _summarize_section(section: str) -> str:
+    """Paso map: resumen parcial de una sección (cacheado por sección)."""
+    def compute():
+        prompt = (
+            "Resume la siguiente sección de unos apuntes universitarios en 3 a 6 oraciones. "
+            "Conserva definiciones, fórmulas, fechas y datos clave útiles para exámenes. "
+            "Responde solo con el resumen.\n\nSección:\n" + section
+        )
+        return chat_completion(
+            model=SUMMARY_MODEL,
+            messages=[{"role": "system", "content": _SYSTEM_PROMPT},
+                      {"role": "user", "content": prompt}],
+            temperature=SUMMARY_TEMPERATURE,
+        )
+
+    return cached_call(
+        "summary_section",
+        model=SUMMARY_MODEL,
+        version=SUMMARY_PROMPT_VERSION,
+        params={"temperature": SUMMARY_TEMPERATURE},
+        text=section,
+        compute=compute,
+    )
+
+def _map_reduce_combined(text: str, depth: int = 0) -> str:
+    """
+    Resume las secciones en paralelo (map) y concatena los resúmenes parciales.
+    Si la combinación sigue siendo demasiado larga, se repite el proceso sobre ella.
+    """
+    sections = split_sections(text)
+    logger.info("summarize_map_reduce: %s secciones (nivel %s)", len(sections), depth)
+    partials = map_ordered(_summarize_section, sections, max_workers=SUMMARY_PARALLELISM)
+    combined = "\n\n---\n\n".join(p for p in partials if p)
+
+    if _is_long(combined) and depth + 1 < SUMMARY_MAX_REDUCE_DEPTH:
+        return _map_reduce_combined(combined, depth + 1)
+    return combined
+
+def summarize_map_reduce(text: str) -> str:
+    """
+    Resumen jerárquico: map sobre las secciones y reduce final con el prompt habitual
+    sobre los resúmenes parciales.
+    """
+    return _summarize_direct(_map_reduce_combined(text))
@@ -0,0 +1,7 @@
+# backend/ai_tools/urls.py
+from django.urls import path
+from .views import ai_metrics
+
+urlpatterns = [
+    path('metrics/', ai_metrics, name='ai-metrics'),
+]
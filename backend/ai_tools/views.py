@@ -0,0 +1,17 @@
+# backend/ai_tools/views.py
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .llm_cache import get_stats
+from .scheduler import get_scheduler
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def ai_metrics(request):
+    """Métricas de la capa de IA de este proceso: planificador (cola, breaker) y caché."""
+    return Response({
+        "scheduler": get_scheduler().metrics(),
+        "cache": get_stats(),
+    })
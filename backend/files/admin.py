@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import File
+from .models import File, ProcessingJob
 
-admin.site.register(File)
\ No newline at end of file
+admin.site.register(File)
+admin.site.register(ProcessingJob)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class FilesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'files'
+
+    def ready(self):
+        # Precarga opcional de los readers de OCR local (evita pagar la carga del modelo en la primera página)
+        from .ocr_engines import LOCAL_OCR_PREWARM, prewarm_in_background
+        if LOCAL_OCR_PREWARM:
+            prewarm_in_background()
@@ -0,0 +1,131 @@
+# backend/files/checkpoints.py
+"""
+Checkpoints por unidad (página OCR, chunk, slide, hoja) del procesamiento de archivos.
+
+process_file_sync abre un checkpoint_scope(checksum); dentro, los helpers usan
+checkpointed_map en lugar de _map_ordered: las unidades ya resueltas en un intento
+anterior se leen de ProcessingCheckpoint y solo se calculan las pendientes. Si una
+unidad falla, las que sí terminaron se guardan antes de propagar el error, así el
+reintento no vuelve a pagar esas llamadas a OpenAI/OCR. Al terminar bien el archivo
+se borran los checkpoints de su checksum.
+"""
+import os
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .models import ProcessingCheckpoint
+from .progress import current_tracker
+
+logger = logging.getLogger(__name__)
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+FILE_CHECKPOINTS_ENABLED = _get_setting("FILE_CHECKPOINTS_ENABLED", "True") in (True, "True", "true", "1")
+# Checkpoints de archivos que nunca terminaron se purgan pasado este tiempo
+FILE_CHECKPOINT_TTL_DAYS = int(_get_setting("FILE_CHECKPOINT_TTL_DAYS", 7))
+
+_active_checksum: contextvars.ContextVar = contextvars.ContextVar("processing_checksum", default=None)
+
+
+@contextmanager
+def checkpoint_scope(checksum: Optional[str]):
+    """Activa los checkpoints para el archivo con este checksum en el hilo actual."""
+    token = _active_checksum.set(checksum if FILE_CHECKPOINTS_ENABLED else None)
+    try:
+        yield
+    finally:
+        _active_checksum.reset(token)
+
+
+def _load(checksum: str, stage: str) -> Dict[int, str]:
+    return dict(ProcessingCheckpoint.objects.filter(checksum=checksum, stage=stage).values_list('unit', 'result'))
+
+
+def load_checkpoints(stage: str) -> Dict[int, str]:
+    """Unidades ya resueltas de la etapa para el archivo en curso ({} fuera de un checkpoint_scope)."""
+    checksum = _active_checksum.get()
+    return _load(checksum, stage) if checksum else {}
+
+
+def _save(checksum: str, stage: str, unit: int, result: str):
+    try:
+        ProcessingCheckpoint.objects.create(checksum=checksum, stage=stage, unit=unit, result=result)
+    except IntegrityError:
+        pass  # otro proceso guardó la misma unidad
+    except Exception:
+        logger.exception("No se pudo guardar el checkpoint %s#%s", stage, unit)
+
+
+def checkpointed_map(stage: str,
+                     fn: Callable[[Any], str],
+                     items: List[Any],
+                     mapper: Callable[[Callable, List[Any]], List[Any]],
+                     is_complete: Callable[[str], bool] = bool,
+                     unit_of: Optional[Callable[[int, Any], int]] = None) -> List[str]:
+    """
+    Como mapper(fn, items) pero reutilizando/guardando checkpoints de la etapa `stage`.
+    unit_of(índice, item) da el número de unidad (por defecto, la posición en items).
+    Solo se guardan resultados que cumplan is_complete (no se checkpointean errores).
+    Cada unidad (reutilizada o calculada) avanza el progreso del archivo en curso.
+    """
+    checksum = _active_checksum.get()
+    items = list(items)
+    # El progreso se avanza desde los hilos del mapper: capturamos el tracker aquí
+    tracker = current_tracker()
+
+    def tracked(item):
+        try:
+            return fn(item)
+        finally:
+            if tracker is not None:
+                tracker.advance()
+
+    if not checksum:
+        return mapper(tracked, items)
+
+    units = [unit_of(i, item) if unit_of else i for i, item in enumerate(items)]
+    done = _load(checksum, stage)
+    pending = [(u, item) for u, item in zip(units, items) if u not in done]
+    if len(pending) < len(items):
+        logger.info("checkpoints %s: %s de %s unidades ya procesadas (%s)", stage, len(items) - len(pending),
+                    len(items), checksum[:12])
+        if tracker is not None:
+            tracker.advance(len(items) - len(pending))
+
+    def run(pair):
+        unit, item = pair
+        try:
+            return unit, tracked(item), None
+        except Exception as e:
+            return unit, None, e
+
+    first_error = None
+    # Los accesos a BD quedan en este hilo (los del mapper no abren conexiones propias)
+    for unit, out, error in mapper(run, pending):
+        if error is not None:
+            first_error = first_error or error
+            continue
+        done[unit] = out
+        if is_complete(out):
+            _save(checksum, stage, unit, out)
+    if first_error is not None:
+        raise first_error
+    return [done[u] for u in units]
+
+
+def clear_checkpoints(checksum: Optional[str]):
+    """GC tras procesar bien el archivo: borra sus checkpoints y los abandonados de otros archivos."""
+    if checksum:
+        ProcessingCheckpoint.objects.filter(checksum=checksum).delete()
+    cutoff = timezone.now() - timedelta(days=FILE_CHECKPOINT_TTL_DAYS)
+    ProcessingCheckpoint.objects.filter(created_at__lt=cutoff).delete()
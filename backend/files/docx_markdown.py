@@ -0,0 +1,267 @@
+# backend/files/docx_markdown.py
+"""
+Conversión local y estructural de DOCX a Markdown (python-docx), sin pasar por el LLM.
+
+Recorre el cuerpo del documento en orden y mapea:
+- estilos de título ('Heading N' / 'Título N', 'Title') -> '#' * N
+- párrafos con numeración o estilos 'List Bullet' / 'List Number' -> '- ' / '1. ' (con sangría por nivel)
+- tablas -> tablas Markdown (primera fila como cabecera)
+- negrita/cursiva de los runs -> **texto** / *texto*
+- hipervínculos -> [texto](url)
+- imágenes embebidas -> ![alt](url), guardadas en el storage con nombre por hash de contenido
+
+convert_docx devuelve el Markdown y unas estadísticas (títulos, listas, tablas, caracteres
+sospechosos...) que docx_to_md usa para decidir si aún hace falta la limpieza con el LLM.
+"""
+import os
+import re
+import hashlib
+import logging
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+try:
+    from docx import Document
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+    from docx.oxml.ns import qn
+except Exception:
+    Document = None
+    Table = None
+    Paragraph = None
+    qn = None
+
+try:
+    from docx.text.hyperlink import Hyperlink  # python-docx >= 1.0
+except Exception:
+    Hyperlink = None
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+# Guardar las imágenes embebidas en el storage y enlazarlas desde el Markdown
+DOCX_EXTRACT_IMAGES = _get_setting("DOCX_EXTRACT_IMAGES", "True") in (True, "True", "true", "1")
+DOCX_IMAGES_DIR = str(_get_setting("DOCX_IMAGES_DIR", "files/extracted"))
+
+_HEADING_STYLE = re.compile(r'^(?:heading|título|titulo)\s*(\d)$', re.IGNORECASE)
+_MANUAL_BULLET = re.compile(r'^\s*[•·▪◦●○■□➢➤✓-]\s')
+# U+FFFD y caracteres de control distintos de tab/salto: texto mal decodificado
+_GARBLED = re.compile(r'[\ufffd\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _iter_blocks(doc):
+    """Párrafos y tablas del cuerpo en orden de documento."""
+    if hasattr(doc, 'iter_inner_content'):  # python-docx >= 1.0
+        yield from doc.iter_inner_content()
+        return
+    for child in doc.element.body.iterchildren():
+        if child.tag == qn('w:p'):
+            yield Paragraph(child, doc)
+        elif child.tag == qn('w:tbl'):
+            yield Table(child, doc)
+
+
+def _heading_level(style_name: str) -> Optional[int]:
+    if style_name.lower() == 'title':
+        return 1
+    m = _HEADING_STYLE.match(style_name.strip())
+    return min(int(m.group(1)), 6) if m else None
+
+
+def _list_info(paragraph, style_name: str) -> Optional[Tuple[bool, int]]:
+    """(numerada, nivel) si el párrafo es un elemento de lista; None si no."""
+    num_pr = None
+    p_pr = paragraph._p.pPr
+    if p_pr is not None:
+        num_pr = p_pr.numPr
+    lowered = style_name.lower()
+    if num_pr is None and 'list' not in lowered and 'lista' not in lowered:
+        return None
+    level = 0
+    if num_pr is not None and num_pr.ilvl is not None:
+        level = int(num_pr.ilvl.val)
+    else:
+        m = re.search(r'(\d)$', style_name)
+        level = int(m.group(1)) - 1 if m else 0
+    numbered = 'number' in lowered or 'númer' in lowered or 'numer' in lowered
+    return numbered, max(0, level)
+
+
+def _wrap(text: str, bold: bool, italic: bool) -> str:
+    marker = '***' if bold and italic else '**' if bold else '*' if italic else ''
+    if not marker or not text.strip():
+        return text
+    # Los marcadores deben ir pegados al texto: los espacios quedan fuera
+    lead = text[:len(text) - len(text.lstrip())]
+    trail = text[len(text.rstrip()):]
+    return f"{lead}{marker}{text.strip()}{marker}{trail}"
+
+
+class DocxConverter:
+    def __init__(self, doc, extract_images: bool = DOCX_EXTRACT_IMAGES):
+        self.doc = doc
+        self.extract_images = extract_images
+        self.stats: Dict[str, int] = {
+            'headings': 0, 'list_items': 0, 'tables': 0, 'images': 0,
+            'paragraphs': 0, 'manual_bullets': 0, 'fake_headings': 0, 'chars': 0, 'garbled_chars': 0,
+        }
+        self._image_urls: Dict[str, str] = {}
+        self._in_list = False  # el último párrafo convertido era un elemento de lista
+
+    # --- imágenes ---
+
+    def _image_url(self, r_id: str) -> Optional[str]:
+        if r_id in self._image_urls:
+            return self._image_urls[r_id]
+        url = None
+        try:
+            part = self.doc.part.related_parts[r_id]
+            blob = part.blob
+            ext = os.path.splitext(getattr(part, 'partname', '') or '')[1] or '.png'
+            name = f"{DOCX_IMAGES_DIR}/{hashlib.sha256(blob).hexdigest()[:32]}{ext}"
+            # Mismo contenido, mismo nombre: una imagen repetida en varios documentos se guarda una vez
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(blob))
+            url = default_storage.url(name)
+        except Exception as e:
+            logger.warning("docx: no se pudo extraer la imagen %s: %s", r_id, e)
+        self._image_urls[r_id] = url
+        return url
+
+    def _run_images(self, run) -> List[str]:
+        out = []
+        for drawing in run._r.xpath('.//w:drawing | .//w:pict'):
+            alt = next(iter(drawing.xpath('.//wp:docPr/@descr')), '') or 'imagen'
+            r_ids = drawing.xpath('.//a:blip/@r:embed')
+            self.stats['images'] += 1
+            url = self._image_url(r_ids[0]) if (r_ids and self.extract_images) else None
+            alt = alt.replace('\n', ' ').replace(']', ')')
+            out.append(f"![{alt}]({url})" if url else f"*[{alt}]*")
+        return out
+
+    # --- párrafos ---
+
+    def _hyperlink(self, link) -> str:
+        text = (link.text or '').replace(']', '\\]')
+        try:
+            url = link.url if link.address else ''
+        except Exception:
+            url = ''
+        # Los enlaces internos (marcadores) no tienen URL: queda solo el texto
+        return f"[{text}]({url})" if (text.strip() and url) else text
+
+    def _inline(self, paragraph) -> str:
+        segments = []  # (formato, texto); formato None para imágenes y enlaces
+        plain = []     # texto sin marcas, para comprobar que no se perdió nada
+        # paragraph.runs omite los runs dentro de w:hyperlink; iter_inner_content los incluye
+        items = paragraph.iter_inner_content() if hasattr(paragraph, 'iter_inner_content') else paragraph.runs
+        for item in items:
+            if Hyperlink is not None and isinstance(item, Hyperlink):
+                for run in item.runs:
+                    for image in self._run_images(run):
+                        segments.append((None, image))
+                if item.text:
+                    segments.append((None, self._hyperlink(item)))
+                    plain.append(item.text)
+                continue
+            for image in self._run_images(item):
+                segments.append((None, image))
+            if item.text:
+                segments.append(((bool(item.bold), bool(item.italic)), item.text))
+                plain.append(item.text)
+        if len(''.join(plain).strip()) < len((paragraph.text or '').strip()):
+            # Contenido que no viene en runs ni enlaces (campos, controles...): mejor el texto plano
+            return (paragraph.text or '').strip()
+        parts = []
+        # Runs contiguos con el mismo formato se unen antes de marcar (evita '**a****b**')
+        for fmt, group in groupby(segments, key=lambda s: s[0]):
+            if fmt is None:
+                parts.extend(t for _, t in group)
+                continue
+            text = ''.join(t for _, t in group)
+            parts.append(_wrap(text, *fmt))
+        return ''.join(parts).strip()
+
+    def paragraph(self, paragraph) -> str:
+        style_name = getattr(paragraph.style, 'name', '') or ''
+        self._in_list = False
+        text = self._inline(paragraph)
+        if not text:
+            return ''
+        plain = paragraph.text or ''
+        self.stats['chars'] += len(plain)
+        self.stats['garbled_chars'] += len(_GARBLED.findall(plain))
+
+        level = _heading_level(style_name)
+        if level:
+            self.stats['headings'] += 1
+            # El título ya es énfasis: sin ** heredado de los runs
+            return f"{'#' * level} {plain.strip()}"
+        info = _list_info(paragraph, style_name)
+        if info is not None:
+            numbered, depth = info
+            self.stats['list_items'] += 1
+            self._in_list = True
+            return f"{'   ' * depth}{'1.' if numbered else '-'} {text}"
+
+        self.stats['paragraphs'] += 1
+        if _MANUAL_BULLET.match(plain):
+            self.stats['manual_bullets'] += 1
+        elif len(plain) < 80 and paragraph.runs and all(r.bold for r in paragraph.runs if r.text.strip()):
+            # Línea corta toda en negrita con estilo normal: título "a mano"
+            self.stats['fake_headings'] += 1
+        return text
+
+    # --- tablas ---
+
+    @staticmethod
+    def _cell(cell) -> str:
+        text = ' '.join(p.text.strip() for p in cell.paragraphs if p.text.strip())
+        return text.replace('|', '\\|').replace('\n', '<br>')
+
+    def table(self, table) -> str:
+        rows = []
+        for row in table.rows:
+            rows.append([self._cell(c) for c in row.cells])
+        rows = [r for r in rows if any(r)]
+        if not rows:
+            return ''
+        self.stats['tables'] += 1
+        width = max(len(r) for r in rows)
+        rows = [r + [''] * (width - len(r)) for r in rows]
+        lines = ['| ' + ' | '.join(rows[0]) + ' |', '|' + '---|' * width]
+        lines += ['| ' + ' | '.join(r) + ' |' for r in rows[1:]]
+        return '\n'.join(lines)
+
+    def convert(self) -> str:
+        blocks = []
+        previous_list = False
+        for block in _iter_blocks(self.doc):
+            is_table = Table is not None and isinstance(block, Table)
+            md = self.table(block) if is_table else self.paragraph(block)
+            if not md:
+                continue
+            is_list = not is_table and self._in_list
+            # Elementos de una misma lista van seguidos; el resto separados por línea en blanco
+            if blocks and is_list and previous_list:
+                blocks[-1] += '\n' + md
+            else:
+                blocks.append(md)
+            previous_list = is_list
+        return '\n\n'.join(blocks).strip()
+
+
+def convert_docx(path) -> Tuple[str, Dict[str, int]]:
+    """Markdown estructural del DOCX y estadísticas de la conversión. Requiere python-docx."""
+    if Document is None:
+        raise RuntimeError("python-docx no está instalado.")
+    converter = DocxConverter(Document(path))
+    return converter.convert(), converter.stats
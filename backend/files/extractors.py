@@ -0,0 +1,253 @@
+# backend/files/extractors.py
+"""
+Registro de extractores de archivos -> Markdown.
+
+Cada formato se registra con register_extractor(nombre, extensiones, tipos MIME, coste)
+en lugar de crecer una cadena if/elif en tasks.py. extractor_for_file elige el
+extractor por el contenido (firma PDF/PNG/JPEG, o el zip OOXML de docx/xlsx/pptx) y,
+si el contenido no es concluyente, por la extensión; así un .pdf renombrado a .txt
+sigue yendo por el extractor de PDF.
+
+El coste del extractor permite enrutar el trabajo:
+- 'local': solo CPU local y barato (se puede procesar en línea con la subida).
+- 'llm':   llama a OpenAI para limpiar/sintetizar.
+- 'ocr':   renderizado + OCR (lo más caro); conviene en workers dedicados.
+Un extractor puede además clasificar cada archivo (`classify`): un txt/md que el detector
+de calidad da por limpio no llamará al LLM, así que su coste real es 'local'.
+"""
+import os
+import zipfile
+import logging
+from typing import Callable, Dict, Iterable, Optional
+
+from django.conf import settings
+
+from .models import File
+from .processing_helpers import (
+    clean_text_to_md, docx_to_md, pdf_to_md, ocr_image_to_md, xlsx_to_md, pptx_to_md, text_to_md,
+)
+from .progress import set_stage
+from .text_quality import decide_text_cleanup
+
+logger = logging.getLogger(__name__)
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+# Tamaño máximo que se lee al subir para clasificar el coste de un texto (más grande: 'llm')
+TEXT_CLASSIFY_MAX_BYTES = int(_get_setting("TEXT_CLASSIFY_MAX_BYTES", 1024 * 1024))
+
+COST_LOCAL = 'local'
+COST_LLM = 'llm'
+COST_OCR = 'ocr'
+COST_CLASSES = (COST_LOCAL, COST_LLM, COST_OCR)
+
+# Bytes iniciales que se leen para reconocer el formato
+SNIFF_BYTES = 2048
+
+_MAGIC = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+)
+
+# Carpeta raíz del paquete OOXML -> tipo MIME
+_OOXML_PARTS = (
+    ('word/', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    ('xl/', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    ('ppt/', 'application/vnd.openxmlformats-officedocument.presentationml.presentation'),
+)
+
+
+class Extractor:
+    """
+    Convierte un File a Markdown; `cost` es una de COST_CLASSES (el peor caso del formato).
+    `classify(file_obj)`, si existe, afina el coste de un archivo concreto.
+    """
+
+    def __init__(self, name: str, func: Callable[[File], str], cost: str,
+                 extensions: Iterable[str] = (), mime_types: Iterable[str] = (),
+                 classify: Optional[Callable[[File], str]] = None):
+        if cost not in COST_CLASSES:
+            raise ValueError(f"Coste de extractor desconocido: {cost}")
+        self.name = name
+        self.func = func
+        self.cost = cost
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.mime_types = tuple(mime_types)
+        self.classify = classify
+
+    def extract(self, file_obj: File) -> str:
+        return self.func(file_obj)
+
+    def cost_for(self, file_obj: File) -> str:
+        """Coste de procesar este archivo; ante cualquier duda, el del formato."""
+        if self.classify is None:
+            return self.cost
+        try:
+            cost = self.classify(file_obj)
+        except Exception as e:
+            logger.warning("Extractor %s: no se pudo clasificar el file %s: %s",
+                           self.name, getattr(file_obj, 'id', None), e)
+            return self.cost
+        return cost if cost in COST_CLASSES else self.cost
+
+    def __repr__(self):
+        return f"Extractor({self.name!r}, cost={self.cost!r})"
+
+
+_by_extension: Dict[str, Extractor] = {}
+_by_mime: Dict[str, Extractor] = {}
+
+
+def register_extractor(name: str, extensions: Iterable[str] = (), mime_types: Iterable[str] = (),
+                       cost: str = COST_LLM, classify: Optional[Callable[[File], str]] = None):
+    """Decorador: registra func(file_obj) -> markdown para esas extensiones/tipos MIME."""
+    def decorator(func):
+        extractor = Extractor(name, func, cost, extensions, mime_types, classify)
+        for ext in extractor.extensions:
+            _by_extension[ext] = extractor
+        for mime in extractor.mime_types:
+            _by_mime[mime] = extractor
+        return func
+    return decorator
+
+
+def _file_ext(file_obj: File) -> str:
+    try:
+        return (file_obj.file.name.split('.')[-1] or '').lower()
+    except Exception:
+        return ''
+
+
+def _sniff_ooxml(fh) -> Optional[str]:
+    try:
+        with zipfile.ZipFile(fh) as zf:
+            names = zf.namelist()
+    except zipfile.BadZipFile:
+        return None
+    if '[Content_Types].xml' not in names:
+        return 'application/zip'
+    for prefix, mime in _OOXML_PARTS:
+        if any(n.startswith(prefix) for n in names):
+            return mime
+    return 'application/zip'
+
+
+def _looks_like_text(head: bytes) -> bool:
+    if not head or b'\x00' in head:
+        return False
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Un carácter multibyte cortado al final del bloque no descarta el texto
+        return e.start >= len(head) - 3
+    return True
+
+
+def sniff_mime(file_obj: File) -> Optional[str]:
+    """Tipo MIME según el contenido del archivo (None si no se reconoce o no se puede leer)."""
+    try:
+        with file_obj.file.open('rb') as fh:
+            head = fh.read(SNIFF_BYTES)
+            if head.startswith(b'PK\x03\x04'):
+                fh.seek(0)
+                return _sniff_ooxml(fh)
+    except Exception as e:
+        logger.warning("sniff_mime: no se pudo leer el file %s: %s", getattr(file_obj, 'id', None), e)
+        return None
+    for magic, mime in _MAGIC:
+        if head.startswith(magic):
+            return mime
+    return 'text/plain' if _looks_like_text(head) else None
+
+
+def resolve_extractor(ext: str = '', mime: Optional[str] = None) -> Extractor:
+    """
+    Un formato binario reconocido por su firma manda sobre la extensión; 'text/plain' solo
+    decide si la extensión no tiene extractor. Sin coincidencias, se lee como texto.
+    """
+    if mime and mime != 'text/plain' and mime in _by_mime:
+        return _by_mime[mime]
+    if ext in _by_extension:
+        return _by_extension[ext]
+    return _by_mime.get(mime) or _by_mime['text/plain']
+
+
+def extractor_for_file(file_obj: File) -> Extractor:
+    ext = _file_ext(file_obj)
+    mime = sniff_mime(file_obj)
+    extractor = resolve_extractor(ext, mime)
+    if ext and ext not in extractor.extensions:
+        logger.info("File %s: extensión '%s' pero contenido %s -> extractor %s",
+                    getattr(file_obj, 'id', None), ext, mime, extractor.name)
+    return extractor
+
+
+def registered_extractors() -> Dict[str, Extractor]:
+    """Extractores registrados por extensión (para inspección/admin)."""
+    return dict(_by_extension)
+
+
+def _path_or_file(file_obj: File):
+    return file_obj.file.path if hasattr(file_obj.file, 'path') else file_obj.file
+
+
+def _read_text(file_obj: File) -> str:
+    try:
+        with file_obj.file.open('r', encoding='utf-8', errors='ignore') as fh:
+            return fh.read()
+    except Exception:
+        with file_obj.file.open('rb') as fh:
+            return fh.read().decode('utf-8', errors='ignore')
+
+
+# --- Extractores incluidos ---
+
+def _classify_text(file_obj: File) -> str:
+    # Misma decisión que tomará clean_text_to_md en el worker: texto limpio = sin LLM
+    size = file_obj.file_size if file_obj.file_size is not None else file_obj.file.size
+    if size > TEXT_CLASSIFY_MAX_BYTES:
+        return COST_LLM
+    needed, _ = decide_text_cleanup(text_to_md(_read_text(file_obj)))
+    return COST_LLM if needed else COST_LOCAL
+
+
+# COST_LLM en el peor caso; _classify_text baja a 'local' los textos que no necesitan limpieza
+@register_extractor('text', extensions=('txt', 'md'), mime_types=('text/plain', 'text/markdown'), cost=COST_LLM,
+                    classify=_classify_text)
+def extract_text(file_obj: File) -> str:
+    # Texto ya limpio no sale a la red; la decisión queda registrada en el File
+    md, used_llm, reason = clean_text_to_md(_read_text(file_obj))
+    File.objects.filter(pk=file_obj.pk).update(llm_cleanup=used_llm, llm_cleanup_reason=reason[:255])
+    file_obj.llm_cleanup, file_obj.llm_cleanup_reason = used_llm, reason[:255]
+    return md
+
+
+# Conversión local, pero la heurística de calidad puede pedir la limpieza con el LLM: va a la cola 'llm'
+@register_extractor('docx', extensions=('docx',), mime_types=(_OOXML_PARTS[0][1],), cost=COST_LLM)
+def extract_docx(file_obj: File) -> str:
+    return docx_to_md(_path_or_file(file_obj))
+
+
+@register_extractor('xlsx', extensions=('xlsx',), mime_types=(_OOXML_PARTS[1][1],), cost=COST_LLM)
+def extract_xlsx(file_obj: File) -> str:
+    return xlsx_to_md(_path_or_file(file_obj))
+
+
+@register_extractor('pptx', extensions=('pptx',), mime_types=(_OOXML_PARTS[2][1],), cost=COST_LLM)
+def extract_pptx(file_obj: File) -> str:
+    return pptx_to_md(_path_or_file(file_obj))
+
+
+@register_extractor('pdf', extensions=('pdf',), mime_types=('application/pdf',), cost=COST_OCR)
+def extract_pdf(file_obj: File) -> str:
+    return pdf_to_md(_path_or_file(file_obj))
+
+
+@register_extractor('image', extensions=('png', 'jpg', 'jpeg'), mime_types=('image/png', 'image/jpeg'), cost=COST_OCR)
+def extract_image(file_obj: File) -> str:
+    set_stage("ocr", total=1)
+    return ocr_image_to_md(_path_or_file(file_obj))
@@ -0,0 +1,73 @@
+# backend/files/image_preprocessing.py
+"""
+Normalización de imágenes antes de cualquier motor de OCR (OpenAI Vision o easyocr).
+
+Una foto de 12 MP pesa varios MB y en base64 casi un tercio más; para leer texto
+basta con mucha menos resolución. El pipeline:
+1) corrige la orientación EXIF (fotos de móvil giradas),
+2) reduce el lado mayor a OCR_IMAGE_MAX_SIDE px,
+3) pasa a escala de grises y normaliza el contraste (autocontrast),
+4) recodifica a JPEG (OCR_IMAGE_JPEG_QUALITY).
+Si el resultado no es más pequeño se conservan los bytes originales. Las imágenes no se
+cachean: la normalización es determinista y barata, y lo que se reutiliza es el texto del
+OCR (cached_call "ocr_image" en processing_helpers), no megabytes de imagen en la caché de LLM.
+"""
+import io
+import os
+import logging
+from typing import Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+except Exception:
+    Image = None
+    ImageOps = None
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+OCR_IMAGE_PREPROCESS = _get_setting("OCR_IMAGE_PREPROCESS", "True") in (True, "True", "true", "1")
+# 2048 px es el máximo que usa la API de visión en detalle alto; más resolución solo añade bytes
+OCR_IMAGE_MAX_SIDE = int(_get_setting("OCR_IMAGE_MAX_SIDE", 2048))
+OCR_IMAGE_GRAYSCALE = _get_setting("OCR_IMAGE_GRAYSCALE", "True") in (True, "True", "true", "1")
+OCR_IMAGE_JPEG_QUALITY = int(_get_setting("OCR_IMAGE_JPEG_QUALITY", 85))
+
+
+def _normalize(image_bytes: bytes) -> bytes:
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img = ImageOps.exif_transpose(img)
+        if max(img.size) > OCR_IMAGE_MAX_SIDE:
+            img.thumbnail((OCR_IMAGE_MAX_SIDE, OCR_IMAGE_MAX_SIDE), Image.LANCZOS)
+        if OCR_IMAGE_GRAYSCALE:
+            img = ImageOps.autocontrast(img.convert("L"), cutoff=1)
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=OCR_IMAGE_JPEG_QUALITY, optimize=True)
+        return out.getvalue()
+
+
+def preprocess_image_for_ocr(image_bytes: bytes, ext: str = 'png') -> Tuple[bytes, str]:
+    """
+    Devuelve (bytes, extensión) listos para OCR. Sin Pillow, desactivado o ante cualquier
+    error, devuelve la imagen original.
+    """
+    if not OCR_IMAGE_PREPROCESS or Image is None or not image_bytes:
+        return image_bytes, ext
+
+    try:
+        normalized = _normalize(image_bytes)
+    except Exception as e:
+        logger.warning("preprocess_image_for_ocr: no se pudo normalizar la imagen (%s); se envía la original", e)
+        return image_bytes, ext
+
+    smaller = len(normalized) < len(image_bytes)
+    if smaller:
+        logger.info("preprocess_image_for_ocr: %.0f KB -> %.0f KB", len(image_bytes) / 1024, len(normalized) / 1024)
+    return (normalized, 'jpeg') if smaller else (image_bytes, ext)
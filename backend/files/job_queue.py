@@ -0,0 +1,333 @@
+# backend/files/job_queue.py
+"""
+Cola persistente de procesamiento de archivos sobre la base de datos (sin broker).
+
+- enqueue_file_processing crea un ProcessingJob (uno activo por archivo).
+- claim_job entrega el siguiente job disponible a un worker con un lease de
+  FILE_QUEUE_VISIBILITY_TIMEOUT segundos: con SELECT ... FOR UPDATE SKIP LOCKED
+  donde el motor lo soporta (PostgreSQL, MySQL 8) y, en SQLite, con un UPDATE
+  condicional (solo un worker gana el claim).
+- Mientras el job se procesa, un latido (heartbeat) renueva el lease cada tercio de su
+  duración; si el worker muere, el lease vence y el job vuelve a la cola. Tras
+  max_attempts intentos queda 'failed' y el File en 'error'.
+- Prioridades: los jobs interactivos (subida de un archivo suelto) se entregan
+  antes que los masivos; dentro de una prioridad se prefiere al usuario con
+  menos jobs en curso y ningún usuario supera FILE_QUEUE_USER_CONCURRENCY
+  jobs simultáneos (límite aproximado entre workers).
+- Cada job lleva el coste de su extractor (local/llm/ocr); un worker puede limitarse
+  a ciertos costes (p. ej. máquinas con GPU solo para 'ocr').
+"""
+import os
+import socket
+import logging
+import threading
+from datetime import timedelta
+from typing import Optional, Sequence
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import File, ProcessingJob
+
+logger = logging.getLogger(__name__)
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+# 'auto' (Celery si está disponible, si no un hilo por archivo) o 'db' (esta cola + process_files_worker)
+FILE_PROCESSING_BACKEND = str(_get_setting("FILE_PROCESSING_BACKEND", "auto")).lower()
+# Segundos que un worker retiene un job sin renovar el lease (el heartbeat lo renueva mientras procesa)
+FILE_QUEUE_VISIBILITY_TIMEOUT = int(_get_setting("FILE_QUEUE_VISIBILITY_TIMEOUT", 900))
+FILE_QUEUE_MAX_ATTEMPTS = int(_get_setting("FILE_QUEUE_MAX_ATTEMPTS", 3))
+FILE_QUEUE_RETRY_DELAY = int(_get_setting("FILE_QUEUE_RETRY_DELAY", 30))  # base del backoff (s)
+# Jobs en curso a la vez por usuario (0 = sin límite)
+FILE_QUEUE_USER_CONCURRENCY = int(_get_setting("FILE_QUEUE_USER_CONCURRENCY", 2))
+# Candidatos que se examinan por claim para el reparto justo entre usuarios
+FILE_QUEUE_CLAIM_WINDOW = int(_get_setting("FILE_QUEUE_CLAIM_WINDOW", 50))
+# Subidas con más archivos que esto se encolan como trabajo masivo
+FILE_BULK_UPLOAD_THRESHOLD = int(_get_setting("FILE_BULK_UPLOAD_THRESHOLD", 3))
+# Opt-in: costes de extractor que se procesan en la propia petición de subida (sin cola) y su
+# tamaño máximo. Solo se admite 'local' y solo en subidas de un único archivo (ver FileViewSet)
+FILE_INLINE_COSTS = tuple(c.strip() for c in str(_get_setting("FILE_INLINE_COSTS", "")).split(",") if c.strip())
+FILE_INLINE_MAX_BYTES = int(_get_setting("FILE_INLINE_MAX_BYTES", 1024 * 1024))
+# Con Celery, cada coste va a la cola '<prefijo>.<coste>' (vacío = cola por defecto)
+FILE_CELERY_QUEUE_PREFIX = str(_get_setting("FILE_CELERY_QUEUE_PREFIX", ""))
+
+PRIORITY_NAMES = {
+    ProcessingJob.PRIORITY_INTERACTIVE: 'interactive',
+    ProcessingJob.PRIORITY_BULK: 'bulk',
+}
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_file_processing(file_id: int,
+                            delay: int = 0,
+                            priority: int = ProcessingJob.PRIORITY_INTERACTIVE,
+                            user_id: Optional[int] = None,
+                            cost: str = 'llm') -> ProcessingJob:
+    """
+    Encola el procesamiento de un archivo; si ya hay un job activo para él, lo devuelve
+    (subiéndole la prioridad si la nueva petición es más urgente).
+    """
+    def active():
+        job = ProcessingJob.objects.filter(file_id=file_id, status__in=ProcessingJob.ACTIVE_STATUSES).first()
+        if job is not None and priority < job.priority:
+            ProcessingJob.objects.filter(pk=job.pk).update(priority=priority)
+            job.priority = priority
+        return job
+
+    existing = active()
+    if existing is not None:
+        return existing
+    if user_id is None:
+        user_id = File.objects.filter(pk=file_id).values_list('note__notebook__user_id', flat=True).first()
+    try:
+        with transaction.atomic():
+            return ProcessingJob.objects.create(
+                file_id=file_id,
+                user_id=user_id,
+                priority=priority,
+                cost=cost,
+                max_attempts=FILE_QUEUE_MAX_ATTEMPTS,
+                available_at=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        existing = active()
+        if existing is not None:
+            return existing
+        raise
+
+
+def requeue_expired() -> int:
+    """Devuelve a la cola los jobs cuyo lease venció (worker caído); los que agotaron intentos fallan."""
+    now = timezone.now()
+    expired = ProcessingJob.objects.filter(status='running', lease_expires_at__lt=now)
+    count = 0
+    for job in expired.only('id', 'file_id', 'attempts', 'max_attempts'):
+        if job.attempts >= job.max_attempts:
+            updated = ProcessingJob.objects.filter(pk=job.pk, status='running', lease_expires_at__lt=now).update(
+                status='failed', finished_at=now, locked_by='', lease_expires_at=None,
+                last_error='Lease vencido: el worker no completó el job',
+            )
+            if updated:
+                File.objects.filter(pk=job.file_id).update(
+                    processing_status='error', processing_error='Procesamiento abandonado tras varios intentos')
+        else:
+            updated = ProcessingJob.objects.filter(pk=job.pk, status='running', lease_expires_at__lt=now).update(
+                status='queued', available_at=now, locked_by='', lease_expires_at=None,
+                last_error='Lease vencido: reintentando',
+            )
+            if updated:
+                File.objects.filter(pk=job.file_id).update(processing_status='queued', processing_stage='')
+        count += updated
+    if count:
+        logger.warning("Cola de archivos: %s jobs con lease vencido", count)
+    return count
+
+
+def _claim_candidates(max_priority: Optional[int] = None, costs: Optional[Sequence[str]] = None):
+    qs = ProcessingJob.objects.filter(status='queued', available_at__lte=timezone.now())
+    if max_priority is not None:
+        qs = qs.filter(priority__lte=max_priority)
+    if costs:
+        qs = qs.filter(cost__in=costs)
+    return qs.order_by('priority', 'available_at', 'id')
+
+
+def _fair_order(max_priority: Optional[int] = None, costs: Optional[Sequence[str]] = None):
+    """
+    Ids candidatos en orden de entrega: prioridad, luego el usuario con menos jobs en curso
+    (reparto justo), luego antigüedad. Se omiten usuarios que ya están en su límite.
+    """
+    # Jobs en curso por usuario: como mucho uno por worker vivo, la consulta es pequeña
+    running = dict(
+        ProcessingJob.objects.filter(status='running', user_id__isnull=False)
+        .values('user_id').annotate(n=Count('id')).values_list('user_id', 'n')
+    )
+    qs = _claim_candidates(max_priority, costs)
+    if FILE_QUEUE_USER_CONCURRENCY > 0:
+        # Los usuarios en su límite se excluyen ANTES de recortar la ventana: si no, la cola de un
+        # solo usuario puede llenar los FILE_QUEUE_CLAIM_WINDOW candidatos y dejar al worker ocioso
+        capped = [user_id for user_id, n in running.items() if n >= FILE_QUEUE_USER_CONCURRENCY]
+        if capped:
+            qs = qs.exclude(user_id__in=capped)
+    candidates = list(qs.values('id', 'user_id', 'priority', 'available_at')[:FILE_QUEUE_CLAIM_WINDOW])
+    candidates.sort(key=lambda c: (c['priority'], running.get(c['user_id'], 0), c['available_at'], c['id']))
+    return [c['id'] for c in candidates]
+
+
+def _lease_fields(worker_id: str, lease_seconds: int):
+    now = timezone.now()
+    return {
+        'status': 'running',
+        'locked_by': worker_id[:100],
+        'lease_expires_at': now + timedelta(seconds=lease_seconds),
+        'started_at': now,
+    }
+
+
+def _try_claim(job_id: int, worker_id: str, lease_seconds: int) -> Optional[ProcessingJob]:
+    if connection.features.has_select_for_update_skip_locked:
+        # Otro worker ya tiene la fila bloqueada: la saltamos sin esperar
+        with transaction.atomic():
+            job = ProcessingJob.objects.select_for_update(skip_locked=True).filter(pk=job_id, status='queued').first()
+            if job is None:
+                return None
+            fields = _lease_fields(worker_id, lease_seconds)
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.attempts += 1
+            job.wait_seconds = max(0.0, (job.started_at - job.available_at).total_seconds())
+            job.save(update_fields=list(fields) + ['attempts', 'wait_seconds'])
+            return job
+
+    # SQLite: sin SKIP LOCKED; el UPDATE condicional solo lo gana un worker
+    fields = _lease_fields(worker_id, lease_seconds)
+    won = ProcessingJob.objects.filter(pk=job_id, status='queued').update(attempts=F('attempts') + 1, **fields)
+    if not won:
+        return None
+    job = ProcessingJob.objects.get(pk=job_id)
+    job.wait_seconds = max(0.0, (job.started_at - job.available_at).total_seconds())
+    ProcessingJob.objects.filter(pk=job_id).update(wait_seconds=job.wait_seconds)
+    return job
+
+
+def claim_job(worker_id: str,
+              lease_seconds: int = FILE_QUEUE_VISIBILITY_TIMEOUT,
+              max_priority: Optional[int] = None,
+              costs: Optional[Sequence[str]] = None) -> Optional[ProcessingJob]:
+    """
+    Reserva el siguiente job disponible para worker_id; None si no hay ninguno entregable.
+    max_priority limita el claim a jobs de esa prioridad o más urgentes (consumidores reservados);
+    costs, a jobs con esos costes de extractor (workers dedicados).
+    """
+    for job_id in _fair_order(max_priority, costs):
+        job = _try_claim(job_id, worker_id, lease_seconds)
+        if job is not None:
+            return job
+    return None
+
+
+def complete_job(job: ProcessingJob):
+    ProcessingJob.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status='done', finished_at=timezone.now(), lease_expires_at=None, last_error='',
+    )
+
+
+def fail_job(job: ProcessingJob, error: str):
+    """
+    Reintenta con backoff exponencial o marca el job como failed si agotó los intentos.
+    El File vuelve a 'queued' mientras quedan reintentos; solo el último fallo lo deja en 'error'.
+    """
+    now = timezone.now()
+    qs = ProcessingJob.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    if job.attempts >= job.max_attempts:
+        if qs.update(status='failed', finished_at=now, lease_expires_at=None, last_error=error or ''):
+            File.objects.filter(pk=job.file_id).update(processing_status='error', processing_error=error or '')
+        return
+    delay = FILE_QUEUE_RETRY_DELAY * (2 ** (job.attempts - 1))
+    if qs.update(status='queued', available_at=now + timedelta(seconds=delay), locked_by='',
+                 lease_expires_at=None, last_error=error or ''):
+        File.objects.filter(pk=job.file_id).update(processing_status='queued', processing_stage='')
+
+
+class LeaseHeartbeat(threading.Thread):
+    """
+    Renueva el lease de un job en curso cada lease/3 segundos, para que un archivo que tarda
+    más que el lease no vuelva a la cola (y se procese dos veces) mientras el worker sigue vivo.
+    Se detiene con stop() o si el job deja de pertenecer a este worker.
+    """
+
+    def __init__(self, job: ProcessingJob, lease_seconds: int):
+        super().__init__(name=f"lease-heartbeat-{job.pk}", daemon=True)
+        self.job_id = job.pk
+        self.locked_by = job.locked_by
+        self.lease_seconds = lease_seconds
+        self.interval = max(1.0, lease_seconds / 3.0)
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                renewed = ProcessingJob.objects.filter(
+                    pk=self.job_id, status='running', locked_by=self.locked_by,
+                ).update(lease_expires_at=timezone.now() + timedelta(seconds=self.lease_seconds))
+                if not renewed:
+                    logger.warning("ProcessingJob %s: lease perdido, se detiene el heartbeat", self.job_id)
+                    return
+        except Exception:
+            logger.exception("ProcessingJob %s: fallo renovando el lease", self.job_id)
+        finally:
+            connection.close()  # conexión propia de este hilo
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _job_lease_seconds(job: ProcessingJob) -> int:
+    if job.lease_expires_at and job.started_at:
+        return max(1, int((job.lease_expires_at - job.started_at).total_seconds()))
+    return FILE_QUEUE_VISIBILITY_TIMEOUT
+
+
+def run_claimed_job(job: ProcessingJob) -> bool:
+    """Procesa el archivo del job (renovando su lease) y registra el resultado. Retorna True si terminó bien."""
+    from .tasks import process_file_sync
+
+    heartbeat = LeaseHeartbeat(job, _job_lease_seconds(job))
+    heartbeat.start()
+    error = ''
+    try:
+        ok = process_file_sync(job.file_id)
+    except Exception as e:
+        logger.exception("ProcessingJob %s falló: %s", job.id, e)
+        ok, error = False, str(e)
+    finally:
+        heartbeat.stop()
+    if ok:
+        complete_job(job)
+        return True
+    if not error:
+        error = File.objects.filter(pk=job.file_id).values_list('processing_error', flat=True).first()
+    fail_job(job, error or 'process_file_sync devolvió False')
+    return False
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return round(ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo), 3)
+
+
+def queue_metrics(sample: int = 200):
+    """Profundidad, antigüedad y espera en cola (p50/p95 de los últimos `sample` claims) por prioridad."""
+    now = timezone.now()
+    out = {}
+    for priority, name in PRIORITY_NAMES.items():
+        queued = ProcessingJob.objects.filter(status='queued', priority=priority)
+        oldest = queued.order_by('available_at').values_list('available_at', flat=True).first()
+        waits = list(
+            ProcessingJob.objects.filter(priority=priority, wait_seconds__isnull=False)
+            .order_by('-started_at').values_list('wait_seconds', flat=True)[:sample]
+        )
+        out[name] = {
+            "queued": queued.count(),
+            "running": ProcessingJob.objects.filter(status='running', priority=priority).count(),
+            "oldest_queued_seconds": round(max(0.0, (now - oldest).total_seconds()), 3) if oldest else 0.0,
+            "wait_p50_seconds": _percentile(waits, 50),
+            "wait_p95_seconds": _percentile(waits, 95),
+            "sampled": len(waits),
+        }
+    return out
@@ -0,0 +1,109 @@
+# backend/files/management/commands/process_files_worker.py
+"""
+Worker de la cola persistente de archivos (FILE_PROCESSING_BACKEND='db').
+
+    python manage.py process_files_worker --concurrency 4
+    python manage.py process_files_worker --once        # vacía la cola y termina
+
+Cada consumidor es un hilo que reclama jobs con lease; se pueden lanzar varios
+procesos/máquinas contra la misma base de datos. Los primeros --interactive-slots
+consumidores solo toman jobs interactivos, así una subida suelta no espera a que
+termine un lote masivo. --costs limita el worker a ciertos extractores
+(p. ej. `--costs ocr` en máquinas con GPU). SIGTERM/SIGINT terminan el job en curso y salen.
+"""
+import time
+import signal
+import logging
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+
+from files.job_queue import (
+    FILE_QUEUE_VISIBILITY_TIMEOUT, PRIORITY_NAMES, claim_job, default_worker_id, requeue_expired, run_claimed_job,
+)
+from files.models import ProcessingJob
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Procesa archivos de la cola persistente (ProcessingJob) con N consumidores concurrentes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="Consumidores (hilos) en este proceso")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Espera (s) con la cola vacía")
+        parser.add_argument("--lease", type=int, default=FILE_QUEUE_VISIBILITY_TIMEOUT,
+                            help="Visibility timeout (s) de cada job reclamado")
+        parser.add_argument("--worker-id", default="", help="Identificador del worker (por defecto host:pid)")
+        parser.add_argument("--interactive-slots", type=int, default=None,
+                            help="Consumidores reservados a jobs interactivos (por defecto 1 si concurrency > 1)")
+        parser.add_argument("--costs", default="",
+                            help="Costes de extractor que atiende este worker, p. ej. 'ocr' o 'local,llm' (todos por defecto)")
+        parser.add_argument("--once", action="store_true", help="Salir cuando la cola esté vacía")
+
+    def handle(self, *args, **opts):
+        self.stop = threading.Event()
+        base_id = opts["worker_id"] or default_worker_id()
+        concurrency = max(1, opts["concurrency"])
+        slots = opts["interactive_slots"]
+        if slots is None:
+            slots = 1 if concurrency > 1 else 0
+        slots = max(0, min(slots, concurrency - 1))  # al menos un consumidor atiende el trabajo masivo
+        opts["costs"] = [c.strip() for c in opts["costs"].split(",") if c.strip()]
+        unknown = set(opts["costs"]) - {c for c, _ in ProcessingJob.COST_CHOICES}
+        if unknown:
+            raise CommandError(f"Costes desconocidos: {', '.join(sorted(unknown))}")
+
+        def request_stop(signum, frame):
+            self.stdout.write("Deteniendo workers (se termina el job en curso)...")
+            self.stop.set()
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, request_stop)
+            signal.signal(signal.SIGTERM, request_stop)
+
+        self.stdout.write(f"Worker {base_id}: {concurrency} consumidores ({slots} solo interactivos), "
+                          f"lease {opts['lease']}s, costes {','.join(opts['costs']) or 'todos'}")
+        threads = [
+            threading.Thread(
+                target=self._consume,
+                args=(f"{base_id}#{n}", opts, ProcessingJob.PRIORITY_INTERACTIVE if n < slots else None),
+                name=f"file-worker-{n}",
+            )
+            for n in range(concurrency)
+        ]
+        for t in threads:
+            t.start()
+        # join con timeout para que el hilo principal siga atendiendo señales
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=0.5)
+
+    def _consume(self, worker_id: str, opts, max_priority=None):
+        processed = 0
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    requeue_expired()
+                    job = claim_job(worker_id, lease_seconds=opts["lease"], max_priority=max_priority,
+                                    costs=opts["costs"])
+                except OperationalError as e:
+                    # p. ej. "database is locked" en SQLite bajo contención: reintentar
+                    logger.warning("%s: error reclamando job: %s", worker_id, e)
+                    job = None
+                if job is None:
+                    if opts["once"]:
+                        break
+                    self.stop.wait(opts["poll_interval"])
+                    continue
+                started = time.monotonic()
+                ok = run_claimed_job(job)
+                processed += 1
+                logger.info("%s: file %s (%s) %s en %.1fs tras %.1fs en cola (intento %s)", worker_id, job.file_id,
+                            PRIORITY_NAMES.get(job.priority, job.priority), "procesado" if ok else "falló",
+                            time.monotonic() - started, job.wait_seconds or 0.0, job.attempts)
+        finally:
+            close_old_connections()
+            self.stdout.write(f"{worker_id}: {processed} jobs procesados")
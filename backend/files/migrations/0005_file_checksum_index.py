@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_alter_file_options_alter_file_language'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_processingjob_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checksum', models.CharField(db_index=True, max_length=64)),
+                ('stage', models.CharField(max_length=50)),
+                ('unit', models.PositiveIntegerField()),
+                ('result', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('checksum', 'stage', 'unit'), name='unique_processing_checkpoint')],
+            },
+        ),
+    ]
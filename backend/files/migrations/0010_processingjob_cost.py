@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_file_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='cost',
+            field=models.CharField(choices=[('local', 'Local'), ('llm', 'LLM'), ('ocr', 'OCR')], default='llm', max_length=10),
+        ),
+    ]
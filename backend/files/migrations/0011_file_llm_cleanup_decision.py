@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_processingjob_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='llm_cleanup',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='llm_cleanup_reason',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
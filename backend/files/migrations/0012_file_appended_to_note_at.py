@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0011_file_llm_cleanup_decision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='appended_to_note_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
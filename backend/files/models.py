@@ -59,9 +59,23 @@ class File(models.Model):
     processing_status = models.CharField(max_length=20, choices=PROCESSING_STATUS, default='queued')
     processing_error = models.TextField(blank=True, null=True)
     md_content = models.TextField(blank=True, null=True)   # contenido extraído/convertido a markdown
-    checksum = models.CharField(max_length=64, blank=True, null=True)  # sha256
+    checksum = models.CharField(max_length=64, blank=True, null=True, db_index=True)  # sha256 (dedup)
     language = models.CharField(max_length=20, blank=True, null=True)
 
+    # Progreso fino mientras processing_status='processing' (lo escribe files.progress)
+    processing_stage = models.CharField(max_length=40, blank=True, default='')
+    progress_done = models.PositiveIntegerField(default=0)   # páginas/chunks/slides hechos en la etapa
+    progress_total = models.PositiveIntegerField(default=0)  # 0 = total desconocido
+    stage_started_at = models.DateTimeField(blank=True, null=True)
+    progress_updated_at = models.DateTimeField(blank=True, null=True)
+
+    # Decisión de la política de limpieza con LLM (txt/md): None = no evaluada
+    llm_cleanup = models.BooleanField(blank=True, null=True)
+    llm_cleanup_reason = models.CharField(max_length=255, blank=True, default='')
+
+    # Momento en que md_content se anexó a la nota (evita anexarlo dos veces en reintentos)
+    appended_to_note_at = models.DateTimeField(blank=True, null=True)
+
     class Meta:
         ordering = ['-uploaded_at']
 
@@ -85,27 +99,144 @@ class File(models.Model):
         except Exception:
             return None
 
+    @staticmethod
+    def _checksum_of_upload(content):
+        """SHA256 del contenido subido: el que calcularon los upload handlers o, si no hay, leyéndolo en memoria/temporal."""
+        sha = getattr(content, 'sha256', None)
+        if sha:
+            return sha
+        try:
+            h = hashlib.sha256()
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                h.update(chunk)
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            return h.hexdigest()
+        except Exception:
+            return None
+
     def save(self, *args, **kwargs):
         is_new = self._state.adding  # True si es un nuevo archivo
 
-        # Primero guarda normalmente (esto guarda el archivo en disco)
-        super().save(*args, **kwargs)
-
-        # Luego, una vez guardado, extraemos metadatos y actualizamos
-        if is_new and self.file:
+        # Archivo nuevo: lo escribimos primero en el storage (sin guardar el modelo) para conocer
+        # el nombre definitivo, y así el INSERT lleva ya todos los metadatos (una sola escritura)
+        if is_new and self.file and not self.file._committed:
+            content = self.file.file
             try:
-                self.filename = self.file.name.split('/')[-1]
-                self.file_type = self.file.name.split('.')[-1].lower()
-                self.file_size = getattr(self.file, 'size', None)
                 if not self.checksum:
-                    self.checksum = self.compute_checksum()
-                # Guardamos solo los metadatos (sin volver a escribir el archivo)
-                super().save(update_fields=['filename', 'file_type', 'file_size', 'checksum'])
+                    self.checksum = self._checksum_of_upload(content)
+                self.file_size = getattr(content, 'size', None)
             except Exception as e:
                 import logging
-                logging.getLogger(__name__).warning(f"Error actualizando metadatos del archivo {self.id}: {e}")
+                logging.getLogger(__name__).warning(f"Error calculando metadatos del archivo: {e}")
+            self.file.save(self.file.name, content, save=False)
+
+        if is_new and self.file:
+            self.filename = self.file.name.split('/')[-1]
+            self.file_type = self.file.name.split('.')[-1].lower()
+            if self.file_size is None:
+                self.file_size = getattr(self.file, 'size', None)
+            if not self.checksum:
+                self.checksum = self.compute_checksum()
 
+        super().save(*args, **kwargs)
 
     def __str__(self):
         note_title = getattr(self.note, 'title', str(self.note_id)) if getattr(self, 'note_id', None) else 'No note'
         return f"{self.filename} (note: {note_title})"
+
+
+class ProcessingJob(models.Model):
+    """
+    Trabajo de procesamiento de un File en la cola persistente (FILE_PROCESSING_BACKEND='db').
+    Lo consumen los workers de `manage.py process_files_worker`.
+    """
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    # Menor valor = mayor prioridad: las subidas interactivas adelantan al trabajo masivo
+    PRIORITY_INTERACTIVE = 0
+    PRIORITY_BULK = 10
+    PRIORITY_CHOICES = [
+        (PRIORITY_INTERACTIVE, 'Interactive'),
+        (PRIORITY_BULK, 'Bulk'),
+    ]
+
+    # Coste del extractor del archivo (files.extractors): permite workers dedicados a OCR/LLM
+    COST_CHOICES = [
+        ('local', 'Local'),
+        ('llm', 'LLM'),
+        ('ocr', 'OCR'),
+    ]
+
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='processing_jobs')
+    # Dueño del archivo (denormalizado): reparto justo y límite de concurrencia por usuario
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             related_name='processing_jobs', blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=PRIORITY_INTERACTIVE)
+    cost = models.CharField(max_length=10, choices=COST_CHOICES, default='llm')
+
+    # Reintentos: attempts cuenta los claims; al llegar a max_attempts el job queda failed
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # No se entrega antes de esta fecha (backoff entre reintentos)
+    available_at = models.DateTimeField(db_index=True)
+    # Lease del worker: si vence sin completar, el job vuelve a la cola (visibility timeout)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default='')
+    # Espera en cola del último intento (desde available_at hasta el claim), para métricas por prioridad
+    wait_seconds = models.FloatField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    ACTIVE_STATUSES = ('queued', 'running')
+
+    class Meta:
+        ordering = ['priority', 'available_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='procjob_status_available'),
+            models.Index(fields=['status', 'priority', 'available_at'], name='procjob_status_priority'),
+        ]
+        constraints = [
+            # Un solo job activo por archivo
+            models.UniqueConstraint(
+                fields=['file'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_processing_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"ProcessingJob #{self.id} (file: {self.file_id}, {self.status})"
+
+
+class ProcessingCheckpoint(models.Model):
+    """
+    Resultado intermedio de una unidad (página, chunk, slide...) del procesamiento de un archivo.
+    Clave: (checksum del contenido, etapa, unidad); un reintento retoma desde la primera unidad sin checkpoint.
+    """
+
+    checksum = models.CharField(max_length=64, db_index=True)
+    stage = models.CharField(max_length=50)
+    unit = models.PositiveIntegerField()
+    result = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['checksum', 'stage', 'unit'], name='unique_processing_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.stage}#{self.unit} ({self.checksum[:12]})"
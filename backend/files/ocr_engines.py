@@ -0,0 +1,154 @@
+# backend/files/ocr_engines.py
+"""
+Pool de motores de OCR local (easyocr) compartido por el proceso.
+
+Crear un easyocr.Reader carga los pesos del modelo (varios segundos), así que los
+readers se crean una sola vez por conjunto de idiomas y se reutilizan:
+- Lazy: el primer uso crea el reader; LOCAL_OCR_PREWARM los crea al arrancar.
+- LOCAL_OCR_INSTANCES readers por conjunto de idiomas para OCR concurrente
+  (un Reader no es seguro para usar desde varios hilos a la vez).
+"""
+import io
+import os
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import easyocr
+except Exception:
+    easyocr = None
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+LOCAL_OCR_LANGS = tuple(l.strip() for l in str(_get_setting("LOCAL_OCR_LANGS", "es,en")).split(",") if l.strip())
+LOCAL_OCR_INSTANCES = int(_get_setting("LOCAL_OCR_INSTANCES", 1))
+LOCAL_OCR_GPU = _get_setting("LOCAL_OCR_GPU", "False") in (True, "True", "true", "1")
+LOCAL_OCR_PREWARM = _get_setting("LOCAL_OCR_PREWARM", "False") in (True, "True", "true", "1")
+
+
+class OCREnginePool:
+    """Readers de easyocr por tupla de idiomas, hasta `instances` por tupla."""
+
+    def __init__(self, instances: int = LOCAL_OCR_INSTANCES, gpu: bool = LOCAL_OCR_GPU):
+        self.instances = max(1, instances)
+        self.gpu = gpu
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, ...], queue.Queue] = {}
+        self._created: Dict[Tuple[str, ...], int] = {}
+
+    @staticmethod
+    def _key(langs: Optional[Iterable[str]]) -> Tuple[str, ...]:
+        return tuple(sorted(langs or LOCAL_OCR_LANGS))
+
+    def _new_reader(self, key: Tuple[str, ...]):
+        logger.info("OCR local: cargando easyocr.Reader %s (gpu=%s)", list(key), self.gpu)
+        return easyocr.Reader(list(key), gpu=self.gpu)
+
+    @contextmanager
+    def reader(self, langs: Optional[Iterable[str]] = None):
+        """Presta un reader libre; crea uno nuevo si no se alcanzó el límite, si no espera."""
+        if easyocr is None:
+            raise RuntimeError("easyocr no está instalado.")
+        key = self._key(langs)
+        with self._lock:
+            idle = self._idle.setdefault(key, queue.Queue())
+            create = idle.empty() and self._created.get(key, 0) < self.instances
+            if create:
+                self._created[key] = self._created.get(key, 0) + 1
+        if create:
+            try:
+                engine = self._new_reader(key)
+            except Exception:
+                with self._lock:
+                    self._created[key] -= 1
+                raise
+        else:
+            engine = idle.get()
+        try:
+            yield engine
+        finally:
+            idle.put(engine)
+
+    def prewarm(self, langs: Optional[Iterable[str]] = None, count: Optional[int] = None):
+        """Crea por adelantado hasta `count` readers (por defecto todas las instancias)."""
+        key = self._key(langs)
+        count = min(self.instances, count or self.instances)
+        while True:
+            with self._lock:
+                idle = self._idle.setdefault(key, queue.Queue())
+                if self._created.get(key, 0) >= count:
+                    return
+                self._created[key] = self._created.get(key, 0) + 1
+            try:
+                idle.put(self._new_reader(key))
+            except Exception:
+                with self._lock:
+                    self._created[key] -= 1
+                raise
+
+    def stats(self):
+        with self._lock:
+            return {"+".join(k): {"created": self._created.get(k, 0), "idle": q.qsize()}
+                    for k, q in self._idle.items()}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool() -> OCREnginePool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OCREnginePool()
+    return _pool
+
+
+def local_ocr_available() -> bool:
+    return easyocr is not None
+
+
+def ocr_image_bytes(image_bytes: bytes, langs: Optional[Iterable[str]] = None) -> str:
+    """OCR local de una imagen (bytes) con un reader del pool; devuelve el texto en líneas."""
+    import numpy as np
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    arr = np.array(img)
+    with get_ocr_pool().reader(langs) as engine:
+        results = engine.readtext(arr, detail=0)
+    return "\n".join(results).strip()
+
+
+def ocr_image_path(path: str, langs: Optional[Iterable[str]] = None) -> str:
+    with get_ocr_pool().reader(langs) as engine:
+        results = engine.readtext(path, detail=0)
+    return "\n".join(results).strip()
+
+
+def prewarm_in_background():
+    """Carga los readers en un hilo para no retrasar el arranque del proceso."""
+    if easyocr is None:
+        logger.warning("LOCAL_OCR_PREWARM activo pero easyocr no está instalado.")
+        return None
+
+    def run():
+        try:
+            get_ocr_pool().prewarm()
+        except Exception:
+            logger.exception("OCR local: fallo precalentando readers")
+
+    t = threading.Thread(target=run, name="ocr-prewarm", daemon=True)
+    t.start()
+    return t
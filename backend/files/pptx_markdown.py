@@ -0,0 +1,136 @@
+# backend/files/pptx_markdown.py
+"""
+Extracción local de presentaciones PPTX (python-pptx) por diapositiva.
+
+De cada slide se obtiene, sin LLM:
+- el título (placeholder de título) y el texto del resto de formas, incluidas las agrupadas;
+- las tablas, ya en Markdown;
+- las notas del orador.
+pptx_to_md (processing_helpers) solo envía al LLM título + texto, agrupando slides
+consecutivas en lotes con presupuesto de tokens (pack_slides).
+"""
+import logging
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pptx import Presentation
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+except Exception:
+    Presentation = None
+    MSO_SHAPE_TYPE = None
+
+
+class SlideContent:
+    def __init__(self, number: int):
+        self.number = number  # 1-based, como en PowerPoint
+        self.title = ''
+        self.texts: List[str] = []
+        self.tables: List[str] = []
+        self.notes = ''
+
+    @property
+    def text(self) -> str:
+        """Lo que se envía al LLM: título y texto de las formas."""
+        parts = [f"Título: {self.title}"] if self.title else []
+        parts.extend(self.texts)
+        return "\n\n".join(parts)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.title or self.texts or self.tables or self.notes)
+
+
+def _md_cell(text: str) -> str:
+    return (text or '').strip().replace('|', '\\|').replace('\n', '<br>')
+
+
+def _table_to_md(table) -> str:
+    rows = [[_md_cell(cell.text) for cell in row.cells] for row in table.rows]
+    rows = [r for r in rows if any(r)]
+    if not rows:
+        return ''
+    width = max(len(r) for r in rows)
+    rows = [r + [''] * (width - len(r)) for r in rows]
+    lines = ['| ' + ' | '.join(rows[0]) + ' |', '|' + '---|' * width]
+    lines += ['| ' + ' | '.join(r) + ' |' for r in rows[1:]]
+    return '\n'.join(lines)
+
+
+def _walk_shapes(shapes):
+    for shape in shapes:
+        if MSO_SHAPE_TYPE is not None and shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            yield from _walk_shapes(shape.shapes)
+        else:
+            yield shape
+
+
+def _slide_content(number: int, slide) -> SlideContent:
+    content = SlideContent(number)
+    title_shape = slide.shapes.title
+    if title_shape is not None and title_shape.has_text_frame:
+        content.title = title_shape.text_frame.text.strip()
+    for shape in _walk_shapes(slide.shapes):
+        if title_shape is not None and shape.shape_id == title_shape.shape_id:
+            continue
+        if getattr(shape, 'has_table', False) and shape.has_table:
+            md = _table_to_md(shape.table)
+            if md:
+                content.tables.append(md)
+        elif getattr(shape, 'has_text_frame', False) and shape.has_text_frame:
+            text = shape.text_frame.text.strip()
+            if text:
+                content.texts.append(text)
+    if slide.has_notes_slide:
+        notes_frame = slide.notes_slide.notes_text_frame
+        if notes_frame is not None:
+            content.notes = notes_frame.text.strip()
+    return content
+
+
+def extract_slides(path) -> List[SlideContent]:
+    """Contenido de cada diapositiva con algo de texto, tabla o notas."""
+    if Presentation is None:
+        raise RuntimeError("python-pptx no está instalado.")
+    prs = Presentation(path)
+    slides = [_slide_content(i + 1, slide) for i, slide in enumerate(prs.slides)]
+    return [s for s in slides if not s.is_empty]
+
+
+def pack_slides(slides: List[SlideContent], budget_tokens: int,
+                count_tokens: Callable[[str], int]) -> List[List[SlideContent]]:
+    """
+    Agrupa slides consecutivas con texto en lotes de como mucho budget_tokens (una slide
+    más grande que el presupuesto va sola). Las slides sin texto no se envían.
+    """
+    batches: List[List[SlideContent]] = []
+    current: List[SlideContent] = []
+    used = 0
+    for slide in slides:
+        if not slide.text:
+            continue
+        tokens = count_tokens(slide.text)
+        if current and used + tokens > budget_tokens:
+            batches.append(current)
+            current, used = [], 0
+        current.append(slide)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def slide_markdown(slide: SlideContent, body: Optional[str]) -> str:
+    """Sección Markdown de la slide: cuerpo (del LLM o local), tablas y notas del orador."""
+    heading = f"### Slide {slide.number}" + (f": {slide.title}" if slide.title else "")
+    parts = [heading]
+    if body:
+        parts.append(body.strip())
+    elif slide.texts:
+        parts.append("\n\n".join(slide.texts))
+    parts.extend(slide.tables)
+    if slide.notes:
+        notes = slide.notes.replace('\n', '\n> ')
+        parts.append(f"> **Notas del orador:** {notes}")
+    return "\n\n".join(parts)
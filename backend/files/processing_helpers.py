@@ -2,31 +2,47 @@
 import os
 import io
 import re
-import time
+import json
 import base64
+import hashlib
 import logging
-from typing import Optional, List, Tuple
+from typing import Callable, Optional, List, Tuple, TypeVar
 
 from django.conf import settings
 
+from ai_tools.llm_cache import cached_call
+from ai_tools.llm_client import chat_completion
+from ai_tools.concurrency import map_ordered
+from ai_tools.chunking import chunk_text, count_tokens, truncate_to_tokens, LLM_MAX_INPUT_TOKENS
+
 logger = logging.getLogger(__name__)
 
-# Optional local OCR import - se mantiene como fallback
-try:
-    import easyocr
-except Exception:
-    easyocr = None
+# OCR local opcional (easyocr) con readers reutilizados del pool del proceso
+from .ocr_engines import easyocr, ocr_image_bytes, ocr_image_path, LOCAL_OCR_INSTANCES
+from .image_preprocessing import preprocess_image_for_ocr
+from . import progress
+from .checkpoints import checkpointed_map, load_checkpoints
+from .text_quality import decide_text_cleanup
+
+# DOCX -> Markdown local (python-docx opcional)
+from .docx_markdown import Document, convert_docx
+# XLSX en streaming con estadísticas por columna (openpyxl opcional)
+from .xlsx_markdown import summarize_workbook
+# PPTX: extracción local por slide y empaquetado en lotes (python-pptx opcional)
+from .pptx_markdown import extract_slides, pack_slides, slide_markdown
 
 # Optional extractors (will be used if available)
 try:
-    from docx import Document
+    from pdfminer.high_level import extract_text as pdfminer_extract_text
 except Exception:
-    Document = None
+    pdfminer_extract_text = None
 
 try:
-    from pdfminer.high_level import extract_text as pdfminer_extract_text
+    from pdfminer.high_level import extract_pages as pdfminer_extract_pages
+    from pdfminer.layout import LTTextContainer
 except Exception:
-    pdfminer_extract_text = None
+    pdfminer_extract_pages = None
+    LTTextContainer = None
 
 # pdf -> images (optional)
 try:
@@ -34,45 +50,62 @@ try:
 except Exception:
     convert_from_path = None
 
-# PIL for image handling
 try:
-    from PIL import Image
+    from pdf2image import pdfinfo_from_path
 except Exception:
-    Image = None
+    pdfinfo_from_path = None
 
-# OpenAI SDK import (repo appears to use "from openai import OpenAI")
+# PIL for image handling
 try:
-    from openai import OpenAI
+    from PIL import Image
 except Exception:
-    OpenAI = None
+    Image = None
 
 # Env/settings lookup helper
 def _get_setting(name: str, default=None):
     return getattr(settings, name, os.getenv(name, default))
 
-OPENAI_API_KEY = _get_setting("OPENAI_API_KEY", None)
 OPENAI_MODEL_TEXT = _get_setting("OPENAI_MODEL_TEXT", "gpt-4o-mini")
 OPENAI_MODEL_VISION = _get_setting("OPENAI_MODEL_VISION", "gpt-4o")
 USE_LOCAL_OCR = _get_setting("USE_LOCAL_OCR", "False") in (True, "True", "true", "1")
+# Motor de OCR principal: 'openai' (Vision, con easyocr como fallback si USE_LOCAL_OCR) o 'local' (easyocr primero)
+OCR_ENGINE = str(_get_setting("OCR_ENGINE", "openai")).lower()
 MAX_SEND_SIZE_MB = int(_get_setting("MAX_SEND_SIZE_MB", 5))  # reject uploads larger than this by MB
-CHUNK_SIZE_TOKENS = int(_get_setting("CHUNK_SIZE_TOKENS", 4000))  # approximate chunk size to send safely
+CHUNK_SIZE_TOKENS = int(_get_setting("CHUNK_SIZE_TOKENS", 4000))  # tokens reales (tokenizer del modelo) por chunk
+CHUNK_OVERLAP_TOKENS = int(_get_setting("CHUNK_OVERLAP_TOKENS", 0))  # >0 repite contexto entre chunks
 MAX_RETRIES = int(_get_setting("OPENAI_MAX_RETRIES", 2))
 DEFAULT_TEMPERATURE = float(_get_setting("OPENAI_TEMP", 0.0))
 MAX_TOKENS_RESPONSE = int(_get_setting("OPENAI_MAX_TOKENS", 1500))
-
-_openai_client = None
-
-def get_openai_client():
-    global _openai_client
-    if _openai_client is not None:
-        return _openai_client
-    if OpenAI is None:
-        raise RuntimeError("OpenAI SDK no está instalado en el entorno.")
-    api_key = OPENAI_API_KEY or os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY no está configurada en settings ni en env.")
-    _openai_client = OpenAI(api_key=api_key)
-    return _openai_client
+# Máximo de llamadas concurrentes (chunks/páginas/slides) por archivo: evita que una subida acapare el pool
+FILE_PROCESSING_PARALLELISM = int(_get_setting("FILE_PROCESSING_PARALLELISM", 4))
+# Render de PDF escaneados: DPI, escala de grises y páginas renderizadas a la vez (memoria acotada)
+PDF_RENDER_DPI = int(_get_setting("PDF_RENDER_DPI", 150))
+PDF_RENDER_GRAYSCALE = _get_setting("PDF_RENDER_GRAYSCALE", "True") in (True, "True", "true", "1")
+PDF_RENDER_WINDOW = int(_get_setting("PDF_RENDER_WINDOW", FILE_PROCESSING_PARALLELISM))
+# Páginas con menos caracteres (sin espacios) en la capa de texto se consideran escaneadas y van a OCR
+PDF_MIN_PAGE_TEXT_CHARS = int(_get_setting("PDF_MIN_PAGE_TEXT_CHARS", 50))
+# DOCX: limpieza con OpenAI tras la conversión local: 'auto' (según heurística), 'always' o 'never'
+DOCX_LLM_CLEANUP = str(_get_setting("DOCX_LLM_CLEANUP", "auto")).lower()
+# Con 'auto', un DOCX sin títulos/listas/tablas de más de estos caracteres pasa por el LLM
+DOCX_LLM_CLEANUP_MIN_CHARS = int(_get_setting("DOCX_LLM_CLEANUP_MIN_CHARS", 6000))
+# PPTX: tokens de texto de slides por llamada y tope de tokens de la respuesta estructurada
+PPTX_BATCH_TOKENS = int(_get_setting("PPTX_BATCH_TOKENS", 2500))
+PPTX_BATCH_MAX_TOKENS = int(_get_setting("PPTX_BATCH_MAX_TOKENS", 4000))
+PPTX_BATCH_PROMPT_VERSION = "v1"
+PPTX_SYNTHESIS_PROMPT_VERSION = "v1"
+# Cambiar al modificar el prompt de limpieza: invalida la caché de LLM
+CLEAN_MD_PROMPT_VERSION = "v1"
+# Ídem para el análisis de hojas de cálculo grandes (estadísticas -> insights)
+XLSX_INSIGHTS_PROMPT_VERSION = "v1"
+# Ídem para el prompt de OCR con visión (caché por checksum de la imagen)
+OCR_VISION_PROMPT_VERSION = "v1"
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+def _map_ordered(fn: Callable[[T], R], items: List[T], max_workers: int = FILE_PROCESSING_PARALLELISM) -> List[R]:
+    """map_ordered con el tope de paralelismo por archivo (FILE_PROCESSING_PARALLELISM)."""
+    return map_ordered(fn, items, max_workers=max_workers)
 
 def text_to_md(text: str) -> str:
     """Limpieza básica y normalización para convertir texto plano a Markdown simple."""
@@ -85,30 +118,6 @@ def text_to_md(text: str) -> str:
     # Strip leading/trailing whitespace
     return text.strip()
 
-def _estimate_tokens_from_chars(chars: int) -> int:
-    # heurística simple: ~4 chars per token (varía). Usada para chunking.
-    return max(1, chars // 4)
-
-def _chunk_text_by_chars(text: str, target_tokens: int = CHUNK_SIZE_TOKENS) -> List[str]:
-    # conservatively convert tokens -> chars, using 4 chars per token
-    approx_chars = target_tokens * 4
-    if len(text) <= approx_chars:
-        return [text]
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + approx_chars
-        # try to break at newline/space to avoid mid-sentence cuts
-        if end < len(text):
-            nl = text.rfind('\n', start, end)
-            sp = text.rfind(' ', start, end)
-            cut = nl if nl > start else sp if sp > start else end
-        else:
-            cut = len(text)
-        chunks.append(text[start:cut].strip())
-        start = cut
-    return [c for c in chunks if c.strip()]
-
 def _image_file_to_data_url_bytes(b: bytes, ext: str) -> str:
     ext = ext.lower().lstrip('.')
     mime = "image/jpeg" if ext in ("jpg", "jpeg") else f"image/{ext}"
@@ -133,45 +142,8 @@ def _build_image_messages(prompt_text: str, data_url: str):
     return [{"role": "user", "content": user_content}]
 
 def _call_openai_chat_completions(model: str, messages, max_tokens=MAX_TOKENS_RESPONSE, temperature=DEFAULT_TEMPERATURE, max_retries=MAX_RETRIES):
-    client = get_openai_client()
-    attempt = 0
-    while True:
-        try:
-            resp = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
-            # intentar extraer texto de respuesta robustamente
-            if resp and getattr(resp, "choices", None):
-                choice = resp.choices[0]
-                out = None
-                # soporte estructuras dict-like o objeto SDK
-                try:
-                    if isinstance(choice, dict):
-                        msg = choice.get("message") or {}
-                        out = msg.get("content") or msg.get("content", "")
-                    else:
-                        msg = getattr(choice, "message", None)
-                        if msg:
-                            try:
-                                out = msg["content"]
-                            except Exception:
-                                out = getattr(msg, "content", None)
-                except Exception:
-                    out = None
-                if out is None:
-                    out = getattr(resp, "text", None) or ""
-                return (out or "").strip()
-            # fallback
-            return ""
-        except Exception as e:
-            attempt += 1
-            logger.exception("Error llamando a OpenAI (intento %s): %s", attempt, e)
-            if attempt > max_retries:
-                raise
-            time.sleep(1 + attempt * 2)
+    # Delegamos en el cliente compartido (pool HTTP + reintentos en ai_tools.llm_client)
+    return chat_completion(messages, model=model, max_tokens=max_tokens, temperature=temperature, max_retries=max_retries)
 
 def _openai_clean_text_to_markdown(text: str, instructions: Optional[str] = None, model: Optional[str] = None) -> str:
     """
@@ -180,6 +152,7 @@ def _openai_clean_text_to_markdown(text: str, instructions: Optional[str] = None
     if not text or not text.strip():
         return ''
     model = model or OPENAI_MODEL_TEXT
+    text = truncate_to_tokens(text, LLM_MAX_INPUT_TOKENS, model)  # no enviar exceso
     # build prompt
     base_instructions = (
         "Eres un asistente que convierte texto en Markdown limpio, legible y estructurado. "
@@ -192,53 +165,132 @@ def _openai_clean_text_to_markdown(text: str, instructions: Optional[str] = None
 
     messages = [
         {"role": "system", "content": base_instructions},
-        {"role": "user", "content": f"Texto original:\n\n{text[:200000]}"}  # slice para no enviar exceso
+        {"role": "user", "content": f"Texto original:\n\n{text}"}
     ]
 
-    out = _call_openai_chat_completions(model=model, messages=messages)
+    out = cached_call(
+        "clean_md",
+        model=model,
+        version=CLEAN_MD_PROMPT_VERSION,
+        params={"instructions": base_instructions, "max_tokens": MAX_TOKENS_RESPONSE, "temperature": DEFAULT_TEMPERATURE},
+        text=text,
+        compute=lambda: _call_openai_chat_completions(model=model, messages=messages),
+    )
     return text_to_md(out)
 
-def txt_to_md(path: str) -> str:
-    """Leer un archivo txt/md y devolver markdown limpio usando OpenAI para formateo."""
-    try:
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-            raw = f.read()
-    except Exception as e:
-        logger.exception("Error leyendo txt: %s", e)
+def _llm_markdown_with_prompt(operation: str, version: str, system_prompt: str, text: str,
+                              model: Optional[str] = None) -> str:
+    """
+    Llamada con un system prompt propio (sin el de "convierte texto en Markdown" de
+    _openai_clean_text_to_markdown), cacheada bajo su propia operación y versión.
+    """
+    if not text or not text.strip():
         return ''
-    # Si es corto, enviamos directamente; si es largo, chunk+resumir
-    tokens = _estimate_tokens_from_chars(len(raw))
+    model = model or OPENAI_MODEL_TEXT
+    text = truncate_to_tokens(text, LLM_MAX_INPUT_TOKENS, model)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": text},
+    ]
+    out = cached_call(
+        operation,
+        model=model,
+        version=version,
+        params={"max_tokens": MAX_TOKENS_RESPONSE, "temperature": DEFAULT_TEMPERATURE},
+        text=text,
+        compute=lambda: _call_openai_chat_completions(model=model, messages=messages),
+    )
+    return text_to_md(out)
+
+def _llm_clean_long_text(raw: str) -> str:
+    """Limpieza con OpenAI; si es largo, chunk + limpieza por chunk + síntesis."""
+    tokens = count_tokens(raw)
     if tokens > CHUNK_SIZE_TOKENS:
-        chunks = _chunk_text_by_chars(raw, CHUNK_SIZE_TOKENS)
-        summaries = []
-        for i, c in enumerate(chunks):
-            logger.info("txt_to_md: procesando chunk %s/%s", i+1, len(chunks))
-            summaries.append(_openai_clean_text_to_markdown(c))
+        chunks = chunk_text(raw, CHUNK_SIZE_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+        logger.info("txt_to_md: procesando %s chunks (paralelismo %s)", len(chunks), FILE_PROCESSING_PARALLELISM)
+        progress.set_stage("chunks", total=len(chunks))
+        summaries = checkpointed_map(f"txt_chunk:{CHUNK_SIZE_TOKENS}:{CHUNK_OVERLAP_TOKENS}",
+                                     _openai_clean_text_to_markdown, chunks, _map_ordered)
         # combinar y sintetizar
         combined = "\n\n".join(summaries)
+        progress.set_stage("cleanup")
         return _openai_clean_text_to_markdown(combined)
     else:
+        progress.set_stage("cleanup")
         return _openai_clean_text_to_markdown(raw)
 
+def clean_text_to_md(raw: str, policy: Optional[str] = None) -> Tuple[str, bool, str]:
+    """
+    txt/md -> Markdown. Normaliza localmente y solo pasa por OpenAI si el detector de
+    calidad (files.text_quality) lo justifica. policy sustituye a TEXT_LLM_CLEANUP
+    ('auto'/'always'/'never'). Devuelve (markdown, usó_llm, motivo).
+    """
+    text = text_to_md(raw)
+    needed, reason = decide_text_cleanup(text, policy=policy)
+    logger.info("clean_text_to_md: limpieza LLM %s (%s)", needed, reason)
+    if not needed:
+        return text, False, reason
+    return _llm_clean_long_text(text), True, reason
+
+def txt_to_md(path: str, policy: Optional[str] = None) -> str:
+    """Leer un archivo txt/md y devolver markdown limpio (OpenAI solo si el texto lo necesita)."""
+    try:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            raw = f.read()
+    except Exception as e:
+        logger.exception("Error leyendo txt: %s", e)
+        return ''
+    return clean_text_to_md(raw, policy=policy)[0]
+
+def _docx_needs_llm_cleanup(md: str, stats) -> Tuple[bool, str]:
+    """
+    Heurística de calidad de la conversión local: el LLM solo aporta cuando el texto
+    parece mal decodificado o cuando el documento tiene estructura "a mano" (viñetas
+    tecleadas, títulos en negrita con estilo normal) o ninguna en un texto largo.
+    """
+    if not md.strip():
+        return True, "sin texto"
+    chars = max(1, stats.get('chars', 0))
+    if stats.get('garbled_chars', 0) / chars > 0.01:
+        return True, "caracteres ilegibles"
+    paragraphs = max(1, stats.get('paragraphs', 0))
+    manual = stats.get('manual_bullets', 0) + stats.get('fake_headings', 0)
+    if manual >= 3 and manual / paragraphs > 0.2:
+        return True, "estructura manual (viñetas/títulos sin estilo)"
+    structured = stats.get('headings', 0) + stats.get('list_items', 0) + stats.get('tables', 0)
+    if not structured and chars > DOCX_LLM_CLEANUP_MIN_CHARS:
+        return True, "texto largo sin estructura"
+    return False, "estructura local suficiente"
+
+
 def docx_to_md(path: str) -> str:
     """
-    Extraer texto de docx y pasar a OpenAI para limpiar/convertir a Markdown.
-    Si python-docx no está disponible, intentamos enviar bytes a OpenAI como fallback (menos recomendado).
+    DOCX -> Markdown local y estructural (títulos, listas, tablas, negrita/cursiva, imágenes).
+    La limpieza con OpenAI solo se hace si DOCX_LLM_CLEANUP='always', o con 'auto' cuando
+    _docx_needs_llm_cleanup lo indica. Sin python-docx se mantiene el envío del texto al LLM.
     """
-    text = ''
     if Document:
         try:
-            doc = Document(path)
-            paragraphs = [p.text for p in doc.paragraphs if p.text and p.text.strip()]
-            text = '\n\n'.join(paragraphs)
+            md, stats = convert_docx(path)
         except Exception as e:
             logger.exception("Error procesando docx localmente: %s", e)
-            text = ''
+            md, stats = '', {}
+        if md:
+            if DOCX_LLM_CLEANUP == 'always':
+                needed, reason = True, "DOCX_LLM_CLEANUP=always"
+            elif DOCX_LLM_CLEANUP == 'never':
+                needed, reason = False, "DOCX_LLM_CLEANUP=never"
+            else:
+                needed, reason = _docx_needs_llm_cleanup(md, stats)
+            logger.info("docx_to_md: conversión local %s; limpieza LLM: %s (%s)", stats, needed, reason)
+            if not needed:
+                return md
+            progress.set_stage("cleanup")
+            # El Markdown local ya trae la estructura: el LLM solo la corrige
+            return _openai_clean_text_to_markdown(md)
     else:
         logger.warning("python-docx no instalado; no se puede extraer localmente docx.")
 
-    if text:
-        return _openai_clean_text_to_markdown(text)
     # Fallback: attempt to send bytes to OpenAI as a note (if supported). Here we try to extract raw bytes -> decode.
     try:
         with open(path, 'rb') as f:
@@ -251,76 +303,204 @@ def docx_to_md(path: str) -> str:
         pass
     return ''
 
+def _pdf_page_count(path: str) -> Optional[int]:
+    """Número de páginas vía pdfinfo (sin renderizar); None si no se puede determinar."""
+    if not pdfinfo_from_path:
+        return None
+    try:
+        return int(pdfinfo_from_path(path).get("Pages") or 0) or None
+    except Exception as e:
+        logger.warning("pdf_to_md: pdfinfo falló para %s: %s", path, e)
+        return None
+
+def _contiguous_runs(pages: List[int]) -> List[Tuple[int, int]]:
+    """[1, 2, 3, 7, 8] -> [(1, 3), (7, 8)]"""
+    runs: List[Tuple[int, int]] = []
+    for p in pages:
+        if runs and p == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], p)
+        else:
+            runs.append((p, p))
+    return runs
+
+def iter_pdf_page_windows(path: str,
+                          window: int = PDF_RENDER_WINDOW,
+                          dpi: int = PDF_RENDER_DPI,
+                          grayscale: bool = PDF_RENDER_GRAYSCALE,
+                          pages: Optional[List[int]] = None):
+    """
+    Renderiza el PDF de window en window páginas (first_page/last_page) y genera listas de
+    (índice, bytes PNG). Cada ventana se codifica y se liberan las imágenes PIL antes de
+    renderizar la siguiente, así la memoria pico depende de window y no del número de páginas.
+    pages (números de página desde 1) limita el render a esas páginas.
+    """
+    window = max(1, window)
+
+    def render(first, last):
+        images = convert_from_path(path, dpi=dpi, first_page=first, last_page=last, grayscale=grayscale)
+        batch = []
+        for offset, image in enumerate(images):
+            with io.BytesIO() as buf:
+                image.save(buf, format='PNG', optimize=False)
+                batch.append((first - 1 + offset, buf.getvalue()))
+            image.close()
+        del images
+        return batch
+
+    if pages is not None:
+        pages = sorted(set(pages))
+        for i in range(0, len(pages), window):
+            batch = []
+            for first, last in _contiguous_runs(pages[i:i + window]):
+                batch.extend(render(first, last))
+            if batch:
+                yield batch
+        return
+
+    total = _pdf_page_count(path)
+    first = 1
+    while total is None or first <= total:
+        last = first + window - 1 if total is None else min(first + window - 1, total)
+        batch = render(first, last)
+        if not batch:
+            break  # sin pdfinfo: nos pasamos del final
+        yield batch
+        if total is None and len(batch) < window:
+            break
+        first = last + 1
+
+def _pdf_page_text_layers(path: str) -> Optional[List[str]]:
+    """Texto de la capa de texto de cada página (pdfminer, sin OCR); None si no se puede analizar."""
+    if not pdfminer_extract_pages:
+        return None
+    try:
+        texts = []
+        for layout in pdfminer_extract_pages(path):
+            texts.append("".join(el.get_text() for el in layout if isinstance(el, LTTextContainer)))
+        return texts
+    except Exception as e:
+        logger.exception("pdf_to_md: fallo pdfminer por página: %s", e)
+        return None
+
+def _is_ocr_failure(text: str) -> bool:
+    return not text or not text.strip() or text.startswith("[Error OCR") or text.startswith("[No se detectó")
+
 def pdf_to_md(path: str) -> str:
     """
-    Procesamiento de PDF:
-    1) Intentar extraer texto con pdfminer (rápido).
-    2) Si no hay texto y pdf2image disponible -> renderizar páginas a imágenes y usar ocr_image_to_md (OpenAI Vision).
-    3) Si todo falla y USE_LOCAL_OCR=True -> fallback a easyocr local.
+    Procesamiento de PDF, página a página:
+    1) Extraer la capa de texto de cada página con pdfminer (rápido).
+    2) Las páginas sin texto o con menos de PDF_MIN_PAGE_TEXT_CHARS caracteres (escaneadas) se renderizan
+       por ventanas (PDF_RENDER_WINDOW) y pasan por ocr_image_to_md en paralelo acotado.
+    3) Se unen todas las páginas en orden ('---' entre páginas si hubo OCR) y se limpian con OpenAI.
+    4) Si todo falla y USE_LOCAL_OCR=True -> fallback a easyocr local.
     """
-    text = ''
-    if pdfminer_extract_text:
+    # 1) Capa de texto por página: solo las páginas sin texto (o casi) necesitan OCR
+    progress.set_stage("text_layer")
+    page_layers = _pdf_page_text_layers(path)
+    if page_layers is None and pdfminer_extract_text:
         try:
             text = pdfminer_extract_text(path)
             if text and text.strip():
                 logger.info("pdf_to_md: texto extraido con pdfminer para %s", path)
+                progress.set_stage("cleanup")
                 return _openai_clean_text_to_markdown(text)
         except Exception as e:
             logger.exception("pdf_to_md: fallo pdfminer: %s", e)
-            text = ''
 
-    # Si no hay texto, intentar renderizar a imagen por pagina y OCR vía OpenAI Vision
-    if convert_from_path and Image:
+    can_render = bool(convert_from_path and Image)
+    if page_layers:
+        scanned = [i + 1 for i, t in enumerate(page_layers)
+                   if len(re.sub(r'\s+', '', t)) < PDF_MIN_PAGE_TEXT_CHARS]
+        has_text = len(scanned) < len(page_layers)
+        if not scanned or (has_text and not can_render):
+            logger.info("pdf_to_md: texto extraido con pdfminer para %s", path)
+            combined = "\n\n".join(t.strip() for t in page_layers if t.strip())
+            progress.set_stage("cleanup")
+            return _openai_clean_text_to_markdown(combined)
+        if has_text:
+            logger.info("pdf_to_md: %s de %s paginas sin capa de texto van a OCR (%s)", len(scanned), len(page_layers), path)
+    else:
+        scanned = None  # páginas desconocidas: OCR de todo el documento
+
+    # 2) OCR (OpenAI Vision u OCR local según OCR_ENGINE) de las páginas escaneadas, por ventanas
+    if can_render:
         try:
-            pages = convert_from_path(path)
-            page_texts = []
-            for i, page in enumerate(pages):
+            def ocr_page(indexed_page):
+                i, page_bytes = indexed_page
                 try:
-                    with io.BytesIO() as buf:
-                        page.save(buf, format='PNG')
-                        buf.seek(0)
-                        page_bytes = buf.read()
-                    page_md = ocr_image_to_md(page_bytes, lang=None)  # ocr_image_to_md maneja bytes
-                    page_texts.append(page_md)
+                    return ocr_image_to_md(page_bytes, lang=None)  # ocr_image_to_md maneja bytes
                 except Exception as e:
                     logger.exception("pdf_to_md: fallo procesando pagina %s: %s", i, e)
+                    return ''
+
+            # Páginas ya resueltas en un intento anterior (checkpoints): ni se renderizan ni se OCRean
+            ocr_texts = load_checkpoints("pdf_ocr")
+            if scanned is None and ocr_texts:
+                total = _pdf_page_count(path)
+                scanned = list(range(1, total + 1)) if total else None
+            pending = None if scanned is None else [p for p in scanned if p - 1 not in ocr_texts]
+            if scanned is None:
+                progress.set_stage("ocr", total=_pdf_page_count(path) or 0)
+            else:
+                progress.set_stage("ocr", total=len(scanned), done=len(scanned) - len(pending))
+            for window in iter_pdf_page_windows(path, pages=pending):
+                outs = checkpointed_map("pdf_ocr", ocr_page, window, _map_ordered,
+                                        is_complete=lambda t: not _is_ocr_failure(t),
+                                        unit_of=lambda _, item: item[0])
+                for (i, _), out in zip(window, outs):
+                    ocr_texts[i] = out
+
+            # 3) Unir en orden de página: OCR si salió bien, si no la (poca) capa de texto
+            if page_layers:
+                page_texts = []
+                for i, layer in enumerate(page_layers):
+                    ocr_out = ocr_texts.get(i)
+                    page_texts.append(layer.strip() if ocr_out is None or _is_ocr_failure(ocr_out) else ocr_out)
+            else:
+                page_texts = [ocr_texts[i] for i in sorted(ocr_texts)]
             combined = "\n\n---\n\n".join([p for p in page_texts if p])
             if combined.strip():
                 # sintetizar con OpenAI para obtener markdown coherente
+                progress.set_stage("cleanup")
                 return _openai_clean_text_to_markdown(combined)
         except Exception as e:
             logger.exception("pdf_to_md: fallo render pdf->images: %s", e)
 
+    # Sin OCR posible: al menos la capa de texto de las páginas que la tienen
+    if page_layers and any(t.strip() for t in page_layers):
+        progress.set_stage("cleanup")
+        return _openai_clean_text_to_markdown("\n\n".join(t.strip() for t in page_layers if t.strip()))
+
     # Fallback local OCR if configured
     if USE_LOCAL_OCR and easyocr:
         try:
             logger.info("pdf_to_md: intentando fallback local OCR con easyocr para %s", path)
             # Simple approach: attempt per page using pdf2image if available; else try easyocr on whole file path
             if convert_from_path and Image:
-                pages = convert_from_path(path)
-                page_texts = []
-                for page in pages:
-                    with io.BytesIO() as buf:
-                        page.save(buf, format='PNG')
-                        buf.seek(0)
-                        page_bytes = buf.read()
-                    # use easyocr directly on numpy array if available
+                tracker = progress.current_tracker()
+
+                def local_ocr_page(indexed_page):
+                    i, page_bytes = indexed_page
                     try:
-                        import numpy as np
-                        img = Image.open(io.BytesIO(page_bytes)).convert("RGB")
-                        arr = np.array(img)
-                        reader = easyocr.Reader(['es', 'en'], gpu=False)
-                        res = reader.readtext(arr, detail=0)
-                        page_texts.append("\n".join(res))
+                        return ocr_image_bytes(page_bytes)
                     except Exception:
-                        logger.exception("pdf_to_md: easyocr per page failed")
-                combined = "\n\n---\n\n".join(page_texts)
+                        logger.exception("pdf_to_md: easyocr per page failed (pagina %s)", i)
+                        return None
+                    finally:
+                        if tracker is not None:
+                            tracker.advance()
+
+                progress.set_stage("local_ocr", total=_pdf_page_count(path) or 0)
+
+                page_texts = []
+                for window in iter_pdf_page_windows(path):
+                    # tantos hilos como readers en el pool
+                    page_texts.extend(_map_ordered(local_ocr_page, window, max_workers=LOCAL_OCR_INSTANCES))
+                combined = "\n\n---\n\n".join(t for t in page_texts if t is not None)
                 return text_to_md(combined)
             else:
                 # no pages rendering; last resort
-                reader = easyocr.Reader(['es', 'en'], gpu=False)
-                res = reader.readtext(path, detail=0)
-                return text_to_md("\n".join(res))
+                return text_to_md(ocr_image_path(path))
         except Exception as e:
             logger.exception("pdf_to_md: fallo fallback easyocr: %s", e)
 
@@ -341,9 +521,14 @@ def _ocr_image_via_openai_bytes(image_bytes: bytes, ext: str = 'png', instructio
           "Responde únicamente con Markdown."
     )
 
-    messages = _build_image_messages(prompt, data_url)
-    out = _call_openai_chat_completions(model=model, messages=messages)
-    return text_to_md(out)
+    def compute():
+        messages = _build_image_messages(prompt, data_url)
+        return text_to_md(_call_openai_chat_completions(model=model, messages=messages))
+
+    # La misma imagen (p. ej. la misma página escaneada) no se vuelve a enviar a OpenAI
+    checksum = hashlib.sha256(image_bytes).hexdigest()
+    return cached_call("ocr_image", model, OCR_VISION_PROMPT_VERSION, checksum, compute,
+                       params={"instructions": instructions or ""})
 
 def ocr_image_to_md(file_obj, lang='es'):
     """
@@ -394,6 +579,9 @@ def ocr_image_to_md(file_obj, lang='es'):
         if not image_bytes:
             return "[No se detectó contenido binario de imagen]"
 
+        # Normalizar (orientación, resolución, grises, JPEG) antes de cualquier motor de OCR
+        image_bytes, ext = preprocess_image_for_ocr(image_bytes, ext)
+
         # Size guard
         size_mb = len(image_bytes) / (1024 * 1024)
         if size_mb > MAX_SEND_SIZE_MB:
@@ -401,21 +589,24 @@ def ocr_image_to_md(file_obj, lang='es'):
             logger.warning("ocr_image_to_md: %s", msg)
             return msg
 
+        # OCR local como motor principal (readers ya cargados en el pool): sin llamada a OpenAI
+        if OCR_ENGINE == 'local' and easyocr:
+            try:
+                text = ocr_image_bytes(image_bytes)
+                if text:
+                    return text_to_md(text)
+            except Exception as e:
+                logger.exception("ocr_image_to_md: fallo OCR local, se usa OpenAI Vision: %s", e)
+
         # Preferir OpenAI Vision
         try:
             return _ocr_image_via_openai_bytes(image_bytes, ext=ext, instructions=None)
         except Exception as e:
             logger.exception("ocr_image_to_md: fallo OpenAI Vision: %s", e)
             # fallback local?
-            if USE_LOCAL_OCR and easyocr:
+            if USE_LOCAL_OCR and easyocr and OCR_ENGINE != 'local':
                 try:
-                    import numpy as np
-                    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-                    arr = np.array(img)
-                    reader = easyocr.Reader(['es', 'en'], gpu=False)
-                    results = reader.readtext(arr, detail=0)
-                    text = "\n".join(results).strip()
-                    return text_to_md(text)
+                    return text_to_md(ocr_image_bytes(image_bytes))
                 except Exception as e2:
                     logger.exception("ocr_image_to_md: fallback easyocr falló: %s", e2)
                     return f"[Error OCR: {str(e)} | fallback failed: {str(e2)}]"
@@ -426,58 +617,144 @@ def ocr_image_to_md(file_obj, lang='es'):
         logger.exception("Error haciendo OCR a imagen con OpenAI/EasyOCR: %s", e)
         return f"[Error OCR: {str(e)}]"
 
+XLSX_INSIGHTS_INSTRUCTIONS = (
+    "Eres un analista de datos. Recibirás estadísticas por columna de una o varias hojas de cálculo "
+    "(tipo, % de nulos, min/max/media, valores frecuentes), no los datos. Para cada hoja, escribe una "
+    "sección '### Hoja: <nombre>' con una descripción breve de qué contiene y los insights más relevantes "
+    "en una lista. Básate solo en las estadísticas, no repitas sus tablas y responde únicamente con Markdown."
+)
+
 def xlsx_to_md(path: str) -> str:
     """
-    Extrae hojas de Excel a CSV por hoja y pide a OpenAI que sintetice insights y tabla en Markdown.
-    Requiere openpyxl/pandas para extracción local. Si no está disponible, devuelve cadena vacía.
+    Excel -> Markdown leyendo en streaming (openpyxl read_only) y con estadísticas por columna:
+    - hojas pequeñas (XLSX_SMALL_SHEET_ROWS x XLSX_SMALL_SHEET_COLS): tabla Markdown completa, sin LLM;
+    - hojas grandes: tabla de estadísticas local + un único prompt compacto con todas ellas
+      para los insights.
+    Si openpyxl no está disponible, devuelve cadena vacía.
     """
     try:
-        import pandas as pd
-    except Exception:
-        logger.warning("pandas/openpyxl no instalado; xlsx_to_md no disponible.")
+        sheets = summarize_workbook(path)
+    except RuntimeError as e:
+        logger.warning("xlsx_to_md no disponible: %s", e)
         return ''
-
-    try:
-        xls = pd.read_excel(path, sheet_name=None)
-        parts = []
-        for sheet_name, df in xls.items():
-            # small sample or full if small
-            rows = df.head(10).to_csv(index=False)
-            prompt = f"Hoja: {sheet_name}\nMuestra de filas:\n{rows}\n\nGenera un resumen breve y una tabla en Markdown con los 5 insights más importantes."
-            md = _openai_clean_text_to_markdown(prompt)
-            parts.append(f"## Hoja: {sheet_name}\n\n{md}")
-        return "\n\n".join(parts)
     except Exception as e:
         logger.exception("xlsx_to_md error: %s", e)
         return ''
 
+    parts = []
+    large = []
+    for sheet in sheets:
+        if not sheet.header:
+            continue  # hoja vacía
+        if sheet.is_small:
+            parts.append(f"## Hoja: {sheet.name}\n\n{sheet.markdown_table()}")
+        else:
+            large.append(sheet)
+            parts.append(f"## Hoja: {sheet.name}\n\n{sheet.rows} filas x {len(sheet.header)} columnas.\n\n"
+                         f"{sheet.stats_table()}")
+
+    if large:
+        prompt = "\n\n".join(
+            f"Hoja: {s.name} ({s.rows} filas, {len(s.header)} columnas)\n{s.stats_table()}" for s in large
+        )
+        progress.set_stage("cleanup")
+        insights = _llm_markdown_with_prompt("xlsx_insights", XLSX_INSIGHTS_PROMPT_VERSION,
+                                             XLSX_INSIGHTS_INSTRUCTIONS, prompt)
+        if insights:
+            parts.append(f"## Análisis\n\n{insights}")
+    logger.info("xlsx_to_md: %s hojas (%s con LLM) para %s", len(sheets), len(large), path)
+    return "\n\n".join(parts)
+
+PPTX_BATCH_INSTRUCTIONS = (
+    "Recibirás el texto de varias diapositivas consecutivas, cada una precedida por '=== Slide N ==='. "
+    "Para cada diapositiva escribe su contenido en Markdown limpio (listas, énfasis; sin repetir el título "
+    "ni añadir encabezados de slide). Responde SOLO con JSON válido con esta forma: "
+    '{"summary": "resumen breve del conjunto en Markdown", '
+    '"slides": [{"n": <número de slide>, "markdown": "..."}]}'
+)
+
+PPTX_SYNTHESIS_INSTRUCTIONS = (
+    "Eres un asistente que resume presentaciones. Recibirás los resúmenes parciales de una "
+    "presentación, en orden. Escribe un único resumen breve y coherente de toda la presentación, "
+    "sin repetir ideas, y responde únicamente con Markdown."
+)
+
+def _parse_slide_batch(raw: str) -> Optional[dict]:
+    """{"summary": str, "slides": {n: markdown}} o None si la respuesta no es el JSON pedido."""
+    try:
+        data = json.loads(raw.replace("```json", "").replace("```", "").strip())
+        slides = {int(item["n"]): str(item.get("markdown") or "") for item in data.get("slides", [])}
+    except Exception:
+        return None
+    return {"summary": str(data.get("summary") or ""), "slides": slides}
+
+def _pptx_batch_to_md(batch) -> str:
+    """
+    Una llamada por lote de slides con respuesta estructurada por slide. Devuelve el JSON
+    (como texto, para poder checkpointearlo); "fallback" marca un lote sin respuesta válida.
+    """
+    body = "\n\n".join(f"=== Slide {slide.number} ===\n{slide.text}" for slide in batch)
+    model = OPENAI_MODEL_TEXT
+    messages = [
+        {"role": "system", "content": PPTX_BATCH_INSTRUCTIONS},
+        {"role": "user", "content": body},
+    ]
+    raw = cached_call(
+        "pptx_batch",
+        model=model,
+        version=PPTX_BATCH_PROMPT_VERSION,
+        params={"max_tokens": PPTX_BATCH_MAX_TOKENS, "temperature": DEFAULT_TEMPERATURE},
+        text=body,
+        compute=lambda: _call_openai_chat_completions(model=model, messages=messages,
+                                                      max_tokens=PPTX_BATCH_MAX_TOKENS),
+        should_cache=lambda out: _parse_slide_batch(out or "") is not None,
+    )
+    parsed = _parse_slide_batch(raw or "")
+    if parsed is None:
+        logger.warning("pptx_to_md: respuesta no estructurada para slides %s-%s; se usa el texto local",
+                       batch[0].number, batch[-1].number)
+        return json.dumps({"summary": "", "slides": {}, "fallback": True})
+    return json.dumps(parsed, ensure_ascii=False)
+
 def pptx_to_md(path: str) -> str:
     """
-    Extrae texto de pptx por diapositiva (si python-pptx está disponible) y pide resumen por slide + síntesis.
+    PPTX -> Markdown. Título, texto, tablas y notas del orador se extraen localmente; el texto
+    de slides consecutivas se agrupa en lotes de PPTX_BATCH_TOKENS y cada lote es UNA llamada
+    que devuelve el Markdown de cada slide y un resumen. Con un solo lote ese resumen es el
+    de la presentación; con varios, una llamada final solo con los resúmenes parciales.
     """
     try:
-        from pptx import Presentation
-    except Exception:
-        logger.warning("python-pptx no instalado; pptx_to_md no disponible.")
-        return ''
-    try:
-        prs = Presentation(path)
-        slides_md = []
-        for i, slide in enumerate(prs.slides):
-            texts = []
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    t = shape.text.strip()
-                    if t:
-                        texts.append(t)
-            slide_text = "\n\n".join(texts)
-            if slide_text.strip():
-                md_slide = _openai_clean_text_to_markdown(slide_text)
-                slides_md.append(f"### Slide {i+1}\n\n{md_slide}")
-        combined = "\n\n".join(slides_md)
-        if combined.strip():
-            return _openai_clean_text_to_markdown(combined)
+        slides = extract_slides(path)
+    except RuntimeError as e:
+        logger.warning("pptx_to_md no disponible: %s", e)
         return ''
     except Exception as e:
         logger.exception("pptx_to_md error: %s", e)
-        return ''
\ No newline at end of file
+        return ''
+    if not slides:
+        return ''
+
+    batches = pack_slides(slides, PPTX_BATCH_TOKENS, count_tokens)
+    logger.info("pptx_to_md: %s slides en %s lotes (paralelismo %s)", len(slides), len(batches),
+                FILE_PROCESSING_PARALLELISM)
+    progress.set_stage("slide_batches", total=len(batches))
+    results = checkpointed_map(f"pptx_batch:{PPTX_BATCH_TOKENS}", _pptx_batch_to_md, batches, _map_ordered,
+                               is_complete=lambda out: not json.loads(out).get("fallback"),
+                               unit_of=lambda _, batch: batch[0].number)
+    parsed = [json.loads(out) for out in results]
+    bodies = {}
+    for batch_result in parsed:
+        # las claves vuelven como texto tras pasar por JSON
+        bodies.update({int(n): md for n, md in batch_result["slides"].items()})
+
+    summaries = [r["summary"] for r in parsed if r.get("summary")]
+    if len(summaries) > 1:
+        progress.set_stage("cleanup")
+        summary = _llm_markdown_with_prompt("pptx_synthesis", PPTX_SYNTHESIS_PROMPT_VERSION,
+                                            PPTX_SYNTHESIS_INSTRUCTIONS, "\n\n".join(summaries))
+    else:
+        summary = summaries[0] if summaries else ''
+
+    sections = [f"## Resumen\n\n{summary.strip()}"] if summary.strip() else []
+    sections += [slide_markdown(slide, bodies.get(slide.number)) for slide in slides]
+    return "\n\n".join(sections)
@@ -0,0 +1,132 @@
+# backend/files/progress.py
+"""
+Progreso fino del procesamiento de un archivo: etapa actual, unidades hechas/totales y ETA.
+
+process_file_sync abre un progress_scope(file_id); dentro, los helpers marcan la etapa
+con set_stage('ocr', total=N) y avanzan con advance() por cada página/chunk/slide
+(checkpointed_map lo hace solo). Los contadores viven en memoria y se vuelcan al File
+con un UPDATE como mucho cada FILE_PROGRESS_FLUSH_SECONDS, así el pipeline no paga una
+escritura por unidad. La ETA no se guarda: se estima al leer (estimate_eta) a partir
+del ritmo de la etapa en curso.
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import File
+
+logger = logging.getLogger(__name__)
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+# Intervalo mínimo entre escrituras de progreso de un mismo archivo
+FILE_PROGRESS_FLUSH_SECONDS = float(_get_setting("FILE_PROGRESS_FLUSH_SECONDS", 1.0))
+
+# Campos de File que describen el progreso (los que lee el endpoint de estado)
+PROGRESS_FIELDS = ('processing_stage', 'progress_done', 'progress_total', 'stage_started_at', 'progress_updated_at')
+
+
+class ProgressTracker:
+    """Contadores de progreso de un File; seguro para avanzar desde los hilos del fan-out."""
+
+    def __init__(self, file_id: int):
+        self.file_id = file_id
+        self.owner = threading.get_ident()
+        self._lock = threading.Lock()
+        self.stage = ''
+        self.done = 0
+        self.total = 0
+        self.stage_started_at = None
+        self._last_flush = 0.0
+
+    def set_stage(self, stage: str, total: int = 0, done: int = 0):
+        with self._lock:
+            self.stage = stage
+            self.total = max(0, int(total or 0))
+            self.done = min(max(0, int(done or 0)), self.total) if self.total else 0
+            self.stage_started_at = timezone.now()
+            self._flush_locked()
+
+    def advance(self, n: int = 1):
+        if n <= 0:
+            return
+        with self._lock:
+            self.done = min(self.done + n, self.total) if self.total else self.done + n
+            finished = self.total and self.done >= self.total
+            if finished or time.monotonic() - self._last_flush >= FILE_PROGRESS_FLUSH_SECONDS:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        try:
+            File.objects.filter(pk=self.file_id).update(
+                processing_stage=self.stage[:40],
+                progress_done=self.done,
+                progress_total=self.total,
+                stage_started_at=self.stage_started_at,
+                progress_updated_at=timezone.now(),
+            )
+        except Exception:
+            logger.exception("No se pudo guardar el progreso del file %s", self.file_id)
+        finally:
+            # Los hilos del fan-out son efímeros: no dejar su conexión abierta
+            if threading.get_ident() != self.owner:
+                connection.close()
+
+
+_active_tracker: contextvars.ContextVar = contextvars.ContextVar("processing_progress", default=None)
+
+
+@contextmanager
+def progress_scope(file_id: int):
+    """Activa el seguimiento de progreso del archivo en el hilo actual."""
+    tracker = ProgressTracker(file_id)
+    token = _active_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _active_tracker.reset(token)
+
+
+def current_tracker() -> Optional[ProgressTracker]:
+    """Tracker del archivo en curso (None fuera de un progress_scope). Capturarlo antes de lanzar hilos."""
+    return _active_tracker.get()
+
+
+def set_stage(stage: str, total: int = 0, done: int = 0):
+    tracker = _active_tracker.get()
+    if tracker is not None:
+        tracker.set_stage(stage, total=total, done=done)
+
+
+def advance(n: int = 1):
+    tracker = _active_tracker.get()
+    if tracker is not None:
+        tracker.advance(n)
+
+
+def estimate_eta(row: dict, now=None) -> Optional[float]:
+    """
+    Segundos restantes de la etapa en curso según su ritmo hasta ahora; None si aún no hay
+    datos (sin unidades hechas o etapa sin total conocido).
+    """
+    done = row.get('progress_done') or 0
+    total = row.get('progress_total') or 0
+    started = row.get('stage_started_at')
+    if row.get('processing_status') != 'processing' or not started or not total or done <= 0:
+        return None
+    if done >= total:
+        return 0.0
+    elapsed = ((now or timezone.now()) - started).total_seconds()
+    return round(max(0.0, elapsed / done * (total - done)), 1)
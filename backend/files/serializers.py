@@ -10,11 +10,13 @@ class FileSerializer(serializers.ModelSerializer):
         model = File
         read_only_fields = (
             'id', 'filename', 'file_size', 'uploaded_at',
-            'processing_status', 'processing_error', 'md_content', 'checksum', 'language'
+            'processing_status', 'processing_error', 'md_content', 'checksum', 'language',
+            'processing_stage', 'progress_done', 'progress_total', 'llm_cleanup', 'llm_cleanup_reason'
         )
         fields = (
             'id', 'note', 'file', 'filename', 'file_type', 'file_size',
-            'uploaded_at', 'processing_status', 'processing_error', 'md_content'
+            'uploaded_at', 'processing_status', 'processing_error', 'md_content',
+            'processing_stage', 'progress_done', 'progress_total', 'llm_cleanup', 'llm_cleanup_reason'
         )
 
     def validate(self, attrs):
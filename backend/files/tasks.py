@@ -2,11 +2,24 @@
 import logging
 import os
 
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
 from .models import File
-from .processing_helpers import text_to_md, docx_to_md, pdf_to_md, ocr_image_to_md
+from .checkpoints import checkpoint_scope, clear_checkpoints
+from .progress import progress_scope
+from .extractors import extractor_for_file
 
 logger = logging.getLogger(__name__)
 
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+# Reutilizar md_content de un archivo idéntico ya procesado: 'user' (solo del mismo usuario),
+# 'global' (de cualquier usuario) u 'off'
+FILE_DEDUP_SCOPE = str(_get_setting("FILE_DEDUP_SCOPE", "user")).lower()
+
 def index_file_for_rag_sync(file_id: int):
     """
     Stub de indexación RAG para desarrollo.
@@ -25,21 +38,54 @@ def _append_md_to_note_if_configured(file_obj: File, md_text: str):
     """
     Por defecto, agregamos el md_content al campo Note.content.
     Si deseas cambiar este comportamiento, modifica aquí.
+    Es idempotente: appended_to_note_at marca el File, así que un reintento del mismo
+    archivo (lease vencido, job repetido) no duplica el texto en la nota.
     """
     if not md_text:
         return
+    claimed = File.objects.filter(pk=file_obj.pk, appended_to_note_at__isnull=True).update(
+        appended_to_note_at=timezone.now())
+    if not claimed:
+        logger.info("File %s ya anexado a la nota %s; se omite", file_obj.pk, file_obj.note_id)
+        return
     try:
-        note = file_obj.note
-        # Append with separator si no vacío
-        sep = "\n\n---\n\n"
-        if not getattr(note, 'content', None):
-            note.content = md_text
-        else:
-            note.content = note.content + sep + md_text
-        note.save(update_fields=['content'])
+        note_model = File._meta.get_field('note').related_model
+        with transaction.atomic():
+            # Bloqueo de la nota: dos archivos que terminan a la vez no se pisan el contenido
+            note = note_model.objects.select_for_update().get(pk=file_obj.note_id)
+            # Append with separator si no vacío
+            sep = "\n\n---\n\n"
+            if not getattr(note, 'content', None):
+                note.content = md_text
+            else:
+                note.content = note.content + sep + md_text
+            note.save(update_fields=['content'])
     except Exception:
+        File.objects.filter(pk=file_obj.pk).update(appended_to_note_at=None)
         logger.exception("No se pudo anexar md_content a la nota %s", getattr(file_obj, 'note_id', None))
 
+def find_processed_duplicate(file_obj: File):
+    """
+    Busca un File anterior con el mismo checksum (mismo contenido) y tipo ya procesado
+    con éxito, según FILE_DEDUP_SCOPE. Devuelve None si no hay o si el dedup está desactivado.
+    """
+    if FILE_DEDUP_SCOPE not in ('user', 'global'):
+        return None
+    if not file_obj.checksum:
+        file_obj.checksum = file_obj.compute_checksum()
+        if not file_obj.checksum:
+            return None
+        file_obj.save(update_fields=['checksum'])
+
+    qs = (File.objects
+          .filter(checksum=file_obj.checksum, file_type=file_obj.file_type, processing_status='done')
+          .exclude(pk=file_obj.pk)
+          .exclude(md_content__isnull=True)
+          .exclude(md_content=''))
+    if FILE_DEDUP_SCOPE == 'user':
+        qs = qs.filter(note__notebook__user_id=file_obj.note.notebook.user_id)
+    return qs.only('id', 'md_content', 'language').order_by('-uploaded_at').first()
+
 def process_file_sync(file_id: int):
     """
     Procesamiento síncrono del archivo: extrae texto, convierte a md, guarda en modelo
@@ -54,45 +100,48 @@ def process_file_sync(file_id: int):
     try:
         f.processing_status = 'processing'
         f.processing_error = ''
-        f.save(update_fields=['processing_status', 'processing_error'])
+        f.processing_stage = 'extracting'
+        f.progress_done = f.progress_total = 0
+        f.stage_started_at = f.progress_updated_at = timezone.now()
+        f.save(update_fields=['processing_status', 'processing_error', 'processing_stage', 'progress_done',
+                              'progress_total', 'stage_started_at', 'progress_updated_at'])
 
-        # Determinar extensión
+        md_text = ''
         try:
-            ext = (f.file.name.split('.')[-1] or '').lower()
+            duplicate = find_processed_duplicate(f)
         except Exception:
-            ext = ''
-
-        md_text = ''
-        # Llamadas a helpers dependiendo de ext
-        if ext in ('txt', 'md'):
-            try:
-                with f.file.open('r', encoding='utf-8', errors='ignore') as fh:
-                    raw = fh.read()
-            except Exception:
-                with f.file.open('rb') as fh:
-                    raw = fh.read().decode('utf-8', errors='ignore')
-            md_text = text_to_md(raw)
-
-        elif ext == 'docx':
-            md_text = docx_to_md(f.file.path if hasattr(f.file, 'path') else f.file)
-        elif ext == 'pdf':
-            md_text = pdf_to_md(f.file.path if hasattr(f.file, 'path') else f.file)
-        elif ext in ('png', 'jpg', 'jpeg'):
-            md_text = ocr_image_to_md(f.file.path if hasattr(f.file, 'path') else f.file)
+            logger.exception("Dedup por checksum falló para file %s (se procesa normalmente)", f.id)
+            duplicate = None
+        if duplicate is not None:
+            # Mismo contenido ya extraído: sin pdfminer/OCR/LLM
+            logger.info("File %s: reutilizando md_content de File %s (checksum %s)", f.id, duplicate.id, f.checksum)
+            md_text = duplicate.md_content
+            if duplicate.language and not f.language:
+                f.language = duplicate.language
+                f.save(update_fields=['language'])
         else:
-            # Intentar leer como texto
-            try:
-                with f.file.open('r', encoding='utf-8', errors='ignore') as fh:
-                    raw = fh.read()
-                md_text = text_to_md(raw)
-            except Exception:
-                md_text = ''
+            # Páginas/chunks ya resueltos en un intento anterior se reutilizan (checkpoints por checksum);
+            # la etapa y las unidades hechas se publican en el File para el endpoint de estado
+            # Extractor según el contenido/extensión (registro de files.extractors)
+            extractor = extractor_for_file(f)
+            logger.info("File %s: extractor %s (coste %s)", f.id, extractor.name, extractor.cost)
+            with checkpoint_scope(f.checksum), progress_scope(f.id):
+                md_text = extractor.extract(f)
 
         # Guardar resultados
         f.md_content = md_text
         f.processing_status = 'done'
         f.processing_error = ''
-        f.save(update_fields=['md_content', 'processing_status', 'processing_error'])
+        f.processing_stage = ''
+        f.progress_updated_at = timezone.now()
+        f.save(update_fields=['md_content', 'processing_status', 'processing_error', 'processing_stage',
+                              'progress_updated_at'])
+
+        # Ya no hacen falta los resultados intermedios
+        try:
+            clear_checkpoints(f.checksum)
+        except Exception:
+            logger.exception("No se pudieron borrar los checkpoints de file %s", f.id)
 
         # (Opcional) anexar resultado a la nota asociada
         try:
@@ -0,0 +1,135 @@
+# backend/files/text_quality.py
+"""
+Detector de texto "limpio" para subidas txt/md y política de limpieza con el LLM.
+
+analyze_text mide tres familias de problemas:
+- ruido de codificación: U+FFFD, caracteres de control y mojibake típico (UTF-8 leído como latin-1);
+- artefactos de OCR: palabras partidas con guion a final de línea, líneas de 1-2 caracteres
+  y rachas de símbolos sueltos;
+- Markdown inválido: bloques ``` sin cerrar, '#Título' sin espacio y tablas con filas de
+  distinto número de columnas.
+decide_text_cleanup convierte esas métricas en una decisión (¿pasar por el LLM?) y un
+motivo legible que se guarda en el File.
+"""
+import os
+import re
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+# 'auto' (según el detector), 'always' (comportamiento anterior) o 'never'
+TEXT_LLM_CLEANUP = str(_get_setting("TEXT_LLM_CLEANUP", "auto")).lower()
+# Fracción de caracteres con ruido de codificación a partir de la cual se limpia con el LLM
+TEXT_CLEANUP_MAX_NOISE = float(_get_setting("TEXT_CLEANUP_MAX_NOISE", 0.002))
+# Fracción de líneas con artefactos de OCR a partir de la cual se limpia con el LLM
+TEXT_CLEANUP_MAX_OCR_ARTIFACTS = float(_get_setting("TEXT_CLEANUP_MAX_OCR_ARTIFACTS", 0.1))
+# '#Título' sin espacio: hacen falta al menos MIN y más de esta fracción de las líneas
+# (un '#hashtag' suelto no justifica la llamada)
+TEXT_CLEANUP_MIN_BAD_HEADINGS = int(_get_setting("TEXT_CLEANUP_MIN_BAD_HEADINGS", 3))
+TEXT_CLEANUP_MAX_BAD_HEADINGS = float(_get_setting("TEXT_CLEANUP_MAX_BAD_HEADINGS", 0.02))
+
+_CONTROL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+_MOJIBAKE = re.compile(r'Ã[\x80-\xbf\xa1-\xbf]|â€[\x80-\x9f™œ“”˜¦¢]|Â[\xa0-\xbf]')
+_HYPHEN_BREAK = re.compile(r'[^\W\d_]-\n[^\W\d_]')
+_SYMBOL_RUN = re.compile(r'[^\w\s#*_`|>\-=+.:]{4,}')
+_FENCE = re.compile(r'^\s*(```|~~~)')
+_HEADING_NO_SPACE = re.compile(r'^#{1,6}[^\s#\d]')  # '#1' es numeración, no un título
+# Líneas cortas legítimas en Markdown: reglas, viñetas vacías, separadores de tabla...
+_MD_SHORT_LINE = re.compile(r'^\s*(?:[-*_=]{1,3}|[-*+]|\d+[.)]|#{1,6}|>|\|)\s*$')
+
+
+def _table_errors(lines: List[str]) -> int:
+    """Filas de tabla cuyo número de columnas difiere de la cabecera de su bloque."""
+    errors = 0
+    expected = None
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('|') and stripped.endswith('|') and len(stripped) > 1:
+            cols = stripped.count('|') - stripped.count('\\|') - 1
+            if expected is None:
+                expected = cols
+            elif cols != expected:
+                errors += 1
+        else:
+            expected = None
+    return errors
+
+
+def analyze_text(text: str) -> Dict[str, float]:
+    """Métricas de calidad del texto (fracciones en [0, 1] y recuentos de errores Markdown)."""
+    lines = text.split('\n')
+    content_lines = [l for l in lines if l.strip()]
+    n_chars = max(1, len(text))
+    n_lines = max(1, len(content_lines))
+
+    noise = len(_CONTROL.findall(text)) + text.count('\ufffd') + len(_MOJIBAKE.findall(text))
+
+    in_fence = False
+    fences = 0
+    short_lines = 0
+    symbol_lines = 0
+    bad_headings = 0
+    prose_lines = []
+    for line in lines:
+        if _FENCE.match(line):
+            fences += 1
+            in_fence = not in_fence
+            continue
+        if in_fence or not line.strip():
+            continue  # el código se respeta tal cual
+        prose_lines.append(line)
+        stripped = line.strip()
+        if len(stripped) <= 2 and not _MD_SHORT_LINE.match(stripped):
+            short_lines += 1
+        if _SYMBOL_RUN.search(stripped):
+            symbol_lines += 1
+        if _HEADING_NO_SPACE.match(stripped) and not stripped.startswith('#!'):
+            bad_headings += 1
+
+    hyphen_breaks = len(_HYPHEN_BREAK.findall('\n'.join(prose_lines)))
+    artifacts = hyphen_breaks + short_lines + symbol_lines
+    return {
+        'chars': len(text),
+        'lines': len(content_lines),
+        'encoding_noise': noise / n_chars,
+        'ocr_artifact_count': artifacts,
+        'ocr_artifacts': artifacts / n_lines,
+        'unclosed_fences': fences % 2,
+        'bad_headings': bad_headings,
+        'table_errors': _table_errors(prose_lines),
+    }
+
+
+def decide_text_cleanup(text: str, policy: str = None) -> Tuple[bool, str]:
+    """(usar el LLM, motivo) para un texto ya normalizado con text_to_md."""
+    policy = (policy or TEXT_LLM_CLEANUP).lower()
+    if not text.strip():
+        return False, "texto vacío"
+    if policy == 'always':
+        return True, "TEXT_LLM_CLEANUP=always"
+    if policy == 'never':
+        return False, "TEXT_LLM_CLEANUP=never"
+
+    metrics = analyze_text(text)
+    reasons = []
+    if metrics['encoding_noise'] > TEXT_CLEANUP_MAX_NOISE:
+        reasons.append(f"ruido de codificación {metrics['encoding_noise']:.2%}")
+    # Un par de líneas raras en un texto corto no justifican la llamada
+    if metrics['ocr_artifact_count'] >= 3 and metrics['ocr_artifacts'] > TEXT_CLEANUP_MAX_OCR_ARTIFACTS:
+        reasons.append(f"artefactos de OCR en {metrics['ocr_artifacts']:.0%} de las líneas")
+    bad_headings = metrics['bad_headings']
+    if (bad_headings < TEXT_CLEANUP_MIN_BAD_HEADINGS
+            or bad_headings / max(1, metrics['lines']) <= TEXT_CLEANUP_MAX_BAD_HEADINGS):
+        bad_headings = 0
+    md_errors = metrics['unclosed_fences'] + bad_headings + metrics['table_errors']
+    if md_errors:
+        reasons.append(f"{md_errors} errores de Markdown")
+    if reasons:
+        return True, "; ".join(reasons)
+    return False, (f"texto limpio (ruido {metrics['encoding_noise']:.2%}, "
+                   f"artefactos {metrics['ocr_artifacts']:.0%})")
@@ -0,0 +1,42 @@
+# backend/files/upload_handlers.py
+"""
+Upload handlers que calculan SHA-256 y tamaño mientras Django recibe el archivo.
+
+El hash queda en uploaded_file.sha256, de modo que File.save no tiene que volver
+a leer el archivo desde el storage para calcular el checksum.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingUploadMixin:
+    def new_file(self, *args, **kwargs):
+        self._sha256 = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def _consumes_data(self) -> bool:
+        return True
+
+    def receive_data_chunk(self, raw_data, start):
+        # Solo hashea el handler que se queda con los datos (evita hashear dos veces en la cadena)
+        if self._consumes_data():
+            self._sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self._sha256.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    """Archivos pequeños (<= FILE_UPLOAD_MAX_MEMORY_SIZE), en memoria."""
+
+    def _consumes_data(self) -> bool:
+        return self.activated
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    """Archivos grandes, escritos a un temporal mientras se hashean."""
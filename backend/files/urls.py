@@ -1,6 +1,6 @@
 # backend/files/urls.py
 from django.urls import path
-from .views import FileViewSet
+from .views import FileViewSet, file_processing_events, file_processing_status, processing_queue_metrics
 
 # Definición de vistas según acciones del ViewSet
 file_list = FileViewSet.as_view({'get': 'list', 'post': 'create'})
@@ -18,4 +18,11 @@ urlpatterns = [
     # Rutas globales para acceder directamente a archivos
     path('files/', file_list, name='file-list-create'),
     path('files/<int:pk>/', file_detail, name='file-detail'),
+
+    # Estado/progreso ligero de varios archivos (sondeo) y su variante SSE
+    path('files/status/', file_processing_status, name='file-processing-status'),
+    path('files/status/events/', file_processing_events, name='file-processing-events'),
+
+    # Métricas de la cola de procesamiento (admin)
+    path('files/queue/metrics/', processing_queue_metrics, name='file-queue-metrics'),
 ]
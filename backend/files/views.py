@@ -1,11 +1,26 @@
 # backend/files/views.py
+import os
+import time
+
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from .models import File
 from .serializers import FileSerializer
 from .permissions import IsOwnerOfNote
+from .job_queue import (
+    FILE_PROCESSING_BACKEND, FILE_BULK_UPLOAD_THRESHOLD, FILE_CELERY_QUEUE_PREFIX, FILE_INLINE_COSTS,
+    FILE_INLINE_MAX_BYTES, enqueue_file_processing, queue_metrics,
+)
+from .extractors import COST_LOCAL, extractor_for_file
+from .models import ProcessingJob
+from .progress import PROGRESS_FIELDS, estimate_eta
+from notequest.sse import EventStreamRenderer, sse_event, sse_response
 
 # Intentamos importar Celery task; si no está, pondremos fallback a process_file_sync
 try:
@@ -22,6 +37,19 @@ import threading
 import logging
 logger = logging.getLogger(__name__)
 
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+# Máximo de ids por consulta de estado (la página de subida sondea un lote)
+FILE_STATUS_MAX_IDS = 100
+# Stream SSE de progreso: ocupa un worker (WSGI) mientras dura, así que está desactivado por
+# defecto; el cliente sondea /files/status/. Activarlo solo con un servidor ASGI
+FILE_STATUS_EVENTS_ENABLED = _get_setting("FILE_STATUS_EVENTS_ENABLED", "False") in (True, "True", "true", "1")
+FILE_STATUS_EVENTS_POLL_SECONDS = 1.0
+FILE_STATUS_EVENTS_MAX_SECONDS = int(_get_setting("FILE_STATUS_EVENTS_MAX_SECONDS", 60))
+
 class FileViewSet(viewsets.ModelViewSet):
     queryset = File.objects.select_related('note', 'note__notebook').all()
     serializer_class = FileSerializer
@@ -35,13 +63,36 @@ class FileViewSet(viewsets.ModelViewSet):
         qs = qs.filter(note__notebook__user=self.request.user)
         return qs.order_by('-uploaded_at')
 
-    def _enqueue_processing(self, instance_id):
+    @staticmethod
+    def _runs_inline(cost, size, n_files):
         """
-        Intenta encolar con Celery; si no existe Celery, lanza en un thread.
+        Procesar en la petición es opt-in (FILE_INLINE_COSTS, vacío por defecto) y solo para una
+        subida de un único archivo pequeño cuyo coste (por archivo) es local: lo inline se salta la
+        prioridad y el reparto justo de la cola, y nunca debe esperar a una llamada al LLM.
         """
+        return (n_files == 1 and cost == COST_LOCAL and cost in FILE_INLINE_COSTS
+                and process_file_sync is not None and (size or 0) <= FILE_INLINE_MAX_BYTES)
+
+    def _enqueue_processing(self, instance_id, priority=ProcessingJob.PRIORITY_INTERACTIVE, cost='llm', inline=False):
+        """
+        Con inline=True (ver _runs_inline) se procesa en la propia petición.
+        El resto: con FILE_PROCESSING_BACKEND='db' va a la cola persistente (process_files_worker);
+        si no, intenta encolar con Celery y, si no existe Celery, lanza en un thread.
+        """
+        if inline:
+            process_file_sync(instance_id)
+            return True
+
+        if FILE_PROCESSING_BACKEND == 'db':
+            enqueue_file_processing(instance_id, priority=priority, user_id=self.request.user.id, cost=cost)
+            return True
+
         if process_file_task:
             try:
-                process_file_task.delay(instance_id)
+                if FILE_CELERY_QUEUE_PREFIX:
+                    process_file_task.apply_async((instance_id,), queue=f"{FILE_CELERY_QUEUE_PREFIX}.{cost}")
+                else:
+                    process_file_task.delay(instance_id)
                 return True
             except Exception as e:
                 logger.warning("Celery delay failed: %s. Falling back to thread. ", e)
@@ -92,22 +143,26 @@ class FileViewSet(viewsets.ModelViewSet):
             return Response({"detail": "No tienes permiso sobre la nota indicada."},
                             status=status.HTTP_403_FORBIDDEN)
 
+        # Lotes grandes (o priority=bulk explícito) van a la cola masiva: no retrasan subidas sueltas
+        if len(files) > FILE_BULK_UPLOAD_THRESHOLD or request.data.get('priority') == 'bulk':
+            priority = ProcessingJob.PRIORITY_BULK
+        else:
+            priority = ProcessingJob.PRIORITY_INTERACTIVE
+
         responses = []
         for f in files:
             data = {'note': note.id, 'file': f}
             serializer = self.get_serializer(data=data)
             serializer.is_valid(raise_exception=True)
-            instance = serializer.save()  # modelo guarda archivo
-
-            # marcar queued y encolar procesamiento (async)
-            try:
-                instance.processing_status = 'queued'
-                instance.save(update_fields=['processing_status'])
-            except Exception:
-                pass
+            # Un solo INSERT: archivo, metadatos (hash/tamaño del upload) y processing_status='queued' por defecto
+            instance = serializer.save()
 
-            # Encolar o fallback thread
-            self._enqueue_processing(instance.id)
+            # El coste del extractor decide si se procesa en línea o en qué cola/worker
+            cost = extractor_for_file(instance).cost_for(instance)
+            inline = self._runs_inline(cost, instance.file_size, len(files))
+            self._enqueue_processing(instance.id, priority=priority, cost=cost, inline=inline)
+            if inline:
+                instance.refresh_from_db()  # ya procesado: devolver md_content y estado final
 
             responses.append(self.get_serializer(instance).data)
 
@@ -115,3 +170,84 @@ class FileViewSet(viewsets.ModelViewSet):
         if len(responses) == 1:
             return Response(responses[0], status=status.HTTP_201_CREATED)
         return Response(responses, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def processing_queue_metrics(request):
+    """Estado de la cola persistente por prioridad: profundidad, antigüedad y espera (p50/p95)."""
+    return Response({"backend": FILE_PROCESSING_BACKEND, "priorities": queue_metrics()})
+
+
+def _parse_ids(request):
+    """ids=1,2,3 (o ids repetido) -> lista de enteros; None si falta o no es válida."""
+    raw = ",".join(request.query_params.getlist('ids'))
+    try:
+        ids = [int(x) for x in raw.split(",") if x.strip()]
+    except ValueError:
+        return None
+    return list(dict.fromkeys(ids))[:FILE_STATUS_MAX_IDS] or None
+
+
+def _status_rows(user, ids):
+    """Una sola consulta: estado y progreso (sin md_content) de los archivos del usuario."""
+    rows = list(
+        File.objects.filter(pk__in=ids, note__notebook__user=user)
+        .values('id', 'processing_status', 'processing_error', *PROGRESS_FIELDS)
+    )
+    now = timezone.now()
+    for row in rows:
+        row['eta_seconds'] = estimate_eta(row, now)
+    return rows
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def file_processing_status(request):
+    """
+    Estado ligero de varios archivos: GET /api/files/status/?ids=1,2,3
+    Devuelve etapa, unidades hechas/totales y ETA; los ids ajenos o inexistentes se omiten.
+    """
+    ids = _parse_ids(request)
+    if ids is None:
+        return Response({"detail": "Se requiere 'ids' (lista de enteros separados por comas)."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return Response({"files": _status_rows(request.user, ids)})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def file_processing_events(request):
+    """
+    Variante SSE de /files/status/: emite un evento 'progress' por archivo cada vez que
+    cambia su estado o progreso y un 'end' cuando todos están en done/error.
+    Solo con FILE_STATUS_EVENTS_ENABLED (servidor ASGI) y como mucho FILE_STATUS_EVENTS_MAX_SECONDS.
+    """
+    if not FILE_STATUS_EVENTS_ENABLED:
+        return Response({"detail": "Stream de progreso desactivado; usa GET /api/files/status/?ids=..."},
+                        status=status.HTTP_404_NOT_FOUND)
+    ids = _parse_ids(request)
+    if ids is None:
+        return Response({"detail": "Se requiere 'ids' (lista de enteros separados por comas)."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    user = request.user
+
+    def event_stream():
+        last = {}
+        deadline = time.monotonic() + FILE_STATUS_EVENTS_MAX_SECONDS
+        while True:
+            rows = _status_rows(user, ids)
+            for row in rows:
+                key = (row['processing_status'], row['processing_stage'], row['progress_done'], row['progress_total'])
+                if last.get(row['id']) != key:
+                    last[row['id']] = key
+                    yield sse_event("progress", row)
+            if all(r['processing_status'] in ('done', 'error') for r in rows):
+                yield sse_event("end", {"ids": [r['id'] for r in rows]})
+                return
+            if time.monotonic() > deadline:
+                return
+            time.sleep(FILE_STATUS_EVENTS_POLL_SECONDS)
+
+    return sse_response(event_stream())
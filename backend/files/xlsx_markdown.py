@@ -0,0 +1,197 @@
+# backend/files/xlsx_markdown.py
+"""
+Lectura en streaming de XLSX (openpyxl read_only) con estadísticas por columna.
+
+Cada hoja se recorre una sola vez, fila a fila, sin cargar el libro en memoria:
+- la primera fila no vacía es la cabecera;
+- por columna se acumulan tipo dominante, nulos, min/max/media (números y fechas),
+  distintos y valores más frecuentes (texto);
+- se guardan como mucho XLSX_SMALL_SHEET_ROWS filas: si la hoja no pasa de ahí se
+  renderiza entera como tabla Markdown, sin LLM.
+xlsx_to_md (processing_helpers) envía las estadísticas de las hojas grandes en un único
+prompt compacto.
+"""
+import os
+import logging
+from collections import Counter
+from datetime import date, datetime, time
+from typing import Any, Dict, Iterator, List
+
+from django.conf import settings
+
+from . import progress
+
+logger = logging.getLogger(__name__)
+
+try:
+    from openpyxl import load_workbook
+except Exception:
+    load_workbook = None
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+# Hojas con hasta estas filas de datos y columnas se renderizan completas en Markdown
+XLSX_SMALL_SHEET_ROWS = int(_get_setting("XLSX_SMALL_SHEET_ROWS", 50))
+XLSX_SMALL_SHEET_COLS = int(_get_setting("XLSX_SMALL_SHEET_COLS", 12))
+# Límite de valores distintos que se cuentan por columna (memoria acotada en columnas casi únicas)
+XLSX_MAX_TRACKED_VALUES = int(_get_setting("XLSX_MAX_TRACKED_VALUES", 1000))
+XLSX_TOP_VALUES = 3
+
+
+def _fmt(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='minutes') if (value.hour or value.minute) else value.date().isoformat()
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value).strip()
+
+
+def _md_cell(value: Any) -> str:
+    return _fmt(value).replace('|', '\\|').replace('\n', '<br>')
+
+
+class ColumnStats:
+    """Acumulador de una columna en una pasada."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.types = Counter()
+        self.num_min = self.num_max = None
+        self.num_sum = 0.0
+        self.num_count = 0
+        self.date_min = self.date_max = None
+        self.values = Counter()
+        self.values_truncated = False
+
+    def add(self, value: Any):
+        self.count += 1
+        if value is None or (isinstance(value, str) and not value.strip()):
+            self.nulls += 1
+            return
+        if isinstance(value, bool):
+            self.types['bool'] += 1
+        elif isinstance(value, (int, float)):
+            self.types['número'] += 1
+            self.num_count += 1
+            self.num_sum += value
+            self.num_min = value if self.num_min is None else min(self.num_min, value)
+            self.num_max = value if self.num_max is None else max(self.num_max, value)
+            return  # los números no cuentan para "valores frecuentes"
+        elif isinstance(value, (datetime, date)):
+            self.types['fecha'] += 1
+            self.date_min = value if self.date_min is None else min(self.date_min, value)
+            self.date_max = value if self.date_max is None else max(self.date_max, value)
+            return
+        else:
+            self.types['texto'] += 1
+        key = _fmt(value)[:60]
+        if key in self.values or len(self.values) < XLSX_MAX_TRACKED_VALUES:
+            self.values[key] += 1
+        else:
+            self.values_truncated = True
+
+    def summary(self) -> Dict[str, Any]:
+        out = {
+            'columna': self.name,
+            'tipo': self.types.most_common(1)[0][0] if self.types else 'vacía',
+            'nulos': f"{self.nulls / self.count:.0%}" if self.count else '0%',
+        }
+        if self.num_count:
+            out.update(min=_fmt(self.num_min), max=_fmt(self.num_max), media=_fmt(self.num_sum / self.num_count))
+        if self.date_min is not None:
+            out.update(min=_fmt(self.date_min), max=_fmt(self.date_max))
+        if self.values:
+            distinct = len(self.values)
+            out['distintos'] = f">{distinct}" if self.values_truncated else str(distinct)
+            out['frecuentes'] = ", ".join(f"{v} ({n})" for v, n in self.values.most_common(XLSX_TOP_VALUES))
+        return out
+
+
+class SheetSummary:
+    def __init__(self, name: str):
+        self.name = name
+        self.header: List[str] = []
+        self.columns: List[ColumnStats] = []
+        self.rows = 0
+        self.sample: List[tuple] = []  # primeras XLSX_SMALL_SHEET_ROWS filas
+
+    @property
+    def is_small(self) -> bool:
+        return self.rows <= XLSX_SMALL_SHEET_ROWS and len(self.header) <= XLSX_SMALL_SHEET_COLS
+
+    def markdown_table(self) -> str:
+        if not self.header:
+            return ''
+        lines = ['| ' + ' | '.join(_md_cell(h) for h in self.header) + ' |', '|' + '---|' * len(self.header)]
+        for row in self.sample:
+            lines.append('| ' + ' | '.join(_md_cell(v) for v in row) + ' |')
+        return '\n'.join(lines)
+
+    def stats_table(self) -> str:
+        fields = ['columna', 'tipo', 'nulos', 'min', 'max', 'media', 'distintos', 'frecuentes']
+        summaries = [c.summary() for c in self.columns]
+        lines = ['| ' + ' | '.join(fields) + ' |', '|' + '---|' * len(fields)]
+        for s in summaries:
+            lines.append('| ' + ' | '.join(_md_cell(s.get(f, '')) for f in fields) + ' |')
+        return '\n'.join(lines)
+
+
+def _trim(row: tuple) -> tuple:
+    end = len(row)
+    while end and (row[end - 1] is None or (isinstance(row[end - 1], str) and not row[end - 1].strip())):
+        end -= 1
+    return row[:end]
+
+
+def summarize_sheet(name: str, rows: Iterator[tuple]) -> SheetSummary:
+    sheet = SheetSummary(name)
+    for raw in rows:
+        row = _trim(raw)
+        if not row:
+            continue  # filas vacías
+        if not sheet.header:
+            sheet.header = [_fmt(v) or f"Col{i + 1}" for i, v in enumerate(row)]
+            sheet.columns = [ColumnStats(h) for h in sheet.header]
+            continue
+        if len(row) > len(sheet.header):
+            # Datos más anchos que la cabecera: columnas sin nombre
+            for i in range(len(sheet.header), len(row)):
+                sheet.header.append(f"Col{i + 1}")
+                stats = ColumnStats(sheet.header[-1])
+                stats.count = stats.nulls = sheet.rows  # vacía en las filas anteriores
+                sheet.columns.append(stats)
+        padded = row + (None,) * (len(sheet.header) - len(row))
+        for stats, value in zip(sheet.columns, padded):
+            stats.add(value)
+        sheet.rows += 1
+        if sheet.rows <= XLSX_SMALL_SHEET_ROWS:
+            sheet.sample.append(padded)
+    # Las filas guardadas antes de ensanchar la cabecera se completan al final
+    sheet.sample = [r + (None,) * (len(sheet.header) - len(r)) for r in sheet.sample]
+    return sheet
+
+
+def summarize_workbook(path) -> List[SheetSummary]:
+    """Resumen de cada hoja del libro, leyendo en modo read_only (memoria constante por fila)."""
+    if load_workbook is None:
+        raise RuntimeError("openpyxl no está instalado.")
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = wb.worksheets
+        progress.set_stage("sheets", total=len(sheets))
+        summaries = []
+        for ws in sheets:
+            summaries.append(summarize_sheet(ws.title, ws.iter_rows(values_only=True)))
+            progress.advance()
+        return summaries
+    finally:
+        wb.close()
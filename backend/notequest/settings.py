@@ -98,6 +98,26 @@ DATABASES = {
 }
 
 
+# Caches
+# "llm" guarda respuestas de OpenAI (ai_tools/llm_cache.py) en disco: no requiere Redis.
+# TIMEOUT = antigüedad máxima en segundos; MAX_ENTRIES = tamaño máximo antes de descartar entradas.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'llm': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('LLM_CACHE_DIR', str(BASE_DIR / '.llm_cache')),
+        'TIMEOUT': int(os.getenv('LLM_CACHE_TIMEOUT', 60 * 60 * 24 * 30)),  # 30 días
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('LLM_CACHE_MAX_ENTRIES', 20000)),
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -202,6 +222,11 @@ CORS_ALLOW_METHODS = [
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+# Calculan SHA-256 mientras se recibe el archivo (File.save no relee el archivo para el checksum)
+FILE_UPLOAD_HANDLERS = [
+    'files.upload_handlers.HashingMemoryFileUploadHandler',
+    'files.upload_handlers.HashingTemporaryFileUploadHandler',
+]
 
 # Allowed file types for uploads
 ALLOWED_FILE_TYPES = ['pdf', 'docx', 'png', 'jpg', 'jpeg', 'txt', 'md']
@@ -0,0 +1,44 @@
+# backend/notequest/sse.py
+"""
+Utilidades Server-Sent Events compartidas por las vistas en streaming (notes, files).
+
+- EventStreamRenderer: permite que DRF negocie 'Accept: text/event-stream'.
+- sse_event: formatea un evento con payload JSON.
+- sse_response: StreamingHttpResponse con las cabeceras para que nadie acumule el stream.
+"""
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Permite que DRF acepte 'Accept: text/event-stream' en las vistas SSE.
+    Las vistas devuelven StreamingHttpResponse; lo único que se renderiza aquí son las
+    respuestas normales (errores 4xx/5xx, validación...), como un evento SSE 'error' con JSON.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, bytes):
+            return data
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return sse_event("error", data).encode(self.charset)
+
+
+def sse_event(event, data):
+    """Formatea un evento Server-Sent Events con payload JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+
+def sse_response(stream):
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # evita que nginx acumule el stream
+    return response
@@ -33,6 +33,7 @@ urlpatterns = [
 
     path('api/auth/', include('users.urls')),
     path('api/friendships/', include('friendships.urls')),
+    path('api/ai/', include('ai_tools.urls')),
     path('api/', include(router.urls)),  # Router global para futuras expansiones
 ]
 
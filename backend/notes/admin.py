@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Note
+from .models import Note, AIJob
 
-admin.site.register(Note)
\ No newline at end of file
+admin.site.register(Note)
+admin.site.register(AIJob)
@@ -0,0 +1,172 @@
+# backend/notes/jobs.py
+"""
+Ejecución en segundo plano de los trabajos de IA (AIJob).
+
+Las vistas crean un AIJob y responden 202 de inmediato; el trabajo corre en un
+ThreadPoolExecutor acotado (AI_JOB_WORKERS hilos por proceso), de modo que una
+completion lenta ya no bloquea un worker WSGI. El resultado se persiste en la
+nota (summary / quiz_data / content) igual que antes y en AIJob.result.
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from ai_tools.summarizer import summarize_text
+from ai_tools.quiz_generator import generate_quiz
+from ai_tools.note_improver import improve_note
+from ai_tools.llm_cache import text_hash
+
+from .models import AIJob
+
+logger = logging.getLogger(__name__)
+
+
+def _get_setting(name: str, default=None):
+    return getattr(settings, name, os.getenv(name, default))
+
+
+AI_JOB_WORKERS = int(_get_setting("AI_JOB_WORKERS", 4))
+# Un job queued/running más antiguo que esto se considera abandonado (p. ej. reinicio del proceso)
+AI_JOB_STALE_SECONDS = int(_get_setting("AI_JOB_STALE_SECONDS", 600))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Executor compartido por proceso; se crea en el primer uso."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=AI_JOB_WORKERS, thread_name_prefix="ai-job")
+    return _executor
+
+
+def _run_summary(job):
+    note = job.note
+    summary = summarize_text(note.content)
+    note.summary = summary
+    note.save(update_fields=["summary"])
+    return {"summary": summary}
+
+
+def _run_quiz(job):
+    note = job.note
+    quiz = generate_quiz(note.content)
+    note.quiz_data = quiz
+    note.save(update_fields=["quiz_data"])
+    return {"quiz": quiz}
+
+
+def _run_improve(job):
+    note = job.note
+    res = improve_note(note.content)
+    improved_md = res.get("improved_markdown", "")
+    saved = False
+    # Si el cliente pidió aplicar el cambio, actualizamos note.content
+    if job.params.get("apply") and improved_md:
+        note.content = improved_md
+        note.save(update_fields=["content"])
+        saved = True
+    return {
+        "improved_markdown": improved_md,
+        "changelog": res.get("changelog", {}),
+        "warnings": res.get("warnings", []),
+        "saved": saved,
+    }
+
+
+_RUNNERS = {
+    "summary": _run_summary,
+    "quiz": _run_quiz,
+    "improve": _run_improve,
+}
+
+
+def run_job(job_id: int):
+    """Ejecuta un AIJob de forma síncrona (lo usa el executor)."""
+    close_old_connections()
+    try:
+        try:
+            job = AIJob.objects.select_related("note").get(pk=job_id)
+        except AIJob.DoesNotExist:
+            logger.warning("AIJob %s no existe", job_id)
+            return
+
+        job.status = "running"
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+
+        try:
+            result = _RUNNERS[job.operation](job)
+        except Exception as e:
+            logger.exception("AIJob %s (%s) falló: %s", job.id, job.operation, e)
+            job.status = "error"
+            job.error = str(e)
+            job.finished_at = timezone.now()
+            job.save(update_fields=["status", "error", "finished_at"])
+            return
+
+        job.status = "done"
+        job.result = result
+        job.error = ""
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "result", "error", "finished_at"])
+    finally:
+        close_old_connections()
+
+
+def make_dedup_key(note, operation: str, params=None) -> str:
+    payload = json.dumps(
+        {"op": operation, "note": note.id, "content": text_hash(note.content or ""), "params": params or {}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _active_job(dedup_key: str):
+    job = AIJob.objects.filter(dedup_key=dedup_key, status__in=AIJob.ACTIVE_STATUSES).first()
+    if job is None:
+        return None
+    if (timezone.now() - job.created_at).total_seconds() > AI_JOB_STALE_SECONDS:
+        # El proceso que lo ejecutaba murió: lo cerramos para no bloquear la clave
+        AIJob.objects.filter(pk=job.pk, status__in=AIJob.ACTIVE_STATUSES).update(
+            status="error", error="Trabajo abandonado (timeout)", finished_at=timezone.now()
+        )
+        return None
+    return job
+
+
+def enqueue_job(note, user, operation: str, params=None):
+    """
+    Crea el AIJob y lo despacha al executor cuando la transacción confirme.
+    Si ya hay un job en curso para la misma (operación, nota, contenido, params), se devuelve
+    ese job en lugar de lanzar otra llamada a OpenAI. Retorna (job, created).
+    """
+    params = params or {}
+    dedup_key = make_dedup_key(note, operation, params)
+
+    existing = _active_job(dedup_key)
+    if existing is not None:
+        return existing, False
+    try:
+        # savepoint: el IntegrityError no debe romper una transacción externa
+        with transaction.atomic():
+            job = AIJob.objects.create(note=note, user=user, operation=operation,
+                                       params=params, dedup_key=dedup_key)
+    except IntegrityError:
+        # Otro proceso creó el mismo job entre la consulta y el insert
+        existing = _active_job(dedup_key)
+        if existing is not None:
+            return existing, False
+        raise
+    transaction.on_commit(lambda: get_executor().submit(run_job, job.id))
+    return job, True
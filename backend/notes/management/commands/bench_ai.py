@@ -0,0 +1,243 @@
+# backend/notes/management/commands/bench_ai.py
+"""
+Benchmark de la capa de IA contra un servidor OpenAI simulado (ai_tools.fake_llm_server).
+
+Ejecuta N operaciones por tipo (summary, quiz, improve, file, file_llm) con C hilos
+concurrentes sobre una base de datos de test temporal y reporta p50/p95/p99 y
+throughput. El overhead propio se estima restando la latencia simulada del LLM.
+
+    python manage.py bench_ai --requests 40 --concurrency 8 --latency 0.3
+    python manage.py bench_ai --ops summary,file --json > bench.json   # para CI
+"""
+import os
+import json
+import time
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from ai_tools import llm_cache, llm_client
+from ai_tools.chunking import count_tokens
+from ai_tools.fake_llm_server import FakeLLMConfig, FakeLLMServer
+
+ALL_OPS = ("summary", "quiz", "improve", "file", "file_llm")
+
+_PARAGRAPH = (
+    "La fotosíntesis es el proceso por el cual las plantas convierten la energía de la luz en "
+    "energía química. Ocurre en los cloroplastos y produce glucosa y oxígeno a partir de agua "
+    "y dióxido de carbono. "
+)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _sample_text(i: int, words: int) -> str:
+    # Texto distinto por petición para que ni la caché ni el single-flight colapsen el benchmark
+    base = _PARAGRAPH.split()
+    body = " ".join(base[j % len(base)] for j in range(words))
+    return f"# Nota de prueba {i}\n\n{body}\n\nIdentificador único: {i}-{time.time_ns()}"
+
+
+class Command(BaseCommand):
+    help = "Mide latencia (p50/p95) y throughput de las operaciones de IA contra un LLM simulado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ops", default=",".join(ALL_OPS),
+                            help=f"Operaciones separadas por coma ({', '.join(ALL_OPS)})")
+        parser.add_argument("--requests", type=int, default=20, help="Operaciones por tipo")
+        parser.add_argument("--concurrency", type=int, default=4, help="Hilos concurrentes")
+        parser.add_argument("--warmup", type=int, default=4, help="Operaciones no medidas antes de cada tipo")
+        parser.add_argument("--words", type=int, default=600, help="Palabras por nota/archivo de prueba")
+        parser.add_argument("--base-url", default="",
+                            help="Usar un servidor ya levantado en lugar del simulado embebido")
+        parser.add_argument("--latency", type=float, default=0.2, help="Latencia simulada por llamada (s)")
+        parser.add_argument("--tokens-per-second", type=float, default=0.0)
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de HTTP 500")
+        parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Probabilidad de HTTP 429")
+        parser.add_argument("--mode", choices=["canned", "echo"], default="canned")
+        parser.add_argument("--with-cache", action="store_true", help="No desactivar la caché de LLM")
+        parser.add_argument("--json", action="store_true", help="Salida en JSON")
+
+    def handle(self, *args, **opts):
+        ops = [o.strip() for o in opts["ops"].split(",") if o.strip()]
+        unknown = set(ops) - set(ALL_OPS)
+        if unknown:
+            raise CommandError(f"Operaciones desconocidas: {', '.join(sorted(unknown))}")
+
+        server = None
+        base_url = opts["base_url"]
+        if not base_url:
+            config = FakeLLMConfig(latency=opts["latency"], tokens_per_second=opts["tokens_per_second"],
+                                   error_rate=opts["error_rate"], rate_limit_rate=opts["rate_limit_rate"],
+                                   mode=opts["mode"])
+            server = FakeLLMServer(config=config).start()
+            base_url = server.base_url
+
+        old_env = {k: os.environ.get(k) for k in ("OPENAI_BASE_URL", "OPENAI_API_KEY")}
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+        old_cache_enabled = llm_cache.LLM_CACHE_ENABLED
+        llm_cache.LLM_CACHE_ENABLED = opts["with_cache"]
+        llm_client.reset_client()
+
+        media_root = tempfile.mkdtemp(prefix="bench_ai_media_")
+        from django.db import connection
+        if connection.vendor == "sqlite":
+            # SQLite en memoria (shared cache) da "table is locked" con escrituras concurrentes:
+            # usamos un archivo temporal, que respeta el busy timeout
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(media_root, "bench.sqlite3")
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            # Calentamiento: el tokenizer se carga en el primer uso y no debe contar en la primera operación
+            count_tokens("warmup")
+            with override_settings(MEDIA_ROOT=media_root):
+                results = [self._bench(op, opts, server) for op in ops]
+        finally:
+            runner.teardown_databases(old_config)
+            shutil.rmtree(media_root, ignore_errors=True)
+            llm_cache.LLM_CACHE_ENABLED = old_cache_enabled
+            for k, v in old_env.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+            llm_client.reset_client()
+            if server is not None:
+                server.stop()
+
+        report = {
+            "base_url": base_url,
+            "requests": opts["requests"],
+            "concurrency": opts["concurrency"],
+            "simulated_latency": None if opts["base_url"] else opts["latency"],
+            "results": results,
+        }
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"LLM: {base_url}  requests/op={opts['requests']}  concurrency={opts['concurrency']}")
+        header = f"{'op':<10}{'ok':>5}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'llm':>6}{'overhead':>10}"
+        self.stdout.write(header)
+        for r in results:
+            overhead = "-" if r["overhead_mean"] is None else f"{r['overhead_mean']:.3f}"
+            self.stdout.write(
+                f"{r['op']:<10}{r['ok']:>5}{r['errors']:>5}{r['p50']:>9.3f}{r['p95']:>9.3f}"
+                f"{r['p99']:>9.3f}{r['throughput']:>9.2f}{r['llm_calls']:>6}{overhead:>10}"
+            )
+
+    # --- preparación y ejecución ---
+
+    def _fixture(self):
+        from django.contrib.auth import get_user_model
+        from notebooks.models import Notebook
+
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(username="bench_ai", defaults={"email": "bench@example.com"})
+        notebook, _ = Notebook.objects.get_or_create(user=user, name="bench", defaults={"subject": "bench"})
+        return user, notebook
+
+    def _prepare(self, op, opts, count):
+        """Crea las filas/archivos necesarios y devuelve una lista de callables (uno por petición)."""
+        from notes.models import AIJob, Note
+        from notes.jobs import run_job
+        from files.models import File
+        from files.tasks import process_file_sync
+        from files.processing_helpers import txt_to_md
+
+        user, notebook = self._fixture()
+        calls = []
+        for i in range(count):
+            text = _sample_text(i, opts["words"])
+            if op in ("summary", "quiz", "improve"):
+                note = Note.objects.create(notebook=notebook, title=f"bench {op} {i}", content=text)
+                job = AIJob.objects.create(note=note, user=user, operation=op, params={},
+                                           dedup_key=f"bench-{op}-{i}-{time.time_ns()}")
+                calls.append(lambda job_id=job.id: self._check_job(run_job, job_id))
+            elif op == "file":
+                note = Note.objects.create(notebook=notebook, title=f"bench file {i}", content="")
+                f = File(note=note, file=ContentFile(text.encode("utf-8"), name=f"bench_{i}.txt"))
+                f.save()
+                calls.append(lambda file_id=f.id: self._check(process_file_sync(file_id)))
+            else:  # file_llm: limpieza de txt con LLM (chunking + fan-out), aunque el texto sea limpio
+                path = os.path.join(settings.MEDIA_ROOT, f"bench_{i}.txt")
+                with open(path, "w", encoding="utf-8") as fh:
+                    fh.write(text)
+                calls.append(lambda p=path: self._check(bool(txt_to_md(p, policy='always'))))
+        return calls
+
+    @staticmethod
+    def _check(ok):
+        if not ok:
+            raise RuntimeError("la operación no devolvió resultado")
+
+    @staticmethod
+    def _check_job(run_job, job_id):
+        from notes.models import AIJob
+
+        run_job(job_id)
+        job = AIJob.objects.get(pk=job_id)
+        if job.status != "done":
+            raise RuntimeError(job.error or job.status)
+
+    def _bench(self, op, opts, server):
+        warmup = max(0, opts["warmup"])
+        calls = self._prepare(op, opts, opts["requests"] + warmup)
+        warmup_calls, calls = calls[:warmup], calls[warmup:]
+
+        def timed(fn):
+            start = time.perf_counter()
+            try:
+                fn()
+                return time.perf_counter() - start, None
+            except Exception as e:
+                return time.perf_counter() - start, str(e)
+
+        with ThreadPoolExecutor(max_workers=max(1, opts["concurrency"])) as pool:
+            # Calentamiento (conexiones a BD/HTTP de cada hilo, imports perezosos): no se mide
+            list(pool.map(timed, warmup_calls))
+            llm_before = server.stats.snapshot() if server else None
+            wall_start = time.perf_counter()
+            outcomes = list(pool.map(timed, calls))
+            wall = time.perf_counter() - wall_start
+
+        latencies = [t for t, err in outcomes if err is None]
+        errors = [err for _, err in outcomes if err is not None]
+        result = {
+            "op": op,
+            "ok": len(latencies),
+            "errors": len(errors),
+            "p50": round(_percentile(latencies, 50), 4),
+            "p95": round(_percentile(latencies, 95), 4),
+            "p99": round(_percentile(latencies, 99), 4),
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+            "throughput": round(len(latencies) / wall, 3) if wall > 0 else 0.0,
+            "wall_seconds": round(wall, 3),
+            "llm_calls": 0,
+            "overhead_mean": None,
+            "sample_errors": errors[:3],
+        }
+        if server is not None:
+            after = server.stats.snapshot()
+            llm_calls = after["requests"] - llm_before["requests"]
+            simulated = after["simulated_seconds"] - llm_before["simulated_seconds"]
+            result["llm_calls"] = llm_calls
+            # Aproximación: tiempo medio por operación que no se pasó esperando al LLM simulado
+            if outcomes:
+                total = sum(t for t, _ in outcomes)
+                result["overhead_mean"] = round(max(0.0, total - simulated) / len(outcomes), 4)
+        return result
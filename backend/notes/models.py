@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 
@@ -18,4 +19,52 @@ class Note(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+class AIJob(models.Model):
+    """Trabajo de IA (resumen, quiz, mejora) ejecutado fuera del request HTTP."""
+
+    OPERATION_CHOICES = [
+        ('summary', 'Summary'),
+        ('quiz', 'Quiz'),
+        ('improve', 'Improve'),
+    ]
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('error', 'Error'),
+    ]
+
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='ai_jobs')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ai_jobs')
+    operation = models.CharField(max_length=20, choices=OPERATION_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+
+    # Opciones de la operación (p. ej. {"apply": true} para improve)
+    params = models.JSONField(blank=True, default=dict)
+    # (operación, nota, hash del contenido, params): un solo job activo por clave
+    dedup_key = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    ACTIVE_STATUSES = ('queued', 'running')
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # Evita (también entre procesos) dos jobs en curso para la misma petición
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_ai_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.operation} #{self.id} (note: {self.note_id}, {self.status})"
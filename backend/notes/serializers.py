@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Note
+from .models import Note, AIJob
 
 
 class NoteSerializer(serializers.ModelSerializer):
@@ -7,3 +7,10 @@ class NoteSerializer(serializers.ModelSerializer):
         model = Note
         fields = ['id', 'title', 'content', 'notebook', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
+
+
+class AIJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AIJob
+        fields = ['id', 'note', 'operation', 'status', 'result', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
@@ -1,6 +1,9 @@
 # en notes/urls.py
 from django.urls import path
-from .views import NoteListCreateView, NoteDetailView, generate_summary, generate_quiz_view, share_note, improve_note_view
+from .views import (
+    NoteListCreateView, NoteDetailView, generate_summary, generate_quiz_view, share_note, improve_note_view,
+    ai_job_detail, generate_summary_stream, improve_note_stream_view,
+)
 
 urlpatterns = [
     # Ruta para listar y crear notas (ej. /api/notes/)
@@ -13,5 +16,12 @@ urlpatterns = [
     path('<int:note_id>/quiz/', generate_quiz_view, name='generate-quiz'),
     path('<int:note_id>/improve/', improve_note_view, name='improve-note'),
 
+    # Variantes en streaming (SSE): el texto llega al cliente según se genera
+    path('<int:note_id>/summarize/stream/', generate_summary_stream, name='generate-summary-stream'),
+    path('<int:note_id>/improve/stream/', improve_note_stream_view, name='improve-note-stream'),
+
     path('<int:note_id>/share/', share_note, name='note-share'),
+
+    # Trabajos de IA en segundo plano (sondeo de estado)
+    path('jobs/<int:job_id>/', ai_job_detail, name='ai-job-detail'),
 ]
\ No newline at end of file
@@ -1,22 +1,27 @@
 # en notes/views.py
+import logging
+
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.urls import reverse
 
-from ai_tools.summarizer import summarize_text
-from ai_tools.quiz_generator import generate_quiz
-from ai_tools.note_improver import improve_note
-
-from .models import Note
-from .serializers import NoteSerializer
+from .models import Note, AIJob
+from .serializers import NoteSerializer, AIJobSerializer
+from .jobs import enqueue_job
+from ai_tools.summarizer import summarize_text_stream
+from ai_tools.note_improver import improve_note_stream
 from notebooks.models import Notebook
 from friendships.models import Friendship
+from notequest.sse import EventStreamRenderer, sse_event, sse_response
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 class NoteListCreateView(generics.ListCreateAPIView):
     serializer_class = NoteSerializer
@@ -37,32 +42,120 @@ class NoteDetailView(generics.RetrieveUpdateDestroyAPIView):
         # Un usuario solo puede acceder/modificar las notas de sus propios notebooks
         return Note.objects.filter(notebook__user=self.request.user)
     
+def _job_accepted_response(request, job, created=True):
+    """
+    Respuesta 202 común a los endpoints que encolan un AIJob.
+    deduplicated=True indica que la petición se unió a un job idéntico ya en curso.
+    """
+    return Response({
+        "job_id": job.id,
+        "status": job.status,
+        "deduplicated": not created,
+        "status_url": request.build_absolute_uri(reverse("ai-job-detail", args=[job.id])),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def generate_summary(request, note_id):
-    """Genera y guarda el resumen de una nota."""
+    """Encola la generación del resumen de una nota (se guarda en note.summary)."""
     try:
         note = Note.objects.get(id=note_id, notebook__user=request.user)
-        summary = summarize_text(note.content)
-        note.summary = summary
-        note.save(update_fields=["summary"])
-        return Response({"summary": summary})
     except Note.DoesNotExist:
         return Response({"error": "Nota no encontrada."}, status=404)
+    job, created = enqueue_job(note, request.user, "summary")
+    return _job_accepted_response(request, job, created)
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def generate_quiz_view(request, note_id):
-    """Genera y guarda un quiz sencillo basado en una nota."""
+    """Encola la generación de un quiz sencillo basado en una nota (se guarda en note.quiz_data)."""
     try:
         note = Note.objects.get(id=note_id, notebook__user=request.user)
-        quiz = generate_quiz(note.content)
-        note.quiz_data = quiz
-        note.save(update_fields=["quiz_data"])
-        return Response({"quiz": quiz})
     except Note.DoesNotExist:
         return Response({"error": "Nota no encontrada."}, status=404)
+    job, created = enqueue_job(note, request.user, "quiz")
+    return _job_accepted_response(request, job, created)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def ai_job_detail(request, job_id):
+    """Estado y resultado de un AIJob (para sondeo)."""
+    job = get_object_or_404(AIJob, id=job_id, user=request.user)
+    return Response(AIJobSerializer(job).data)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def generate_summary_stream(request, note_id):
+    """
+    Variante SSE de /summarize/: emite eventos 'token' ({"text": ...}) según llega el resumen
+    y un evento 'done' ({"summary": ...}) tras guardarlo en note.summary.
+    """
+    try:
+        note = Note.objects.get(id=note_id, notebook__user=request.user)
+    except Note.DoesNotExist:
+        return Response({"error": "Nota no encontrada."}, status=404)
+
+    def event_stream():
+        parts = []
+        try:
+            for delta in summarize_text_stream(note.content):
+                parts.append(delta)
+                yield sse_event("token", {"text": delta})
+        except Exception as e:
+            logger.exception("generate_summary_stream: error generando resumen: %s", e)
+            yield sse_event("error", {"error": str(e)})
+            return
+        summary = "".join(parts).strip()
+        note.summary = summary
+        note.save(update_fields=["summary"])
+        yield sse_event("done", {"summary": summary})
+
+    return sse_response(event_stream())
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def improve_note_stream_view(request, note_id):
+    """
+    Variante SSE de /improve/: emite eventos 'markdown' ({"text": ...}) con la nota mejorada
+    en cuanto llega (antes del changelog) y un evento 'done' con improved_markdown, changelog,
+    warnings y saved. Con {"apply": true} se guarda note.content al terminar.
+    """
+    try:
+        note = Note.objects.get(id=note_id, notebook__user=request.user)
+    except Note.DoesNotExist:
+        return Response({"error": "Nota no encontrada."}, status=status.HTTP_404_NOT_FOUND)
+
+    apply_changes = bool(request.data.get("apply", False))
+
+    def event_stream():
+        result = None
+        try:
+            for kind, data in improve_note_stream(note.content):
+                if kind == "markdown":
+                    yield sse_event("markdown", {"text": data})
+                else:
+                    result = data
+        except Exception as e:
+            logger.exception("improve_note_stream_view: error mejorando nota: %s", e)
+            yield sse_event("error", {"error": str(e)})
+            return
+
+        improved_md = result.get("improved_markdown", "")
+        saved = False
+        if apply_changes and improved_md:
+            note.content = improved_md
+            note.save(update_fields=["content"])
+            saved = True
+        yield sse_event("done", {**result, "saved": saved})
+
+    return sse_response(event_stream())
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -117,49 +210,15 @@ def share_note(request, note_id):
 @permission_classes([IsAuthenticated])
 def improve_note_view(request, note_id):
     """
-    Mejora/expande/corrige el contenido de una nota usando la función improve_note().
-    - Si en el body viene {"apply": true}, se sobrescribe note.content con la versión mejorada.
-    - Devuelve improved_markdown, changelog y warnings.
+    Encola la mejora/expansión/corrección del contenido de una nota usando improve_note().
+    - Si en el body viene {"apply": true}, al terminar se sobrescribe note.content con la versión mejorada.
+    - El resultado del job contiene improved_markdown, changelog, warnings y saved.
     """
     try:
         note = Note.objects.get(id=note_id, notebook__user=request.user)
     except Note.DoesNotExist:
         return Response({"error": "Nota no encontrada."}, status=status.HTTP_404_NOT_FOUND)
 
-    try:
-        # Llamar a la función de IA con el contenido actual de la nota
-        res = improve_note(note.content)
-
-        improved_md = res.get("improved_markdown", "")
-        changelog = res.get("changelog", {})
-        warnings = res.get("warnings", [])
-
-        # Si el cliente pide aplicar el cambio, actualizamos note.content
-        apply_changes = request.data.get("apply", False)
-        saved = False
-        if apply_changes and improved_md:
-            try:
-                note.content = improved_md
-                # Intentamos guardar el changelog en un campo opcional 'improvement_log' si existe
-                if hasattr(note, "improvement_log"):
-                    try:
-                        note.improvement_log = changelog
-                    except Exception:
-                        # si el campo no acepta dicts, lo ignoramos para no romper
-                        pass
-                note.save(update_fields=["content"] + (["improvement_log"] if hasattr(note, "improvement_log") else []))
-                saved = True
-            except Exception as e:
-                logger.exception("No se pudo guardar la nota mejorada: %s", e)
-                return Response({"error": "No se pudo guardar la nota mejorada.", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        return Response({
-            "improved_markdown": improved_md,
-            "changelog": changelog,
-            "warnings": warnings,
-            "saved": saved
-        }, status=status.HTTP_200_OK)
-
-    except Exception as e:
-        logger.exception("Error en improve_note_view: %s", e)
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+    apply_changes = bool(request.data.get("apply", False))
+    job, created = enqueue_job(note, request.user, "improve", params={"apply": apply_changes})
+    return _job_accepted_response(request, job, created)
@@ -38,6 +38,21 @@ export const fetchNotesByNotebook = async (notebookId) => {
   }
 };
 
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Los endpoints de IA responden 202 con un job_id; sondeamos hasta que termine
+export const waitForAIJob = async (jobId, { intervalMs = 1000, timeoutMs = 180000 } = {}) => {
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    const response = await axios.get(`${BASE_URL}/notes/jobs/${jobId}/`, getAuthHeaders());
+    const job = response.data;
+    if (job.status === "done") return job.result;
+    if (job.status === "error") throw { error: job.error || "Error en el trabajo de IA" };
+    await sleep(intervalMs);
+  }
+  throw { error: "Tiempo de espera agotado para el trabajo de IA" };
+};
+
 // Generar resumen
 export const generateSummary = async (noteId) => {
   try {
@@ -46,7 +61,8 @@ export const generateSummary = async (noteId) => {
       {},
       getAuthHeaders()
     );
-    return response.data.summary ? { summary: response.data.summary } : response.data;
+    const result = await waitForAIJob(response.data.job_id);
+    return { summary: result.summary };
   } catch (error) {
     console.error("Error generating summary:", error);
     throw error.response?.data || error;
@@ -61,7 +77,8 @@ export const generateQuiz = async (noteId) => {
       {},
       getAuthHeaders()
     );
-    return response.data.quiz ? { quiz: response.data.quiz } : response.data;
+    const result = await waitForAIJob(response.data.job_id);
+    return { quiz: result.quiz };
   } catch (error) {
     console.error("Error generating quiz:", error);
     throw error.response?.data || error;